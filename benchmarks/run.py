@@ -0,0 +1,270 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import auth  # noqa: E402
+import db  # noqa: E402
+import money  # noqa: E402
+import pagination  # noqa: E402
+import records  # noqa: E402
+import repository  # noqa: E402
+import rollups  # noqa: E402
+import storage  # noqa: E402
+
+if __package__:
+    from . import seed as seed_module
+else:
+    import seed as seed_module  # noqa: E402
+
+# Бенчмарк запитів, що стоять за екранами застосунку. Результат - JSON з p50/p95/p99 у мс,
+# щоб порівнювати релізи між собою.
+
+
+def percentile(sorted_values, p):
+    # Метод найближчого рангу
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), math.ceil(p / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize(durations):
+    values = sorted(durations)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": values[-1] * 1000,
+    }
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+class Workloads:
+    # Кожен метод - один запит/дія з UI; аргументи вибираються випадково з засіяних даних
+    def __init__(self, db_file, users, accounts_per_user, rng):
+        self.db_file = db_file
+        self.users = users
+        self.accounts_per_user = accounts_per_user
+        self.rng = rng
+        self.added = []
+        self._added_lock = threading.Lock()
+
+    def random_user(self):
+        return seed_module.username_for(self.rng.randrange(self.users))
+
+    def random_account(self):
+        return seed_module.account_id_for(self.rng.randrange(self.users), self.rng.randrange(self.accounts_per_user))
+
+    def main_view(self):
+        username = self.random_user()
+        with db.connect(self.db_file) as conn:
+            return repository.get_accounts_with_recent_tx(conn, [username])[username]
+
+    def account_details(self):
+        account_id = self.random_account()
+        with db.connect(self.db_file) as conn:
+            repository.get_account(conn, account_id)
+            repository.get_participants(conn, account_id)
+            rows, has_more = pagination.fetch_older(conn, account_id)
+        return rows
+
+    def reports(self):
+        username = self.random_user()
+        with db.connect(self.db_file) as conn:
+            account_ids = repository.get_user_account_ids(conn, username)
+            return rollups.monthly_report(conn, account_ids, "0000-00")
+
+    def login(self):
+        # Як handle_login: scrypt у пулі хешування, з'єднання - з пулу БД
+        return auth.hash_pool.run(auth.login, storage.SQLiteStorage(self.db_file), self.random_user(),
+                                  seed_module.SEED_PASSWORD)
+
+    def add_transaction(self):
+        account_id = self.random_account()
+        tx, _ = db.run_write(self.db_file, repository.add_transaction,
+                             account_id, "expense", 1000, "Бенчмарк", seed_module.username_for(0))
+        with self._added_lock:
+            self.added.append(tx["transaction_id"])
+        return tx
+
+    def edit_transaction(self):
+        with self._added_lock:
+            transaction_id = self.rng.choice(self.added) if self.added else None
+        if transaction_id is None:
+            return self.add_transaction()
+        return db.run_write(self.db_file, repository.update_transaction, transaction_id, 1250, "Бенчмарк (ред.)")
+
+    def delete_transaction(self):
+        with self._added_lock:
+            transaction_id = self.added.pop() if self.added else None
+        if transaction_id is None:
+            return None
+        return db.run_write(self.db_file, repository.delete_transaction, transaction_id)
+
+
+# Послідовні сценарії: (назва, метод Workloads)
+SCENARIOS = [
+    ("login", "login"),
+    ("main_view", "main_view"),
+    ("account_details", "account_details"),
+    ("reports", "reports"),
+    ("add_transaction", "add_transaction"),
+    ("edit_transaction", "edit_transaction"),
+    ("delete_transaction", "delete_transaction"),
+]
+
+# Суміш дій однієї сесії в конкурентному прогоні
+SESSION_MIX = ["login", "main_view", "account_details", "account_details", "add_transaction", "main_view"]
+
+
+def run_sequential(workloads, iterations):
+    results = {}
+    for name, method in SCENARIOS:
+        fn = getattr(workloads, method)
+        durations = [timed(fn)[0] for _ in range(iterations)]
+        results[name] = summarize(durations)
+    return results
+
+
+def measure_history_rows(workloads, accounts=20):
+    # Час і пам'ять на рядок історії: повне вікно (HISTORY_MAX_PAGES сторінок) кількох рахунків разом з
+    # текстами плиток (дата, сума), як у build_transaction_tile. Пам'ять - те, що тримають вікна.
+    account_ids = [workloads.random_account() for _ in range(accounts)]
+
+    def load():
+        windows = []
+        for account_id in account_ids:
+            window = pagination.HistoryWindow(lambda: db.connect(workloads.db_file), account_id)
+            window.load_first()
+            while len(window.pages) < window.max_pages and window.load_older():
+                pass
+            for row in window.rows():
+                records.format_timestamp(row["ts"]), money.format_minor(row["amount"])
+            windows.append(window)
+        return windows
+
+    seconds, windows = timed(load)
+    rows = sum(len(window.rows()) for window in windows)
+    del windows
+    tracemalloc.start()
+    try:
+        windows = load()
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return {
+        "rows": rows,
+        "us_per_row": seconds / rows * 1e6 if rows else 0.0,
+        "bytes_per_row": retained / rows if rows else 0.0,
+    }
+
+
+def run_concurrent(workloads, sessions, iterations):
+    # N потоків імітують N сесій Flet, що ділять пул з'єднань і чергу запису
+    durations = {method: [] for method in SESSION_MIX}
+    errors = []
+    lock = threading.Lock()
+
+    def session(index):
+        rng = random.Random(index)
+        local = {method: [] for method in SESSION_MIX}
+        try:
+            for _ in range(iterations):
+                method = rng.choice(SESSION_MIX)
+                local[method].append(timed(getattr(workloads, method))[0])
+        except Exception as exc:
+            errors.append(repr(exc))
+        with lock:
+            for method, values in local.items():
+                durations[method].extend(values)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    total = sum(len(values) for values in durations.values())
+    return {
+        "sessions": sessions,
+        "operations": total,
+        "seconds": elapsed,
+        "ops_per_second": total / elapsed if elapsed else 0.0,
+        "errors": errors,
+        "latency": {method: summarize(values) for method, values in durations.items()},
+        "pool": db.get_pool(workloads.db_file).stats(),
+        "auth_rejected": auth.hash_pool.rejected,
+    }
+
+
+def run(db_file, users, accounts_per_user, transactions, iterations=200, sessions=8, session_iterations=50,
+        reuse=False, seed_value=42):
+    meta = {
+        "started_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "users": users,
+        "accounts_per_user": accounts_per_user,
+        "transactions": transactions,
+        "iterations": iterations,
+    }
+    if not (reuse and os.path.exists(db_file)):
+        meta["seed"] = seed_module.seed(db_file, users, accounts_per_user, transactions, seed_value=seed_value)
+
+    db.configure(db_file)
+    try:
+        workloads = Workloads(db_file, users, accounts_per_user, random.Random(seed_value))
+        results = run_sequential(workloads, iterations)
+        history_rows = measure_history_rows(workloads)
+        concurrent = run_concurrent(workloads, sessions, session_iterations) if sessions else None
+    finally:
+        db.close_pool()
+    return {"meta": meta, "results": results, "history_rows": history_rows, "concurrent": concurrent}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк запитів застосунку «Сімейний бюджет»")
+    parser.add_argument("--db", default="bench_budget.db")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--accounts-per-user", type=int, default=4)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=8, help="кількість одночасних сесій (0 - пропустити)")
+    parser.add_argument("--session-iterations", type=int, default=50)
+    parser.add_argument("--reuse", action="store_true", help="не перезаповнювати наявну БД")
+    parser.add_argument("--output", help="файл для JSON (за замовчуванням stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args.db, args.users, args.accounts_per_user, args.transactions, args.iterations,
+                 args.sessions, args.session_iterations, args.reuse)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import auth  # noqa: E402
+import migrations  # noqa: E402
+import repository  # noqa: E402
+
+DESCRIPTIONS = ["Продукти", "Зарплата", "Комуналка", "Транспорт", "Аптека", "Кафе", "Подарунок", "Оренда",
+                "Стоматолог", "Підписка"]
+SEED_CHUNK = 50_000
+SEED_PASSWORD = "password123"
+
+
+def account_id_for(user_index, account_index):
+    return f"acc-{user_index:06d}-{account_index}"
+
+
+def username_for(user_index):
+    return f"user{user_index:06d}"
+
+
+def seed(db_file, users=1000, accounts_per_user=4, transactions=100_000, family_size=2, days=3650,
+         seed_value=42, progress=None):
+    # Синтетична БД: користувачі, по accounts_per_user рахунків у кожного, перший рахунок
+    # спільний для «родини» з family_size користувачів, транзакції рівномірно по рахунках за days днів.
+    rng = random.Random(seed_value)
+    if os.path.exists(db_file):
+        os.remove(db_file)
+    conn = sqlite3.connect(db_file)
+    conn.row_factory = sqlite3.Row
+    # Під час заповнення надійність не потрібна, потрібна швидкість
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    migrations.migrate(conn)
+
+    started = time.perf_counter()
+    # Один scrypt-хеш на всіх: сіль однакова, зате заповнення не рахує тисячі хешів
+    password_hash = auth.hash_password(SEED_PASSWORD)
+    with conn:
+        conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)",
+                         [(username_for(u), password_hash) for u in range(users)])
+        for u in range(users):
+            for a in range(accounts_per_user):
+                repository.create_account(conn, account_id_for(u, a), f"Рахунок {a + 1}", username_for(u))
+            family_head = u - u % family_size
+            if family_head != u:
+                repository.link_user(conn, username_for(u), account_id_for(family_head, 0))
+
+    account_authors = []
+    for u in range(users):
+        for a in range(accounts_per_user):
+            authors = [username_for(u)]
+            if a == 0:
+                authors += [username_for(m) for m in range(u + 1, min(u + family_size, users))
+                            if m - m % family_size == u]
+            account_authors.append((account_id_for(u, a), authors))
+
+    start_time = datetime(2015, 1, 1)
+    step = timedelta(days=days) / max(transactions, 1)
+    inserted = 0
+    while inserted < transactions:
+        chunk = []
+        for i in range(inserted, min(inserted + SEED_CHUNK, transactions)):
+            account_id, authors = account_authors[rng.randrange(len(account_authors))]
+            trans_type = "income" if rng.random() < 0.3 else "expense"
+            chunk.append((account_id, trans_type, rng.randint(100, 500_000), rng.choice(DESCRIPTIONS),
+                          (start_time + step * i).isoformat(), rng.choice(authors)))
+        with conn:
+            repository.add_transactions_many(conn, chunk)
+        inserted += len(chunk)
+        if progress:
+            progress(inserted, transactions)
+    conn.execute("ANALYZE")
+    conn.close()
+    return {"users": users, "accounts": users * accounts_per_user, "transactions": transactions,
+            "seconds": time.perf_counter() - started}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Заповнення синтетичної budget.db для бенчмарків")
+    parser.add_argument("--db", default="bench_budget.db")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--accounts-per-user", type=int, default=4)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--family-size", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    def report(done, total):
+        print(f"\r{done}/{total} транзакцій", end="", file=sys.stderr)
+
+    info = seed(args.db, args.users, args.accounts_per_user, args.transactions, args.family_size,
+                seed_value=args.seed, progress=report)
+    print(file=sys.stderr)
+    print(info)
+
+
+if __name__ == "__main__":
+    main()
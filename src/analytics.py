@@ -0,0 +1,144 @@
+import os
+from datetime import date, timedelta
+
+import money
+import repository
+from cache import LRUCache
+
+# Аналітика - необов'язкова частина застосунку; numpy імпортується при першому розрахунку, а не під час старту
+np = None
+
+# Аналітика рахунку на масивах NumPy: історія рахунку вантажиться одним запитом у два
+# стовпці (час, сума зі знаком), а всі розрахунки - векторні операції без циклів по рядках.
+
+SECONDS_PER_DAY = 86400
+# 1970-01-01 - четвер, тож понеділок = (день + 3) % 7
+_EPOCH_WEEKDAY_SHIFT = 3
+WEEKDAY_NAMES = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Нд")
+
+ANALYTICS_CACHE_SIZE = int(os.environ.get("BUDGET_ANALYTICS_CACHE_SIZE", "64"))
+
+
+class AnalyticsUnavailableError(Exception):
+    pass
+
+
+def require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise AnalyticsUnavailableError("Для аналітики потрібен пакет numpy (pip install numpy).") from None
+        np = numpy
+
+
+class AccountSeries:
+    # timestamps - секунди епохи (int64), amounts - суми зі знаком у гривнях (float64), за зростанням часу
+    def __init__(self, timestamps, amounts):
+        self.timestamps = timestamps
+        self.amounts = amounts
+
+    @classmethod
+    def from_rows(cls, rows):
+        require_numpy()
+        data = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        # У БД суми в копійках; для графіків і прогнозу достатньо float у гривнях
+        return cls(data[:, 0].astype(np.int64), data[:, 1] / money.MINOR_PER_UNIT)
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @property
+    def days(self):
+        return self.timestamps // SECONDS_PER_DAY
+
+    def balance_curve(self):
+        # Баланс після кожної транзакції
+        return self.timestamps, np.cumsum(self.amounts)
+
+    def daily_net(self):
+        # Щільний ряд по днях від першої до останньої транзакції: (номери днів, сума за день)
+        if not len(self):
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        days = self.days
+        first = days[0]
+        net = np.bincount(days - first, weights=self.amounts)
+        return np.arange(first, first + len(net)), net
+
+    def daily_balance(self):
+        days, net = self.daily_net()
+        return days, np.cumsum(net)
+
+    def weekday_spending(self):
+        # Витрати за днями тижня (Пн..Нд)
+        expenses = self.amounts < 0
+        weekdays = (self.days[expenses] + _EPOCH_WEEKDAY_SHIFT) % 7
+        return np.bincount(weekdays, weights=-self.amounts[expenses], minlength=7)
+
+    def forecast(self, days_ahead=30, history_days=90):
+        # Лінійний тренд балансу за останні history_days днів, продовжений на days_ahead днів.
+        # Повертає (номери днів прогнозу, прогнозований баланс).
+        days, balance = self.daily_balance()
+        if len(days) < 2:
+            start = days[-1] if len(days) else date.today().toordinal() - date(1970, 1, 1).toordinal()
+            level = balance[-1] if len(balance) else 0.0
+            future = np.arange(start + 1, start + 1 + days_ahead)
+            return future, np.full(days_ahead, level)
+        days, balance = days[-history_days:], balance[-history_days:]
+        slope, intercept = np.polyfit(days - days[0], balance, 1)
+        future = np.arange(days[-1] + 1, days[-1] + 1 + days_ahead)
+        return future, intercept + slope * (future - days[0])
+
+
+def moving_average(values, window):
+    # Ковзне середнє; перші window - 1 точок усереднюються по наявних значеннях
+    require_numpy()
+    values = np.asarray(values, dtype=np.float64)
+    if window < 1:
+        raise ValueError("Вікно має бути не менше 1.")
+    if not len(values):
+        return values
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts
+
+
+def day_to_date(day):
+    return date(1970, 1, 1) + timedelta(days=int(day))
+
+
+def downsample(x, y, points):
+    # Рівномірна вибірка точок для графіка; остання точка завжди лишається
+    if len(x) <= points:
+        return x, y
+    require_numpy()
+    idx = np.unique(np.linspace(0, len(x) - 1, points).astype(np.int64))
+    return x[idx], y[idx]
+
+
+class AnalyticsCache:
+    # Ряди рахунків у пам'яті процесу. Ключ версії - (макс. transaction_id, кількість, баланс),
+    # тож повторний перегляд звітів не читає історію, доки дані рахунку не змінились.
+    def __init__(self, maxsize=ANALYTICS_CACHE_SIZE):
+        self.entries = LRUCache(maxsize, ttl=float("inf"))
+
+    def get_series(self, conn, account_id):
+        require_numpy()
+        version = repository.get_account_version(conn, account_id)
+        cached = self.entries.get(account_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        series = AccountSeries.from_rows(repository.get_amount_series(conn, account_id))
+        self.entries.set(account_id, (version, series))
+        return series
+
+    def invalidate(self, account_id):
+        self.entries.invalidate(account_id)
+
+    def stats(self):
+        return self.entries.stats()
+
+
+analytics_cache = AnalyticsCache()
@@ -0,0 +1,216 @@
+import os
+import sqlite3
+from typing import NamedTuple
+
+import db
+import migrations
+import storage
+
+# Холодний архів транзакцій. archiver.py переносить транзакції, старіші за горизонт, у річні файли SQLite
+# "<назва БД>-archive-<рік>.db" з тією ж таблицею transactions та індексом FTS, плюс номер партії batch.
+# Реєстр archive_years у робочій БД (міграція 12) знає файли, межі ts і останню завершену партію року.
+# Файл підключається через ATTACH як archive_<рік> лише тоді, коли запит доходить до його діапазону ts.
+# Читання йде через тимчасовий вигляд archive_<рік>_transactions з рядками завершених партій, тож
+# перервана посеред перенесення партія не видна. Баланс архів не читає: перед перенесенням archiver
+# пише контрольну точку, що вже містить ці транзакції (див. ledger.py).
+
+# Тека файлів архіву; порожньо - поруч із файлом БД
+ARCHIVE_DIR = os.environ.get("BUDGET_ARCHIVE_DIR", "")
+
+_CREATE_FILE = [
+    """
+    CREATE TABLE IF NOT EXISTS transactions (
+        transaction_id INTEGER PRIMARY KEY,
+        account_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        description TEXT,
+        timestamp TEXT NOT NULL,
+        user_username TEXT NOT NULL,
+        import_hash TEXT,
+        ts INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', timestamp) AS INTEGER)) STORED,
+        batch INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_transactions_account_ts ON transactions (account_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_account_id ON transactions (account_id, transaction_id)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_account_amount ON transactions (account_id, amount)",
+    """
+    CREATE INDEX IF NOT EXISTS idx_transactions_import_hash
+    ON transactions (import_hash) WHERE import_hash IS NOT NULL
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_transactions_batch ON transactions (batch)",
+]
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class Year(NamedTuple):
+    year: int
+    file_name: str
+    batch: int
+    rows: int
+    min_ts: int
+    max_ts: int
+
+
+class Source(NamedTuple):
+    # Де лежать транзакції: table - для читання, target - для UPDATE/DELETE, fts - індекс FTS5
+    table: str
+    target: str
+    fts: str
+
+
+HOT = Source("transactions", "transactions", "transactions_fts")
+
+
+def schema_name(year: int) -> str:
+    return f"archive_{int(year)}"
+
+
+def year_source(year: int) -> Source:
+    schema = schema_name(year)
+    return Source(f"{schema}_transactions", f"{schema}.transactions", f"{schema}.transactions_fts")
+
+
+def _main_file(conn) -> str:
+    path = next(row[2] for row in conn.execute("PRAGMA database_list") if row[1] == "main")
+    if not path:
+        raise ArchiveError("Архів можливий лише для БД у файлі.")
+    return path
+
+
+def archive_dir(conn) -> str:
+    return ARCHIVE_DIR or os.path.dirname(os.path.abspath(_main_file(conn)))
+
+
+def file_name(conn, year: int) -> str:
+    stem = os.path.splitext(os.path.basename(_main_file(conn)))[0]
+    return f"{stem}-archive-{int(year)}.db"
+
+
+def create_file(path: str):
+    # Окреме з'єднання: схема і тригери FTS створюються у файлі року без префікса схеми
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        with conn:
+            for sql in _CREATE_FILE:
+                conn.execute(sql)
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'transactions_fts'").fetchone() is None:
+                conn.execute(migrations.FTS_TABLE_SQL)
+                for trigger in migrations.FTS_TRIGGERS:
+                    conn.execute(trigger)
+    finally:
+        conn.close()
+
+
+def _state(conn) -> dict:
+    # Стан архіву на з'єднанні: версія даних, на якій прочитано реєстр, і підключені роки з партією їхнього вигляду
+    state = getattr(conn, "archive_state", None)
+    if state is None:
+        state = {"version": None, "years": {}, "attached": {}}
+        try:
+            conn.archive_state = state
+        except AttributeError:
+            pass  # звичайний sqlite3.Connection (тести, скрипти): стан не кешується
+    return state
+
+
+def forget(conn):
+    # PRAGMA data_version не змінюється від записів самого з'єднання, тож після зміни реєстру
+    # на цьому з'єднанні реєстр треба перечитати явно
+    _state(conn)["version"] = None
+
+
+def registry(conn) -> dict:
+    # {рік: Year}. Реєстр перечитується, лише коли інше з'єднання щось записало в БД
+    if storage.dialect_of(conn) != "sqlite":
+        return {}
+    state = _state(conn)
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if state["version"] != version:
+        years = {}
+        if conn.execute("SELECT 1 FROM main.sqlite_master WHERE name = 'archive_years'").fetchone() is not None:
+            for row in conn.execute("SELECT year, file_name, batch, rows, min_ts, max_ts FROM main.archive_years"):
+                years[row[0]] = Year(*row)
+        state["years"] = years
+        state["version"] = version
+    return state["years"]
+
+
+def attach_file(conn, year: int, path: str):
+    # ATTACH неможливий усередині транзакції: з'єднання пулу читають без неї, записувач викликає attach_all до BEGIN
+    attached = _state(conn)["attached"]
+    if year in attached:
+        return
+    if any(row[1] == schema_name(year) for row in conn.execute("PRAGMA database_list")):
+        attached[year] = None
+        return
+    if not os.path.exists(path):
+        raise ArchiveError(f"Файл архіву {path} не знайдено.")
+    if conn.in_transaction:
+        raise ArchiveError(f"Архів за {year} рік не підключено: з'єднання всередині транзакції.")
+    conn.execute(f"ATTACH DATABASE ? AS {schema_name(year)}", (path,))
+    attached[year] = None
+
+
+def _attach_year(conn, info: Year):
+    state = _state(conn)
+    if state["attached"].get(info.year) == info.batch:
+        return
+    attach_file(conn, info.year, os.path.join(archive_dir(conn), info.file_name))
+    # Значення партії перевірене (ціле з реєстру), тож його можна підставити в текст вигляду
+    schema = schema_name(info.year)
+    conn.execute(f"DROP VIEW IF EXISTS temp.{schema}_transactions")
+    conn.execute(f"CREATE TEMP VIEW {schema}_transactions AS "
+                 f"SELECT * FROM {schema}.transactions WHERE batch <= {int(info.batch)}")
+    state["attached"][info.year] = info.batch
+
+
+def _overlaps(info: Year, lo, hi) -> bool:
+    return (hi is None or info.min_ts <= hi) and (lo is None or info.max_ts >= lo)
+
+
+def sources(conn, lo: int = None, hi: int = None) -> list:
+    # Архівні джерела, діапазон ts яких перетинає [lo, hi] (включно; None - без межі), від новіших років.
+    # Файли за межами діапазону не підключаються.
+    found = []
+    for year, info in sorted(registry(conn).items(), reverse=True):
+        if _overlaps(info, lo, hi):
+            _attach_year(conn, info)
+            found.append(year_source(year))
+    return found
+
+
+def attach_all(conn):
+    sources(conn)
+
+
+def _page_range(lo, hi, rows, limit, descending, ts_of):
+    # Якщо сторінка вже повна, рядки архіву мають бути не далі за її останній рядок
+    if len(rows) >= limit:
+        last = ts_of(rows[-1])
+        if descending:
+            lo = last if lo is None else max(lo, last)
+        else:
+            hi = last if hi is None else min(hi, last)
+    return lo, hi
+
+
+def fill(conn, rows, fetch, limit, key, descending, lo=None, hi=None, ts_of=None):
+    # Доповнює сторінку з робочої БД (rows у порядку key, не більше limit) рядками fetch(source) з років
+    # архіву, що перетинають [lo, hi]. Для сторінок, упорядкованих за часом (ts_of), роки читаються від
+    # ближчого до початку сторінки, і наступний - лише якщо його рядки ще можуть потрапити на сторінку.
+    for info in sorted(registry(conn).values(), key=lambda info: info.year, reverse=descending):
+        page_lo, page_hi = (lo, hi) if ts_of is None else _page_range(lo, hi, rows, limit, descending, ts_of)
+        if (page_lo is None or page_hi is None or page_lo <= page_hi) and _overlaps(info, page_lo, page_hi):
+            _attach_year(conn, info)
+            rows = sorted(rows + fetch(year_source(info.year)), key=key, reverse=descending)[:limit]
+    return rows
+
+
+# Записувач підключає всі роки до транзакції: редагування, видалення й перевірка імпорту бачать архів
+db.before_write(attach_all)
@@ -0,0 +1,162 @@
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, datetime
+
+import archive
+import ledger
+import metrics
+import records
+import storage
+
+# Перенесення транзакцій, старіших за горизонт, у річні файли архіву (archive.py). Кожен рік - два кроки:
+# 1) копія рядків у файл року з новим номером партії (вигляд архіву її ще не показує);
+# 2) в одній транзакції робочої БД: контрольна точка кожного рахунку партії, що вже містить ці
+#    транзакції, видалення їх з робочої БД і новий номер завершеної партії в реєстрі.
+# Рядки, змінені чи видалені між кроками, лишаються в робочій БД до наступного запуску. Після збою
+# між кроками незавершена партія невидима, а наступний запуск її відкидає й повторює.
+
+# Транзакції, старіші за стільки повних місяців від початку поточного, переносяться в архів
+ARCHIVE_MONTHS = int(os.environ.get("BUDGET_ARCHIVE_MONTHS", "24"))
+
+_COLUMNS = "transaction_id, account_id, type, amount, description, timestamp, user_username, import_hash"
+
+log = logging.getLogger("budget.archive")
+
+
+def horizon(today: date = None, months: int = ARCHIVE_MONTHS) -> date:
+    # Перший день місяця за months місяців до поточного: транзакції до нього йдуть в архів
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _copy_year(conn, schema, committed, batch, lo, hi) -> int:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Залишки перерваного запуску: партії, яких реєстр не знає
+        conn.execute(f"DELETE FROM {schema}.transactions WHERE batch > ?", (committed,))
+        copied = conn.execute(f"""
+            INSERT OR REPLACE INTO {schema}.transactions ({_COLUMNS}, batch)
+            SELECT {_COLUMNS}, ? FROM main.transactions WHERE ts >= ? AND ts < ?
+        """, (batch, lo, hi)).rowcount
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return copied
+
+
+def _move_year(conn, year, schema, batch, name) -> int:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"""
+            DELETE FROM {schema}.transactions WHERE batch = ? AND NOT EXISTS (
+                SELECT 1 FROM main.transactions h
+                WHERE h.transaction_id = {schema}.transactions.transaction_id
+                  AND h.amount = {schema}.transactions.amount
+                  AND h.description IS {schema}.transactions.description)
+        """, (batch,))
+        account_ids = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT account_id FROM {schema}.transactions WHERE batch = ?", (batch,))]
+        for account_id in account_ids:
+            last_id, balance, pending = ledger.balance_state(conn, account_id)
+            if pending:
+                ledger.write_checkpoint(conn, account_id, last_id, balance)
+        moved = conn.execute(f"""
+            DELETE FROM main.transactions
+            WHERE transaction_id IN (SELECT transaction_id FROM {schema}.transactions WHERE batch = ?)
+        """, (batch,)).rowcount
+        count, min_ts, max_ts = conn.execute(
+            f"SELECT COUNT(*), MIN(ts), MAX(ts) FROM {schema}.transactions WHERE batch <= ?", (batch,)).fetchone()
+        if count:
+            conn.execute("""
+                INSERT INTO archive_years (year, file_name, batch, rows, min_ts, max_ts, archived_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (year) DO UPDATE SET batch = excluded.batch, rows = excluded.rows,
+                    min_ts = excluded.min_ts, max_ts = excluded.max_ts, archived_at = excluded.archived_at
+            """, (year, name, batch, count, min_ts, max_ts, datetime.now().isoformat()))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        archive.forget(conn)
+    return moved
+
+
+def archive_year(conn, year: int, lo: int, hi: int) -> int:
+    # Переносить транзакції з ts у [lo, hi) року year; повертає кількість перенесених
+    if conn.execute("SELECT 1 FROM main.transactions WHERE ts >= ? AND ts < ? LIMIT 1", (lo, hi)).fetchone() is None:
+        return 0
+    years = archive.registry(conn)
+    info = years.get(year)
+    if info is None and len(years) >= conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED):
+        raise archive.ArchiveError(f"Архів уже має {len(years)} річних файлів - стільки, скільки SQLite "
+                                   f"може підключити до одного з'єднання.")
+    name = info.file_name if info else archive.file_name(conn, year)
+    path = os.path.join(archive.archive_dir(conn), name)
+    archive.create_file(path)
+    archive.attach_file(conn, year, path)
+    schema = archive.schema_name(year)
+    committed = info.batch if info else 0
+    if not _copy_year(conn, schema, committed, committed + 1, lo, hi):
+        return 0
+    return _move_year(conn, year, schema, committed + 1, name)
+
+
+def archive_before(store: storage.Storage, cutoff: date, vacuum: bool = False) -> dict:
+    # Переносить в архів транзакції до cutoff (не включно). vacuum - стиснути робочу БД після перенесення.
+    if not isinstance(store, storage.SQLiteStorage):
+        raise archive.ArchiveError("Архів у файлах року підтримується лише для SQLite.")
+    started = time.perf_counter()
+    cutoff_ts = records.date_to_ts(cutoff)
+    moved = {}
+    with store.connect(query_timeout=None) as conn:
+        first = conn.execute("SELECT MIN(ts) FROM transactions").fetchone()[0]
+        if first is not None and first < cutoff_ts:
+            for year in range(records.ts_to_date(first).year, cutoff.year + 1):
+                lo = max(first, records.date_to_ts(date(year, 1, 1)))
+                hi = min(cutoff_ts, records.date_to_ts(date(year + 1, 1, 1)))
+                if lo < hi:
+                    count = archive_year(conn, year, lo, hi)
+                    if count:
+                        moved[year] = count
+        if vacuum and moved:
+            conn.execute("VACUUM main")
+    report = {"cutoff": cutoff.isoformat(), "years": moved, "transactions": sum(moved.values()),
+              "seconds": time.perf_counter() - started}
+    metrics.log_event(log, logging.INFO, "archive", **report)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перенесення старих транзакцій у річні файли архіву")
+    parser.add_argument("--db", default="budget.db", help="шлях до SQLite")
+    parser.add_argument("--months", type=int, default=ARCHIVE_MONTHS,
+                        help="скільки повних місяців історії лишити в робочій БД")
+    parser.add_argument("--before", type=date.fromisoformat, help="перенести транзакції до цієї дати (РРРР-ММ-ДД)")
+    parser.add_argument("--vacuum", action="store_true", help="стиснути файл робочої БД після перенесення")
+    args = parser.parse_args(argv)
+
+    store = storage.from_url(args.db)
+    try:
+        store.configure()
+        store.migrate()
+        report = archive_before(store, args.before or horizon(months=args.months), args.vacuum)
+    except archive.ArchiveError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    for year, count in sorted(report["years"].items()):
+        print(f"{year}: перенесено транзакцій {count}")
+    print(f"Архів до {report['cutoff']}: перенесено {report['transactions']} транзакцій", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
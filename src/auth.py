@@ -0,0 +1,189 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import repository
+
+# Паролі зберігаються як scrypt-хеші "scrypt$n$r$p$сіль$хеш". scrypt навмисно дорогий за пам'яттю і CPU,
+# тому рахується не в обробнику Flet і не в пулі потоків БД, а в окремому обмеженому пулі
+# (hashlib.scrypt відпускає GIL). Переповнена черга і забагато спроб з однієї IP-адреси чи для
+# одного імені відхиляються одразу, не витрачаючи CPU на хешування.
+
+SCRYPT_N = int(os.environ.get("BUDGET_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("BUDGET_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("BUDGET_SCRYPT_P", "1"))
+SALT_BYTES = 16
+HASH_BYTES = 32
+HASH_PREFIX = "scrypt"
+
+HASH_WORKERS = int(os.environ.get("BUDGET_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Скільки входів/реєстрацій може чекати на хешування, крім тих, що вже рахуються
+HASH_QUEUE_SIZE = int(os.environ.get("BUDGET_HASH_QUEUE_SIZE", "32"))
+# Не більше LOGIN_ATTEMPTS спроб за LOGIN_WINDOW секунд з однієї IP-адреси і для одного імені
+LOGIN_ATTEMPTS = int(os.environ.get("BUDGET_LOGIN_ATTEMPTS", "10"))
+LOGIN_WINDOW = float(os.environ.get("BUDGET_LOGIN_WINDOW", "60"))
+
+
+class AuthBusyError(Exception):
+    pass
+
+
+class RateLimitedError(Exception):
+    pass
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # maxmem за замовчуванням (32 МБ) замалий для n > 2**14; рахуємо потрібне з параметрів
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=HASH_BYTES,
+                          maxmem=128 * r * (n + p + 2) + 1024 * 1024)
+
+
+def hash_password(password: str, n: int = None, r: int = None, p: int = None) -> str:
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = secrets.token_bytes(SALT_BYTES)
+    return f"{HASH_PREFIX}${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+
+def _parse(stored: str):
+    # (n, r, p, сіль, хеш) або None для пароля, збереженого до хешування (відкритим текстом)
+    parts = stored.split("$")
+    if len(parts) != 6 or parts[0] != HASH_PREFIX:
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), int(parts[3]), base64.b64decode(parts[4]), base64.b64decode(parts[5])
+    except ValueError:
+        return None
+
+
+def verify_password(password: str, stored: str) -> bool:
+    parsed = _parse(stored)
+    if parsed is None:
+        return hmac.compare_digest(password.encode(), stored.encode())
+    n, r, p, salt, expected = parsed
+    return hmac.compare_digest(_scrypt(password, salt, n, r, p), expected)
+
+
+def needs_rehash(stored: str) -> bool:
+    # Відкритий текст або хеш зі старими параметрами (після зміни BUDGET_SCRYPT_*)
+    parsed = _parse(stored)
+    return parsed is None or parsed[:3] != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+_dummy_hash = None
+
+
+def _dummy():
+    # Хеш для неіснуючого користувача: відповідь займає стільки ж часу, скільки для наявного
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(secrets.token_hex(8))
+    return _dummy_hash
+
+
+def warm_up():
+    # Під час запуску процесу: перший вхід з неіснуючим ім'ям не чекає на обчислення хеша-замінника
+    _dummy()
+
+
+def login(store, username: str, password: str) -> bool:
+    # Виконується в пулі хешування. Після успішного входу хеш зі старими параметрами чи
+    # відкритий пароль непомітно для користувача замінюється новим хешем.
+    with store.connect() as conn:
+        user = repository.get_user(conn, username)
+    if user is None:
+        verify_password(password, _dummy())
+        return False
+    stored = user["password"]
+    if not verify_password(password, stored):
+        return False
+    if needs_rehash(stored):
+        store.run_write(repository.set_password, username, hash_password(password))
+    return True
+
+
+def register(store, username: str, password: str) -> bool:
+    # False, якщо ім'я зайняте
+    password_hash = hash_password(password)
+    return store.run_write(repository.create_user, username, password_hash)
+
+
+class HashPool:
+    # Пул потоків з обмеженою чергою: submit відмовляє, коли зайняті всі workers і queue_size місць
+    def __init__(self, workers=HASH_WORKERS, queue_size=HASH_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise AuthBusyError("Забагато одночасних входів, спробуйте за кілька секунд.")
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="budget-auth")
+                future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args, timeout=None):
+        return self.submit(fn, *args).result(timeout)
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RateLimiter:
+    # Ковзне вікно: не більше limit подій на ключ за window секунд (у межах процесу)
+    def __init__(self, limit=LOGIN_ATTEMPTS, window=LOGIN_WINDOW, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def hit(self, *keys):
+        # Рахує спробу для кожного ключа; RateLimitedError, якщо хоч один ключ вичерпав ліміт
+        now = self.clock()
+        with self._lock:
+            for key in keys:
+                events = self._events.get(key)
+                if events is not None:
+                    while events and events[0] <= now - self.window:
+                        events.popleft()
+                if events and len(events) >= self.limit:
+                    retry_after = int(events[0] + self.window - now) + 1
+                    raise RateLimitedError(f"Забагато спроб. Спробуйте через {retry_after} с.")
+            for key in keys:
+                self._events.setdefault(key, deque()).append(now)
+            # Порожні черги старих ключів не накопичуються
+            if len(self._events) > 10_000:
+                self._events = {key: events for key, events in self._events.items()
+                                if events and events[-1] > now - self.window}
+
+    def reset(self, key):
+        with self._lock:
+            self._events.pop(key, None)
+
+
+hash_pool = HashPool()
+login_limiter = RateLimiter()
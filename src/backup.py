@@ -0,0 +1,340 @@
+import argparse
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import archive
+import metrics
+import storage
+
+# Резервні копії SQLite без зупинки застосунку. Файл копіюється API резервного копіювання SQLite кроками
+# по BUDGET_BACKUP_PAGES сторінок з паузою BUDGET_BACKUP_SLEEP між ними, тож копія не забирає диск
+# у запитів користувачів. Джерело весь час тримає одну транзакцію читання: у WAL вона не заважає записувачу,
+# а копія - знімок БД на її початок (без неї кожен запис іншого з'єднання починав би копіювання спочатку).
+# Знімок - тека "<назва БД>-РРРРММДД-ГГХХСС" з файлом БД і файлами архіву з реєстру знімка (archive.py).
+# Вона пишеться з суфіксом ".part" і перейменовується лише повною, тож перерване копіювання не видно.
+
+# Тека знімків; порожньо - "backups" поруч із файлом БД
+BACKUP_DIR = os.environ.get("BUDGET_BACKUP_DIR", "")
+# Як часто застосунок робить знімок (с); 0 - лише командою
+BACKUP_INTERVAL = float(os.environ.get("BUDGET_BACKUP_INTERVAL", "86400"))
+# Скільки останніх знімків зберігати; 0 - усі
+BACKUP_KEEP = int(os.environ.get("BUDGET_BACKUP_KEEP", "7"))
+BACKUP_PAGES = int(os.environ.get("BUDGET_BACKUP_PAGES", "256"))
+BACKUP_SLEEP = float(os.environ.get("BUDGET_BACKUP_SLEEP", "0.01"))
+BACKUP_COMPRESS = os.environ.get("BUDGET_BACKUP_COMPRESS", "0") == "1"
+
+_PART = ".part"
+_CHUNK = 1024 * 1024
+_STAMP = "%Y%m%d-%H%M%S"
+_ARCHIVE_FILE_RE = re.compile(r"-archive-\d+\.db$")
+
+log = logging.getLogger("budget.backup")
+
+
+class BackupError(Exception):
+    pass
+
+
+def backup_dir(db_path: str) -> str:
+    return BACKUP_DIR or os.path.join(os.path.dirname(os.path.abspath(db_path)), "backups")
+
+
+def _name_re(db_path):
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return re.compile(re.escape(stem) + r"-(\d{8}-\d{6})(?:-(\d+))?")
+
+
+def list_snapshots(db_path: str, directory: str = None) -> list:
+    # Назви повних знімків БД, від новіших; знімки однієї секунди мають суфікс -2, -3, ...
+    directory = directory or backup_dir(db_path)
+    if not os.path.isdir(directory):
+        return []
+    pattern = _name_re(db_path)
+    found = []
+    for name in os.listdir(directory):
+        match = pattern.fullmatch(name)
+        if match and os.path.isdir(os.path.join(directory, name)):
+            found.append((match.group(1), int(match.group(2) or 1), name))
+    return [name for _, _, name in sorted(found, reverse=True)]
+
+
+def snapshot_time(db_path: str, name: str) -> datetime:
+    return datetime.strptime(_name_re(db_path).fullmatch(name).group(1), _STAMP)
+
+
+def _new_name(db_path, directory, now):
+    name = f"{os.path.splitext(os.path.basename(db_path))[0]}-{now:{_STAMP}}"
+    candidate, n = name, 1
+    while any(os.path.exists(os.path.join(directory, candidate + suffix)) for suffix in ("", _PART)):
+        n += 1
+        candidate = f"{name}-{n}"
+    return candidate
+
+
+@contextmanager
+def _snapshot_of(path):
+    # З'єднання з відкритою транзакцією читання: усе, що через нього прочитано, - стан на її початок
+    if not os.path.exists(path):
+        raise BackupError(f"Файл {path} не знайдено.")
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        yield conn
+    finally:
+        conn.close()
+
+
+def _copy(source, path, pages, sleep, stop=None) -> int:
+    # Копіює БД з'єднання source у новий файл path кроками по pages сторінок; повертає кількість сторінок
+    copied = 0
+
+    def progress(status, remaining, total):
+        nonlocal copied
+        copied = total
+        if stop is not None and stop.is_set():
+            raise BackupError("Копіювання перервано.")
+        if remaining and sleep > 0:
+            time.sleep(sleep)
+
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target, pages=pages, progress=progress)
+        # Знімок - один самодостатній файл, без -wal
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+    return copied
+
+
+def _compress(path) -> str:
+    with open(path, "rb") as src, gzip.open(path + ".gz", "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, _CHUNK)
+    os.remove(path)
+    return path + ".gz"
+
+
+def _write_snapshot(db_path, part, pages, sleep, compress, stop):
+    with _snapshot_of(db_path) as source:
+        # Реєстр архіву читається в тій самій транзакції, що й копія: роки і партії збігаються зі знімком
+        directory = archive.archive_dir(source)
+        years = [info.file_name for _, info in sorted(archive.registry(source).items())]
+        files = [os.path.basename(db_path)]
+        total = _copy(source, os.path.join(part, files[0]), pages, sleep, stop)
+    # Файл року змінює лише archiver, і рядки партій, яких реєстр знімка ще не знає, вигляд архіву не показує
+    for name in years:
+        with _snapshot_of(os.path.join(directory, name)) as source:
+            total += _copy(source, os.path.join(part, name), pages, sleep, stop)
+        files.append(name)
+    if compress:
+        files = [os.path.basename(_compress(os.path.join(part, name))) for name in files]
+    return files, total
+
+
+def prune(db_path: str, directory: str = None, keep: int = BACKUP_KEEP) -> list:
+    # Видаляє знімки, старіші за keep останніх; повертає їхні назви
+    if keep <= 0:
+        return []
+    directory = directory or backup_dir(db_path)
+    removed = list_snapshots(db_path, directory)[keep:]
+    for name in removed:
+        shutil.rmtree(os.path.join(directory, name))
+    return removed
+
+
+def create_backup(db_path: str, directory: str = None, pages: int = BACKUP_PAGES, sleep: float = BACKUP_SLEEP,
+                  compress: bool = BACKUP_COMPRESS, keep: int = BACKUP_KEEP, stop: threading.Event = None) -> dict:
+    # Знімок БД db_path (і її архіву) у новій теці directory; stop - подія, що перериває копіювання
+    started = time.perf_counter()
+    directory = directory or backup_dir(db_path)
+    os.makedirs(directory, exist_ok=True)
+    name = _new_name(db_path, directory, datetime.now())
+    part = os.path.join(directory, name + _PART)
+    os.mkdir(part)
+    metrics.backup_running.inc()
+    try:
+        files, pages_copied = _write_snapshot(db_path, part, pages, sleep, compress, stop)
+        os.rename(part, os.path.join(directory, name))
+    except BaseException:
+        shutil.rmtree(part, ignore_errors=True)
+        metrics.backups_total.inc("failed")
+        raise
+    finally:
+        metrics.backup_running.inc(amount=-1)
+    size = sum(os.path.getsize(os.path.join(directory, name, file)) for file in files)
+    report = {"snapshot": name, "files": files, "pages": pages_copied, "bytes": size,
+              "removed": prune(db_path, directory, keep), "seconds": time.perf_counter() - started}
+    metrics.backups_total.inc("ok")
+    metrics.backup_seconds.observe(report["seconds"])
+    metrics.backup_bytes.set(value=size)
+    metrics.log_event(log, logging.INFO, "backup", **report)
+    return report
+
+
+def _check(path):
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    except sqlite3.DatabaseError as exc:
+        result = str(exc)
+    finally:
+        conn.close()
+    if result != "ok":
+        raise BackupError(f"Файл знімка {os.path.basename(path)} пошкоджено: {result}")
+
+
+def _restore_file(source_path, target_path):
+    # Через API резервного копіювання: файл цілі переписується її ж з'єднанням, тож -wal не лишається старим
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def restore_backup(snapshot: str, db_path: str, directory: str = None) -> list:
+    # Відновлює БД і файли архіву зі знімка (шлях до теки або її назва в теці знімків); повертає назви
+    # файлів, першою - БД. Застосунок на час відновлення має бути зупинений.
+    path = snapshot if os.path.isdir(snapshot) else os.path.join(directory or backup_dir(db_path), snapshot)
+    if not os.path.isdir(path):
+        raise BackupError(f"Знімок {snapshot} не знайдено.")
+    files = sorted(os.listdir(path))
+    main_files = [name for name in files if not _ARCHIVE_FILE_RE.search(name.removesuffix(".gz"))]
+    if len(main_files) != 1:
+        raise BackupError(f"У знімку {snapshot} немає файлу БД.")
+    target_dir = os.path.dirname(os.path.abspath(db_path))
+    with tempfile.TemporaryDirectory(dir=target_dir) as tmp:
+        # Спершу всі файли розпаковуються й перевіряються, і лише потім перезаписується хоч один файл цілі
+        sources = {}
+        for name in files:
+            source = os.path.join(path, name)
+            if name.endswith(".gz"):
+                name = name[:-3]
+                with gzip.open(source, "rb") as src, open(os.path.join(tmp, name), "wb") as dst:
+                    shutil.copyfileobj(src, dst, _CHUNK)
+                source = os.path.join(tmp, name)
+            _check(source)
+            sources[name] = source
+        main_file = main_files[0].removesuffix(".gz")
+        # Файли архіву - раніше за БД, щоб її реєстр не вказував на ще не відновлені роки
+        archive_dir = archive.ARCHIVE_DIR or target_dir
+        for name, source in sources.items():
+            if name != main_file:
+                _restore_file(source, os.path.join(archive_dir, name))
+        _restore_file(sources[main_file], db_path)
+    restored = [main_file] + sorted(name for name in sources if name != main_file)
+    metrics.log_event(log, logging.INFO, "restore", snapshot=os.path.basename(path), files=restored)
+    return restored
+
+
+class BackupScheduler:
+    # Фоновий потік, що робить знімок, коли найновіший у теці старший за interval. Знімки інших
+    # воркерів з тією самою БД теж враховуються, тож кілька процесів не копіюють БД кожен окремо.
+    def __init__(self, db_path, interval=BACKUP_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        # Після старту чи невдалої спроби - не частіше за хвилину
+        self.retry = min(interval, 60)
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="budget-backup", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def due_in(self) -> float:
+        newest = list_snapshots(self.db_path)[:1]
+        if not newest:
+            return 0.0
+        return self.interval - (datetime.now() - snapshot_time(self.db_path, newest[0])).total_seconds()
+
+    def _run(self):
+        while not self._stop.wait(max(self.due_in(), self.retry)):
+            if self.due_in() > 0:
+                continue
+            try:
+                self.last_report = create_backup(self.db_path, stop=self._stop)
+            except (sqlite3.Error, OSError, BackupError) as exc:
+                metrics.log_event(log, logging.ERROR, "backup_failed", error=str(exc))
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler(store, interval=BACKUP_INTERVAL):
+    # Один на процес; PostgreSQL копіюють його засобами (pg_dump, реплікація)
+    global _scheduler
+    if interval <= 0 or not isinstance(store, storage.SQLiteStorage):
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = BackupScheduler(store.path, interval).start()
+        return _scheduler
+
+
+def stop_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.stop(timeout=5)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Резервні копії БД SQLite без зупинки застосунку")
+    parser.add_argument("--db", default="budget.db", help="шлях до SQLite")
+    parser.add_argument("--dir", help="тека знімків (за замовчуванням backups поруч із БД)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="зробити знімок")
+    create.add_argument("--keep", type=int, default=BACKUP_KEEP, help="скільки останніх знімків зберігати (0 - усі)")
+    create.add_argument("--compress", action="store_true", default=BACKUP_COMPRESS, help="стиснути файли gzip")
+    create.add_argument("--pages", type=int, default=BACKUP_PAGES, help="сторінок БД за крок")
+    create.add_argument("--sleep", type=float, default=BACKUP_SLEEP, help="пауза між кроками (с)")
+    commands.add_parser("list", help="показати знімки, від новіших")
+    restore = commands.add_parser("restore", help="відновити БД зі знімка (застосунок має бути зупинений)")
+    restore.add_argument("snapshot", help="назва знімка або шлях до його теки")
+    args = parser.parse_args(argv)
+
+    store = storage.from_url(args.db)
+    if not isinstance(store, storage.SQLiteStorage):
+        print("Знімки робляться лише для SQLite; PostgreSQL копіюють через pg_dump.", file=sys.stderr)
+        return 1
+    try:
+        if args.command == "create":
+            report = create_backup(store.path, args.dir, args.pages, args.sleep, args.compress, args.keep)
+            print(os.path.join(args.dir or backup_dir(store.path), report["snapshot"]))
+            print(f"Скопійовано сторінок {report['pages']} за {report['seconds']:.1f} с, "
+                  f"видалено старих знімків {len(report['removed'])}", file=sys.stderr)
+        elif args.command == "list":
+            for name in list_snapshots(store.path, args.dir):
+                print(name)
+        else:
+            for name in restore_backup(args.snapshot, store.path, args.dir):
+                print(f"Відновлено {name}")
+    except (BackupError, sqlite3.Error) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
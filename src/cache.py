@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = int(os.environ.get("BUDGET_CACHE_SIZE", "1024"))
+DEFAULT_CACHE_TTL = float(os.environ.get("BUDGET_CACHE_TTL", "30"))
+
+_MISSING = object()
+
+
+class LRUCache:
+    # LRU-кеш з обмеженим розміром і часом життя записів. Спільний для всіх сесій процесу.
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, clock=time.monotonic):
+        if maxsize < 1:
+            raise ValueError("Розмір кешу має бути не менше 1.")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at <= self.clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self.clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            return self._data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class BudgetCache:
+    # Кеш рахунків (за account_id) і даних головної сторінки (за username).
+    # Дані головної сторінки залежать від кількох рахунків, тому тримаємо зворотний
+    # індекс account_id -> користувачі, щоб запис у рахунок скидав і їхні записи.
+    # enabled=False - кожне читання йде через loader (інвалідації не спільні між процесами).
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, clock=time.monotonic, enabled=True):
+        self.enabled = enabled
+        self.accounts = LRUCache(maxsize, ttl, clock)
+        self.homes = LRUCache(maxsize, ttl, clock)
+        self._home_users = {}
+        self._lock = threading.Lock()
+        # Лічильник інвалідацій: значення, прочитане до запису, не потрапляє в кеш після нього
+        self._generation = 0
+
+    def get_account(self, account_id, loader):
+        if not self.enabled:
+            return loader()
+        account = self.accounts.get(account_id, _MISSING)
+        if account is _MISSING:
+            generation = self._generation
+            account = loader()
+            with self._lock:
+                if generation == self._generation:
+                    self.accounts.set(account_id, account)
+        return account
+
+    def get_home(self, username, loader):
+        # loader повертає словник з ключем "account_ids"
+        if not self.enabled:
+            return loader()
+        home = self.homes.get(username, _MISSING)
+        if home is _MISSING:
+            generation = self._generation
+            home = loader()
+            with self._lock:
+                if generation == self._generation:
+                    self.homes.set(username, home)
+                    for account_id in home["account_ids"]:
+                        self._home_users.setdefault(account_id, set()).add(username)
+        return home
+
+    def invalidate_account(self, account_id):
+        with self._lock:
+            self._generation += 1
+            self.accounts.invalidate(account_id)
+            usernames = self._home_users.pop(account_id, set())
+        for username in usernames:
+            self.homes.invalidate(username)
+
+    def invalidate_user(self, username):
+        with self._lock:
+            self._generation += 1
+        self.homes.invalidate(username)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._home_users.clear()
+        self.accounts.clear()
+        self.homes.clear()
+
+    def stats(self):
+        return {"accounts": self.accounts.stats(), "homes": self.homes.stats()}
+
+
+# Кеш одного процесу: воркери uvicorn (--workers, BUDGET_WORKERS) не бачать записів і інвалідацій
+# один одного, тож з кількома воркерами кеш вимкнено, і баланс читається з БД
+budget_cache = BudgetCache(enabled=int(os.environ.get("BUDGET_WORKERS", "1")) <= 1)
@@ -0,0 +1,520 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+import metrics
+
+# Розмір пулу можна задати через змінну середовища
+DEFAULT_POOL_SIZE = int(os.environ.get("BUDGET_DB_POOL_SIZE", "5"))
+DEFAULT_ACQUIRE_TIMEOUT = float(os.environ.get("BUDGET_DB_POOL_TIMEOUT", "10"))
+DEFAULT_WRITE_QUEUE_SIZE = int(os.environ.get("BUDGET_DB_WRITE_QUEUE_SIZE", "100"))
+# Найдовший час виконання одного запиту читання (с); довші перериваються з QueryTimeoutError
+DEFAULT_QUERY_TIMEOUT = float(os.environ.get("BUDGET_DB_QUERY_TIMEOUT", "10"))
+# Потоки для фонових операцій з БД з інтерфейсу (db.submit); кожен бере з'єднання з пулу
+DEFAULT_WORKERS = int(os.environ.get("BUDGET_DB_WORKERS", str(DEFAULT_POOL_SIZE)))
+# Як часто (у кроках віртуальної машини SQLite) перевіряється час запиту
+PROGRESS_STEPS = 1000
+
+# Налаштування SQLite за замовчуванням. WAL дозволяє читачам не чекати на записувача.
+DEFAULT_DB_CONFIG = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -20000,  # від'ємне значення - розмір у КіБ (≈20 МБ)
+    "mmap_size": 268435456,
+}
+
+# Ці PRAGMA діють лише на поточне з'єднання, тому їх треба ставити на кожне нове
+CONNECTION_PRAGMAS = ("synchronous", "busy_timeout", "cache_size", "mmap_size")
+
+_ENV_KEYS = {
+    "journal_mode": "BUDGET_DB_JOURNAL_MODE",
+    "synchronous": "BUDGET_DB_SYNCHRONOUS",
+    "busy_timeout": "BUDGET_DB_BUSY_TIMEOUT",
+    "cache_size": "BUDGET_DB_CACHE_SIZE",
+    "mmap_size": "BUDGET_DB_MMAP_SIZE",
+}
+_INT_KEYS = ("busy_timeout", "cache_size", "mmap_size")
+_JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+_SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class PoolClosedError(Exception):
+    pass
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class WriteQueueFullError(Exception):
+    pass
+
+
+class QueryTimeoutError(Exception):
+    pass
+
+
+def load_db_config(path=None, environ=None):
+    # Порядок пріоритету: значення за замовчуванням < JSON-файл < змінні середовища
+    environ = os.environ if environ is None else environ
+    config = dict(DEFAULT_DB_CONFIG)
+
+    path = path or environ.get("BUDGET_DB_CONFIG")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            file_config = json.load(f)
+        unknown = set(file_config) - set(DEFAULT_DB_CONFIG)
+        if unknown:
+            raise ValueError(f"Невідомі параметри БД у {path}: {', '.join(sorted(unknown))}")
+        config.update(file_config)
+
+    for key, env_name in _ENV_KEYS.items():
+        if env_name in environ:
+            config[key] = environ[env_name]
+
+    for key in _INT_KEYS:
+        config[key] = int(config[key])
+    config["journal_mode"] = str(config["journal_mode"]).upper()
+    config["synchronous"] = str(config["synchronous"]).upper()
+    if config["journal_mode"] not in _JOURNAL_MODES:
+        raise ValueError(f"Невідомий journal_mode: {config['journal_mode']}")
+    if config["synchronous"] not in _SYNCHRONOUS_LEVELS:
+        raise ValueError(f"Невідомий рівень synchronous: {config['synchronous']}")
+    return config
+
+
+def apply_connection_pragmas(conn, config):
+    # Значення вже перевірені в load_db_config, тому їх можна підставити в текст PRAGMA
+    for key in CONNECTION_PRAGMAS:
+        conn.execute(f"PRAGMA {key} = {config[key]}")
+
+
+class MeasuredCursor(sqlite3.Cursor):
+    # SQLite виконує SELECT поступово, під час вибірки рядків, тож час запиту - execute плюс усі fetch.
+    # Запит записується в metrics, коли курсор вичерпано або з'єднання виконує наступний запит.
+    sql = None
+    elapsed = 0.0
+    rows = 0
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self.elapsed += time.perf_counter() - started
+        if row is None:
+            self.finish()
+        else:
+            self.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self.elapsed += time.perf_counter() - started
+        self.rows += len(rows)
+        if len(rows) < size:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self.elapsed += time.perf_counter() - started
+        self.rows += len(rows)
+        self.finish()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self.elapsed += time.perf_counter() - started
+            self.finish()
+            raise
+        self.elapsed += time.perf_counter() - started
+        self.rows += 1
+        return row
+
+    def finish(self):
+        if self.sql is not None:
+            sql, self.sql = self.sql, None
+            metrics.observe_query(sql, self.elapsed, self.rows or max(self.rowcount, 0))
+
+
+class TimedConnection(sqlite3.Connection):
+    # Обробник прогресу SQLite перериває запит, що триває довше за query_timeout (None - без обмеження).
+    # Відлік починається з кожного execute, тож обмеження діє на окремий запит, а не на весь блок.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query_timeout = None
+        self.timed_out = False
+        self._deadline = None
+        self._measured = None
+        self.set_progress_handler(self._check_deadline, PROGRESS_STEPS)
+
+    def _check_deadline(self):
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            self.timed_out = True
+            return 1
+        return 0
+
+    def start_timer(self):
+        self.timed_out = False
+        self._deadline = None if self.query_timeout is None else time.monotonic() + self.query_timeout
+
+    def finish_query(self):
+        # Дописує в metrics попередній запит, якщо його курсор не дочитали до кінця
+        if self._measured is not None:
+            self._measured.finish()
+            self._measured = None
+
+    def execute(self, sql, *args):
+        self.start_timer()
+        if not metrics.ENABLED:
+            return super().execute(sql, *args)
+        self.finish_query()
+        cur = self.cursor(MeasuredCursor)
+        started = time.perf_counter()
+        cur.execute(sql, *args)
+        cur.elapsed = time.perf_counter() - started
+        cur.sql = sql
+        self._measured = cur
+        return cur
+
+    def executemany(self, sql, *args):
+        self.start_timer()
+        if not metrics.ENABLED:
+            return super().executemany(sql, *args)
+        self.finish_query()
+        started = time.perf_counter()
+        cur = super().executemany(sql, *args)
+        metrics.observe_query(sql, time.perf_counter() - started, max(cur.rowcount, 0))
+        return cur
+
+    def executescript(self, *args):
+        self.start_timer()
+        self.finish_query()
+        return super().executescript(*args)
+
+
+class ConnectionPool:
+    def __init__(self, db_file, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_ACQUIRE_TIMEOUT, config=None):
+        if size < 1:
+            raise ValueError("Розмір пулу має бути не менше 1.")
+        self.db_file = db_file
+        self.size = size
+        self.timeout = timeout
+        self.config = config
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+        self._all = []
+        # Метрики пулу
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def _connect(self):
+        # Одне з'єднання використовує лише один потік за раз, але потоки Flet різні
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, factory=TimedConnection)
+        conn.row_factory = sqlite3.Row
+        if self.config:
+            apply_connection_pragmas(conn, self.config)
+        return conn
+
+    def acquire(self):
+        if self._closed:
+            raise PoolClosedError("Пул з'єднань закрито.")
+
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+                self.misses += 1
+        if can_open:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+            with self._lock:
+                self._all.append(conn)
+            return conn
+
+        # Усі з'єднання зайняті: чекаємо, поки якесь повернуть
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeoutError(f"Не вдалося отримати з'єднання за {self.timeout} с.")
+        finally:
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - started
+        if self._closed:
+            conn.close()
+            raise PoolClosedError("Пул з'єднань закрито.")
+        return conn
+
+    def release(self, conn):
+        if self._closed:
+            conn.close()
+            return
+        conn.finish_query()
+        # Незавершену транзакцію не можна віддавати іншому обробнику
+        if conn.in_transaction:
+            conn.rollback()
+        conn.query_timeout = None
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            connections = list(self._all)
+            self._all.clear()
+            self._opened = 0
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "idle": self._idle.qsize(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+            }
+
+
+# Функції fn(conn), які записувач викликає перед кожною транзакцією запису. Вони працюють поза
+# транзакцією, тож можуть виконати ATTACH (archive.py підключає так файли архіву)
+_write_setup = []
+
+
+def before_write(fn):
+    if fn not in _write_setup:
+        _write_setup.append(fn)
+
+
+class WriteQueue:
+    # Усі записи йдуть через одне з'єднання в окремому потоці, тож записувачі
+    # не змагаються за блокування файлу, а читачі (WAL) їх не чекають
+    def __init__(self, db_file, maxsize=DEFAULT_WRITE_QUEUE_SIZE, config=None):
+        self.db_file = db_file
+        self.config = config
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="budget-db-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_file, factory=TimedConnection)
+        conn.row_factory = sqlite3.Row
+        if self.config:
+            apply_connection_pragmas(conn, self.config)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                future, fn, args = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                started = time.perf_counter()
+                try:
+                    for setup in _write_setup:
+                        setup(conn)
+                    with conn:
+                        # Блокування запису береться одразу: записувачі інших процесів з тим самим
+                        # файлом чекають (busy_timeout), а не отримують помилку посеред транзакції
+                        conn.execute("BEGIN IMMEDIATE")
+                        result = fn(conn, *args)
+                        conn.finish_query()
+                except BaseException as exc:
+                    metrics.observe_write(time.perf_counter() - started)
+                    future.set_exception(exc)
+                else:
+                    metrics.observe_write(time.perf_counter() - started)
+                    future.set_result(result)
+        finally:
+            conn.close()
+
+    def submit(self, fn, *args, timeout=None):
+        if self._closed:
+            raise PoolClosedError("Черга запису закрита.")
+        future = Future()
+        try:
+            self._queue.put((future, fn, args), timeout=timeout)
+        except queue.Full:
+            raise WriteQueueFullError("Черга запису переповнена, спробуйте пізніше.")
+        return future
+
+    def run(self, fn, *args, timeout=None):
+        future = self.submit(fn, *args, timeout=timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Ще не почату операцію знімаємо з черги; почата завершиться в потоці записувача
+            future.cancel()
+            raise QueryTimeoutError(f"Запис не завершився за {timeout} с.") from None
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+_pool = None
+_writer = None
+_executor = None
+_config = None
+_pool_lock = threading.Lock()
+
+
+def configure(db_file, config=None):
+    # Викликається з init_db() у main.bootstrap(): вмикає WAL (зберігається у файлі БД) і запам'ятовує
+    # PRAGMA для всіх наступних з'єднань пулу та записувача
+    global _config
+    config = config or load_db_config()
+    conn = sqlite3.connect(db_file)
+    try:
+        mode = conn.execute(f"PRAGMA journal_mode = {config['journal_mode']}").fetchone()[0]
+    finally:
+        conn.close()
+    # Пул перевідкриваємо лише якщо налаштування змінилися, щоб не рвати з'єднання інших сесій
+    if config != _config:
+        close_pool()
+        with _pool_lock:
+            _config = config
+    return mode
+
+
+def init_pool(db_file, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_ACQUIRE_TIMEOUT):
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.close()
+        _pool = ConnectionPool(db_file, size=size, timeout=timeout, config=_config)
+        return _pool
+
+
+def get_pool(db_file):
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed or _pool.db_file != db_file:
+            if _pool is not None and not _pool.closed:
+                _pool.close()
+            _pool = ConnectionPool(db_file, config=_config)
+        return _pool
+
+
+def get_writer(db_file):
+    global _writer
+    with _pool_lock:
+        if _writer is None or _writer.closed or _writer.db_file != db_file:
+            if _writer is not None and not _writer.closed:
+                _writer.close()
+            _writer = WriteQueue(db_file, config=_config)
+        return _writer
+
+
+def run_write(db_file, fn, *args, timeout=None):
+    # fn(conn, *args) виконується в потоці записувача всередині однієї транзакції
+    return get_writer(db_file).run(fn, *args, timeout=timeout)
+
+
+def submit(fn, *args):
+    # Обробники Flet не чекають на БД: fn(*args) виконується у фоновому потоці, результат - у Future
+    global _executor
+    with _pool_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DEFAULT_WORKERS, thread_name_prefix="budget-db")
+        executor = _executor
+    return executor.submit(fn, *args)
+
+
+def stats():
+    # Для metrics: стан поточного пулу (None, якщо ще не відкритий) і довжина черги запису
+    with _pool_lock:
+        pool, writer = _pool, _writer
+    return {
+        "pool": pool.stats() if pool is not None and not pool.closed else None,
+        "write_queue": writer.pending() if writer is not None and not writer.closed else 0,
+    }
+
+
+def close_pool():
+    global _pool, _writer, _executor
+    with _pool_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
+def connect(db_file, query_timeout=DEFAULT_QUERY_TIMEOUT):
+    # Поводиться як `with sqlite3.connect(...)`: commit при успіху, rollback при помилці,
+    # але з'єднання повертається в пул, а не залишається відкритим.
+    # query_timeout=None знімає обмеження часу (міграції, фонові перевірки).
+    with get_pool(db_file).connection() as conn:
+        conn.query_timeout = query_timeout
+        conn.start_timer()
+        try:
+            with conn:
+                yield conn
+        except sqlite3.OperationalError as exc:
+            if conn.timed_out:
+                raise QueryTimeoutError(f"Запит не завершився за {query_timeout} с.") from exc
+            raise
@@ -0,0 +1,70 @@
+from typing import NamedTuple
+
+# Типи змін спільного рахунку, які розсилаються всім сесіям, що його переглядають
+TRANSACTION_ADDED = "transaction_added"
+TRANSACTION_EDITED = "transaction_edited"
+TRANSACTION_DELETED = "transaction_deleted"
+BALANCE_CHANGED = "balance_changed"
+PARTICIPANT_JOINED = "participant_joined"
+PARTICIPANT_REMOVED = "participant_removed"
+ACCOUNT_RENAMED = "account_renamed"
+ACCOUNT_DELETED = "account_deleted"
+# Пакетна зміна (імпорт виписки): сторінку історії простіше перечитати, ніж передавати всі рядки
+TRANSACTIONS_IMPORTED = "transactions_imported"
+
+EVENT_KINDS = (
+    TRANSACTION_ADDED, TRANSACTION_EDITED, TRANSACTION_DELETED, BALANCE_CHANGED,
+    PARTICIPANT_JOINED, PARTICIPANT_REMOVED, ACCOUNT_RENAMED, ACCOUNT_DELETED, TRANSACTIONS_IMPORTED,
+)
+
+
+class AccountEvent(NamedTuple):
+    kind: str
+    account_id: str
+    payload: dict
+    origin: str
+
+
+def account_topic(account_id):
+    return f"account:{account_id}"
+
+
+class AccountEventBus:
+    # Обгортка над page.pubsub: одна сесія слухає не більше одного рахунку
+    # і не отримує назад власні події (вона вже застосувала зміну сама).
+    # pubsub живе в процесі, тож з кількома воркерами (--workers) події доходять лише до сесій того ж воркера
+    def __init__(self, pubsub, session_id):
+        self.pubsub = pubsub
+        self.session_id = session_id
+        self.account_id = None
+        self._handler = None
+
+    def watch(self, account_id, handler):
+        if self.account_id == account_id and self._handler is handler:
+            return
+        self.unwatch()
+        self.account_id = account_id
+        self._handler = handler
+        self.pubsub.subscribe_topic(account_topic(account_id), self._on_message)
+
+    def unwatch(self):
+        if self.account_id is not None:
+            self.pubsub.unsubscribe_topic(account_topic(self.account_id))
+        self.account_id = None
+        self._handler = None
+
+    def _on_message(self, topic, event):
+        if not isinstance(event, AccountEvent) or event.origin == self.session_id:
+            return
+        if event.account_id != self.account_id or self._handler is None:
+            return
+        self._handler(event)
+
+    def publish(self, kind, account_id, **payload):
+        if kind not in EVENT_KINDS:
+            raise ValueError(f"Невідомий тип події: {kind}")
+        # sqlite3.Row прив'язаний до курсора, тому передаємо звичайні словники
+        payload = {key: dict(value) if hasattr(value, "keys") else value for key, value in payload.items()}
+        event = AccountEvent(kind, account_id, payload, self.session_id)
+        self.pubsub.send_all_on_topic(account_topic(account_id), event)
+        return event
@@ -0,0 +1,184 @@
+import argparse
+import csv
+import importlib.util
+import os
+import sys
+import time
+import uuid
+
+import money
+import repository
+import storage
+
+# Parquet - необов'язковий формат; pyarrow імпортується при першому експорті в Parquet, а не під час старту
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+pa = None
+pq = None
+
+# Вивантаження історії транзакцій у CSV або Parquet. Рядки читаються пачками по keyset-ключу
+# і одразу пишуться у файл, тож пам'ять не залежить від кількості транзакцій.
+
+EXPORT_BATCH_SIZE = int(os.environ.get("BUDGET_EXPORT_BATCH_SIZE", "5000"))
+EXPORT_FORMATS = ("csv", "parquet")
+EXPORT_COLUMNS = ("transaction_id", "account_id", "account_name", "timestamp", "type", "amount", "description",
+                  "user_username")
+# Скільки секунд файл експорту лежить у теці завантажень
+EXPORT_MAX_AGE = 3600
+
+
+class ExportError(Exception):
+    pass
+
+
+def iter_batches(connect, account_ids, batch_size=EXPORT_BATCH_SIZE):
+    # Кожна пачка - окремий короткий запит, з'єднання між пачками повертається в пул
+    if batch_size < 1:
+        raise ValueError("Розмір пачки має бути не менше 1.")
+    for account_id in account_ids:
+        with connect() as conn:
+            account = repository.get_account(conn, account_id)
+        if account is None:
+            continue
+        after = None
+        while True:
+            with connect() as conn:
+                rows = repository.get_transactions_batch(conn, account_id, after, batch_size)
+            if not rows:
+                break
+            yield [_export_row(row, account["name"]) for row in rows]
+            if len(rows) < batch_size:
+                break
+            after = (rows[-1]["ts"], rows[-1]["transaction_id"])
+
+
+def _export_row(row, account_name):
+    return (row["transaction_id"], row["account_id"], account_name, row["timestamp"], row["type"],
+            money.to_decimal(row["amount"]), row["description"], row["user_username"])
+
+
+def write_csv(batches, fileobj):
+    writer = csv.writer(fileobj)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for batch in batches:
+        writer.writerows(batch)
+        count += len(batch)
+    return count
+
+
+def _parquet_schema():
+    return pa.schema([
+        ("transaction_id", pa.int64()),
+        ("account_id", pa.string()),
+        ("account_name", pa.string()),
+        ("timestamp", pa.string()),
+        ("type", pa.string()),
+        ("amount", pa.decimal128(18, 2)),
+        ("description", pa.string()),
+        ("user_username", pa.string()),
+    ])
+
+
+def _import_pyarrow():
+    global pa, pq
+    if pq is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ExportError("Для експорту в Parquet потрібен пакет pyarrow (pip install pyarrow).") from None
+        pa, pq = pyarrow, pyarrow.parquet
+
+
+def write_parquet(batches, path):
+    # Кожна пачка стає окремою row group, у пам'яті лише поточна пачка
+    _import_pyarrow()
+    schema = _parquet_schema()
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+            count += len(batch)
+    return count
+
+
+def export(connect, account_ids, path, fmt="csv", batch_size=EXPORT_BATCH_SIZE):
+    # Повертає кількість вивантажених транзакцій
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Непідтримуваний формат: {fmt}")
+    batches = iter_batches(connect, account_ids, batch_size)
+    if fmt == "parquet":
+        return write_parquet(batches, path)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        return write_csv(batches, f)
+
+
+def user_account_ids(connect, username):
+    with connect() as conn:
+        return repository.get_user_account_ids(conn, username)
+
+
+def export_to_dir(connect, account_ids, export_dir, file_name, fmt="csv", batch_size=EXPORT_BATCH_SIZE):
+    # Файл кладеться у власну теку з випадковою назвою, щоб посилання на нього не можна було вгадати.
+    # Повертає (відносний шлях для URL, кількість рядків).
+    cleanup_exports(export_dir)
+    token = uuid.uuid4().hex
+    os.makedirs(os.path.join(export_dir, token), exist_ok=True)
+    path = os.path.join(export_dir, token, file_name)
+    try:
+        count = export(connect, account_ids, path, fmt, batch_size)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return f"{token}/{file_name}", count
+
+
+def cleanup_exports(export_dir, max_age=EXPORT_MAX_AGE, now=None):
+    if not os.path.isdir(export_dir):
+        return
+    now = time.time() if now is None else now
+    for token in os.listdir(export_dir):
+        folder = os.path.join(export_dir, token)
+        if not os.path.isdir(folder) or now - os.path.getmtime(folder) < max_age:
+            continue
+        for name in os.listdir(folder):
+            os.remove(os.path.join(folder, name))
+        os.rmdir(folder)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Експорт історії транзакцій у CSV або Parquet")
+    parser.add_argument("--db", default="budget.db", help="шлях до SQLite або postgresql://...")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--account", help="ID рахунку")
+    target.add_argument("--user", help="ім'я користувача (усі його рахунки)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("-o", "--output", help="файл результату (CSV за замовчуванням пишеться в stdout)")
+    args = parser.parse_args(argv)
+    if args.format == "parquet" and not args.output:
+        parser.error("для Parquet потрібен --output")
+
+    store = storage.from_url(args.db)
+    connect = store.connect
+    store.configure()
+    try:
+        account_ids = [args.account] if args.account else user_account_ids(connect, args.user)
+        if args.output:
+            count = export(connect, account_ids, args.output, args.format, args.batch_size)
+        else:
+            count = write_csv(iter_batches(connect, account_ids, args.batch_size), sys.stdout)
+    except ExportError as exc:
+        print(f"Помилка: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    print(f"Вивантажено транзакцій: {count}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
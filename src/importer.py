@@ -0,0 +1,278 @@
+import argparse
+import csv
+import hashlib
+import io
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+import repository
+import storage
+import validation
+
+# Імпорт банківських виписок (CSV, OFX). Файл читається потоково, рядки обробляються
+# пачками: одна транзакція БД і один UPDATE балансу на пачку, дублікати відкидаються за хешем.
+
+DEFAULT_CHUNK_SIZE = 5000
+# Скільки повідомлень про помилкові рядки зберігається; решта лише рахується в error_count
+MAX_REPORTED_ERRORS = 20
+
+# Можливі назви колонок CSV (укр. та англ.)
+CSV_COLUMNS = {
+    "date": ("date", "дата", "timestamp", "дата операції"),
+    "amount": ("amount", "сума", "сума операції"),
+    "description": ("description", "опис", "призначення", "коментар"),
+    "type": ("type", "тип"),
+}
+INCOME_TYPES = ("income", "дохід", "надходження", "credit")
+EXPENSE_TYPES = ("expense", "витрата", "списання", "debit")
+
+_DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%d.%m.%Y", "%d.%m.%Y %H:%M",
+                 "%d.%m.%Y %H:%M:%S", "%d/%m/%Y")
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)")
+# Зсув поясу в даті OFX у годинах: [-5:EST], [-3.5:NST]
+_OFX_OFFSET = re.compile(r"\[([+-]?\d+(?:\.\d+)?)(?::[^\]]*)?\]")
+
+
+class StatementImportError(Exception):
+    pass
+
+
+def _local_isoformat(moment):
+    # timestamp зберігається місцевим часом без поясу, як datetime.now() (див. records.py),
+    # тож час зі зсувом переводимо в місцевий, інакше strftime('%s') рахував би його в UTC
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat()
+
+
+def parse_date(value):
+    value = value.strip()
+    try:
+        return _local_isoformat(datetime.fromisoformat(value))
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Невідомий формат дати: {value}")
+
+
+def parse_ofx_date(value):
+    # YYYYMMDD[HHMMSS[.XXX]][[-5:EST]]
+    digits = re.match(r"\d+", value.strip())
+    if not digits or len(digits.group()) < 8:
+        raise ValueError(f"Невідомий формат дати OFX: {value}")
+    text = digits.group()
+    if len(text) >= 14:
+        moment = datetime.strptime(text[:14], "%Y%m%d%H%M%S")
+        offset = _OFX_OFFSET.search(value)
+        if offset:
+            moment = moment.replace(tzinfo=timezone(timedelta(hours=float(offset.group(1)))))
+        return _local_isoformat(moment)
+    return datetime.strptime(text[:8], "%Y%m%d").isoformat()
+
+
+def parse_amount(value, type_value=None):
+    # Повертає (type, amount > 0 у копійках). Знак суми або колонка типу визначають дохід/витрату.
+    text = str(value).strip().replace(" ", "").replace("\u00a0", "").replace(",", ".")
+    # Не більше одного знака: "--5" чи "+-5" - помилка, а не сума
+    negative = text.startswith("-")
+    unsigned = text[1:] if text[:1] in ("+", "-") else text
+    is_valid, amount = validation.validate_amount_minor(unsigned)
+    if not is_valid or unsigned.startswith(("+", "-")):
+        raise ValueError(f"Неправильна сума: {value}")
+    if type_value:
+        kind = type_value.strip().lower()
+        if kind in INCOME_TYPES:
+            return "income", amount
+        if kind in EXPENSE_TYPES:
+            return "expense", amount
+        raise ValueError(f"Невідомий тип операції: {type_value}")
+    return ("expense" if negative else "income"), amount
+
+
+def iter_csv(fileobj):
+    # Повертає (номер рядка, сирий словник з полями date/amount/description/type)
+    reader = csv.reader(fileobj, delimiter=_sniff_delimiter(fileobj))
+    header = next(reader, None)
+    if header is None:
+        return
+    positions = {}
+    normalized = [h.strip().lower().lstrip("\ufeff") for h in header]
+    for field, names in CSV_COLUMNS.items():
+        for i, name in enumerate(normalized):
+            if name in names:
+                positions[field] = i
+                break
+    missing = {"date", "amount"} - set(positions)
+    if missing:
+        raise StatementImportError(f"У CSV немає колонок: {', '.join(sorted(missing))}")
+    for line_number, row in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        yield line_number, {field: row[i] if i < len(row) else "" for field, i in positions.items()}
+
+
+def _sniff_delimiter(fileobj):
+    # Дивимось лише на перший рядок, щоб не читати файл наперед
+    if not fileobj.seekable():
+        return ","
+    position = fileobj.tell()
+    first_line = fileobj.readline()
+    fileobj.seek(position)
+    return ";" if first_line.count(";") > first_line.count(",") else ","
+
+
+def iter_ofx(fileobj):
+    # Потоковий розбір блоків <STMTTRN> (SGML- і XML-варіанти OFX)
+    current = None
+    line_number = 0
+    for line_number, line in enumerate(fileobj, start=1):
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if closing and current is not None:
+                    yield current.pop("_line"), current
+                    current = None
+                elif not closing:
+                    current = {"_line": line_number}
+            elif current is not None and not closing and value.strip():
+                current[tag] = value.strip()
+    if current is not None:
+        yield current.pop("_line"), current
+
+
+def _ofx_record(raw):
+    return {
+        "date": raw.get("DTPOSTED", ""),
+        "amount": raw.get("TRNAMT", ""),
+        "description": raw.get("NAME") or raw.get("MEMO") or "",
+        "fitid": raw.get("FITID"),
+    }
+
+
+def import_hash(account_id, record_key):
+    return hashlib.sha256("\x1f".join([account_id, *map(str, record_key)]).encode("utf-8")).hexdigest()
+
+
+def parse_records(fileobj, fmt, account_id, username):
+    # Перетворює файл на потік (рядок, кортеж транзакції або None, помилка або None)
+    occurrences = {}
+    if fmt == "ofx":
+        source = ((line, _ofx_record(raw)) for line, raw in iter_ofx(fileobj))
+    else:
+        source = iter_csv(fileobj)
+    for line_number, raw in source:
+        try:
+            if fmt == "ofx":
+                timestamp = parse_ofx_date(raw["date"])
+            else:
+                timestamp = parse_date(raw["date"])
+            trans_type, amount = parse_amount(raw["amount"], raw.get("type"))
+        except ValueError as exc:
+            yield line_number, None, str(exc)
+            continue
+        description = (raw.get("description") or "").strip() or ("Дохід" if trans_type == "income" else "Витрата")
+        if raw.get("fitid"):
+            key = ("fitid", raw["fitid"])
+        else:
+            # Однакові рядки в одному файлі - різні операції, тому враховуємо порядковий номер повтору
+            content = (timestamp, trans_type, amount, description)
+            occurrences[content] = occurrences.get(content, 0) + 1
+            key = (*content, occurrences[content])
+        yield line_number, (account_id, trans_type, amount, description, timestamp, username,
+                            import_hash(account_id, key)), None
+
+
+def _insert_chunk(conn, chunk):
+    # Виконується в одній транзакції: відкидаємо вже імпортовані рядки і вставляємо решту
+    existing = repository.existing_import_hashes(conn, [row[6] for row in chunk])
+    fresh = []
+    for row in chunk:
+        if row[6] not in existing:
+            existing.add(row[6])
+            fresh.append(row)
+    if fresh:
+        repository.add_transactions_many(conn, fresh)
+    return len(fresh)
+
+
+def import_file(write, fileobj, account_id, username, fmt="csv", chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    # write(fn, *args) виконує fn(conn, *args) в одній транзакції (наприклад, db.run_write)
+    if fmt not in ("csv", "ofx"):
+        raise StatementImportError(f"Непідтримуваний формат: {fmt}")
+    result = {"processed": 0, "inserted": 0, "duplicates": 0, "error_count": 0, "errors": []}
+    chunk = []
+
+    def flush():
+        inserted = write(_insert_chunk, chunk)
+        result["inserted"] += inserted
+        result["duplicates"] += len(chunk) - inserted
+        chunk.clear()
+        if progress:
+            progress(dict(result))
+
+    for line_number, row, error in parse_records(fileobj, fmt, account_id, username):
+        result["processed"] += 1
+        if error:
+            result["error_count"] += 1
+            if len(result["errors"]) < MAX_REPORTED_ERRORS:
+                result["errors"].append((line_number, error))
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return result
+
+
+def detect_format(filename):
+    return "ofx" if filename.lower().endswith((".ofx", ".qfx")) else "csv"
+
+
+def open_statement(path):
+    # utf-8-sig прибирає BOM, який додає Excel
+    return io.open(path, encoding="utf-8-sig", newline="")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Імпорт банківської виписки (CSV/OFX) у рахунок")
+    parser.add_argument("path")
+    parser.add_argument("--db", default="budget.db", help="шлях до SQLite або postgresql://...")
+    parser.add_argument("--account", required=True, help="ID рахунку")
+    parser.add_argument("--user", required=True, help="ім'я користувача, від якого додаються транзакції")
+    parser.add_argument("--format", choices=("csv", "ofx"))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    store = storage.from_url(args.db)
+    store.configure()
+    try:
+        with store.connect() as conn:
+            if repository.get_account(conn, args.account) is None:
+                print(f"Помилка: Рахунок з ID {args.account} не знайдено.", file=sys.stderr)
+                return 1
+
+        def report(state):
+            print(f"\rОброблено: {state['processed']}, додано: {state['inserted']}, "
+                  f"дублікатів: {state['duplicates']}, помилок: {state['error_count']}", end="", file=sys.stderr)
+
+        with open_statement(args.path) as f:
+            result = import_file(store.run_write, f, args.account, args.user,
+                                 args.format or detect_format(args.path), args.chunk_size, report)
+    finally:
+        store.close()
+    print(file=sys.stderr)
+    for line_number, error in result["errors"]:
+        print(f"Рядок {line_number}: {error}", file=sys.stderr)
+    print(f"Додано {result['inserted']}, пропущено дублікатів {result['duplicates']}, "
+          f"помилок {result['error_count']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
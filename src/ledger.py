@@ -0,0 +1,237 @@
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+import archive
+import db
+import metrics
+import storage
+
+# Баланс рахунку не зберігається окремим числом, яке змінюється на місці. Він виводиться з
+# останньої контрольної точки (account_id, up_to_transaction_id, balance) і суми транзакцій
+# після неї. Точки пишуться кожні CHECKPOINT_INTERVAL транзакцій, тож читання балансу
+# торкається не більше CHECKPOINT_INTERVAL рядків незалежно від довжини історії.
+# Транзакції в архіві (archive.py) завжди покриті контрольною точкою, тож баланс їх не читає;
+# перевірка і повний перерахунок враховують і архів.
+
+log = logging.getLogger("budget.ledger")
+
+CHECKPOINT_INTERVAL = int(os.environ.get("BUDGET_CHECKPOINT_INTERVAL", "500"))
+# Як часто фоновий перевіряльник перераховує баланси (с); 0 - не запускати
+VERIFY_INTERVAL = float(os.environ.get("BUDGET_VERIFY_INTERVAL", "3600"))
+
+SIGNED_AMOUNT_SQL = "CASE type WHEN 'income' THEN amount ELSE -amount END"
+LATEST_CHECKPOINT_SQL = """
+    SELECT up_to_transaction_id, balance FROM balance_checkpoints
+    WHERE account_id = ?
+    ORDER BY up_to_transaction_id DESC
+    LIMIT 1
+"""
+DELTA_SQL = f"""
+    SELECT COALESCE(SUM({SIGNED_AMOUNT_SQL}), 0), COUNT(*), MAX(transaction_id) FROM transactions
+    WHERE account_id = ? AND transaction_id > ?
+"""
+# {table} - transactions або вигляд року архіву (archive.Source.table)
+RANGE_SUM_SQL = f"""
+    SELECT COALESCE(SUM({SIGNED_AMOUNT_SQL}), 0) FROM {{table}}
+    WHERE account_id = ? AND transaction_id > ? AND transaction_id <= ?
+"""
+FULL_SUM_SQL = f"SELECT COALESCE(SUM({SIGNED_AMOUNT_SQL}), 0) FROM {{table}} WHERE account_id = ?"
+MAX_ID_SQL = "SELECT MAX(transaction_id) FROM {table} WHERE account_id = ?"
+
+
+def balance_state(conn: sqlite3.Connection, account_id: str) -> tuple:
+    # (номер останньої транзакції, баланс, скільки транзакцій після контрольної точки)
+    checkpoint = conn.execute(LATEST_CHECKPOINT_SQL, (account_id,)).fetchone()
+    up_to, balance = (checkpoint[0], checkpoint[1]) if checkpoint else (0, 0)
+    delta, pending, last_id = conn.execute(DELTA_SQL, (account_id, up_to)).fetchone()
+    return (last_id or up_to), balance + delta, pending
+
+
+def get_balance(conn: sqlite3.Connection, account_id: str) -> int:
+    return balance_state(conn, account_id)[1]
+
+
+def write_checkpoint(conn: sqlite3.Connection, account_id: str, up_to_transaction_id: int, balance: int):
+    conn.execute("""
+        INSERT INTO balance_checkpoints (account_id, up_to_transaction_id, balance, created_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (account_id, up_to_transaction_id)
+        DO UPDATE SET balance = excluded.balance, created_at = excluded.created_at
+    """, (account_id, up_to_transaction_id, balance, datetime.now().isoformat()))
+
+
+def maybe_checkpoint(conn: sqlite3.Connection, account_id: str, interval: int = None) -> int:
+    # Викликається після запису в рахунок; повертає поточний баланс
+    last_id, balance, pending = balance_state(conn, account_id)
+    if pending >= (interval or CHECKPOINT_INTERVAL):
+        write_checkpoint(conn, account_id, last_id, balance)
+    return balance
+
+
+def adjust_checkpoints(conn: sqlite3.Connection, account_id: str, transaction_id: int, delta: int):
+    # Редагування чи видалення старої транзакції змінює всі точки, що її вже врахували
+    conn.execute("""
+        UPDATE balance_checkpoints SET balance = balance + ?
+        WHERE account_id = ? AND up_to_transaction_id >= ?
+    """, (delta, account_id, transaction_id))
+
+
+def delete_account(conn: sqlite3.Connection, account_id: str):
+    conn.execute("DELETE FROM balance_checkpoints WHERE account_id = ?", (account_id,))
+
+
+# Перевірка
+
+def verify_account(conn: sqlite3.Connection, account_id: str) -> list:
+    # Перераховує суму транзакцій до кожної контрольної точки (кожна транзакція читається один раз)
+    # і повертає розбіжності: [{"account_id", "up_to_transaction_id", "stored", "actual"}]
+    mismatches = []
+    running = 0
+    previous = 0
+    tables = [source.table for source in [archive.HOT, *archive.sources(conn)]]
+    checkpoints = conn.execute("""
+        SELECT up_to_transaction_id, balance FROM balance_checkpoints
+        WHERE account_id = ? ORDER BY up_to_transaction_id
+    """, (account_id,)).fetchall()
+    for up_to, stored in checkpoints:
+        for table in tables:
+            running += conn.execute(RANGE_SUM_SQL.format(table=table), (account_id, previous, up_to)).fetchone()[0]
+        previous = up_to
+        if stored != running:
+            mismatches.append({"account_id": account_id, "up_to_transaction_id": up_to, "stored": stored,
+                               "actual": running})
+            # Далі порівнюємо з правильною сумою, а не з помилковою точкою
+    return mismatches
+
+
+def full_balance(conn: sqlite3.Connection, account_id: str) -> int:
+    return sum(conn.execute(FULL_SUM_SQL.format(table=source.table), (account_id,)).fetchone()[0]
+               for source in [archive.HOT, *archive.sources(conn)])
+
+
+def repair_account(conn: sqlite3.Connection, account_id: str) -> int:
+    # Відкидає всі точки рахунку і пише одну нову з повної суми
+    delete_account(conn, account_id)
+    found = [conn.execute(MAX_ID_SQL.format(table=source.table), (account_id,)).fetchone()[0]
+             for source in [archive.HOT, *archive.sources(conn)]]
+    last_id = max((value for value in found if value is not None), default=None)
+    balance = full_balance(conn, account_id)
+    if last_id is not None:
+        write_checkpoint(conn, account_id, last_id, balance)
+    return balance
+
+
+def account_ids(conn: sqlite3.Connection) -> list:
+    return [row[0] for row in conn.execute("SELECT account_id FROM accounts ORDER BY account_id")]
+
+
+def verify_all(store: storage.Storage, repair=False) -> dict:
+    # Кожен рахунок перевіряється в окремій читальній транзакції (знімок), ремонт - через чергу запису
+    started = time.perf_counter()
+    with store.connect() as conn:
+        ids = account_ids(conn)
+    mismatches = []
+    for account_id in ids:
+        with store.connect(query_timeout=None) as conn:
+            # Файли архіву підключаються до початку транзакції знімка
+            archive.attach_all(conn)
+            conn.execute("BEGIN")
+            found = verify_account(conn, account_id)
+        if found:
+            mismatches.extend(found)
+            if repair:
+                store.run_write(repair_account, account_id)
+    return {
+        "checked_at": datetime.now().isoformat(),
+        "accounts": len(ids),
+        "mismatches": mismatches,
+        "repaired": repair and bool(mismatches),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def format_mismatch(mismatch):
+    return (f"Рахунок {mismatch['account_id']}: точка до транзакції {mismatch['up_to_transaction_id']} "
+            f"містить {mismatch['stored']}, а сума транзакцій - {mismatch['actual']} (копійок)")
+
+
+class LedgerVerifier:
+    # Фоновий потік, що періодично перевіряє всі рахунки; останній звіт - у last_report
+    def __init__(self, store, interval=VERIFY_INTERVAL, repair=False):
+        self.store = store
+        self.interval = interval
+        self.repair = repair
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ledger-verifier", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.last_report = verify_all(self.store, self.repair)
+            except (sqlite3.Error, db.PoolClosedError, db.PoolTimeoutError, db.QueryTimeoutError) + self.store.errors as exc:
+                metrics.log_event(log, logging.ERROR, "ledger_verify_failed", error=str(exc))
+                continue
+            for mismatch in self.last_report["mismatches"]:
+                metrics.log_event(log, logging.WARNING, "balance_mismatch", **mismatch)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def start_verifier(store, interval=VERIFY_INTERVAL, repair=False):
+    # Один перевіряльник на процес; повторні виклики (кожна нова сесія Flet) нічого не роблять
+    global _verifier
+    if interval <= 0:
+        return None
+    with _verifier_lock:
+        if _verifier is None:
+            _verifier = LedgerVerifier(store, interval, repair).start()
+        return _verifier
+
+
+def stop_verifier():
+    global _verifier
+    with _verifier_lock:
+        verifier, _verifier = _verifier, None
+    if verifier is not None:
+        verifier.stop(timeout=5)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перевірка балансів рахунків за транзакціями")
+    parser.add_argument("--db", default="budget.db", help="шлях до SQLite або postgresql://...")
+    parser.add_argument("--repair", action="store_true", help="перебудувати контрольні точки рахунків з розбіжностями")
+    args = parser.parse_args(argv)
+
+    store = storage.from_url(args.db)
+    store.configure()
+    try:
+        report = verify_all(store, args.repair)
+    finally:
+        store.close()
+    for mismatch in report["mismatches"]:
+        print(format_mismatch(mismatch))
+    print(f"Перевірено рахунків: {report['accounts']}, розбіжностей: {len(report['mismatches'])}"
+          + (" (виправлено)" if report["repaired"] else ""))
+    return 1 if report["mismatches"] and not report["repaired"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,75 +1,227 @@
+import time
+
+# Від цієї миті рахується фаза import у звіті запуску (STARTUP)
+IMPORT_STARTED = time.perf_counter()
+
 import flet as ft
+import argparse
+import atexit
+import logging
+import os
 import sqlite3
-from datetime import datetime
+import threading
+import analytics
+import archive
+import auth
+import backup
+from cache import budget_cache
+from concurrent.futures import CancelledError
+from contextlib import ExitStack, contextmanager
+import urllib.parse
 import uuid
+import db
+import events
+import exporter
+import importer
+import ledger
+import metrics
+import money
+import pagination
+import records
+import recurring
+import repository
+import rollups
+import search
+import sessions
+import storage
 import validation
-
-# Файл БД буде створено в папці src, бо тут знаходиться і головний файл
-DB_FILE = "budget.db"
+import view_models
+
+try:
+    import uvicorn
+except ImportError:  # потрібен лише для кількох воркерів (--workers)
+    uvicorn = None
+
+log = logging.getLogger("budget.app")
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+# Файл БД буде створено в папці src, бо тут знаходиться і головний файл (незалежно від поточної теки)
+DB_FILE = os.path.join(SRC_DIR, "budget.db")
+# Сховище: шлях до SQLite (за замовчуванням DB_FILE) або postgresql://... для кількох воркерів і вузлів
+STORAGE = storage.from_url(storage.absolute_url(os.environ.get("BUDGET_DB_URL", DB_FILE)))
+# Сюди браузер завантажує виписки для імпорту (у десктоп-режимі файл читається з місця)
+UPLOAD_DIR = os.path.join(SRC_DIR, "uploads")
+# Статичні файли веб-сервера Flet; експорти лежать у його підтеці й віддаються за URL
+ASSETS_DIR = os.path.join(SRC_DIR, "assets")
+EXPORT_DIR = os.path.join(ASSETS_DIR, "exports")
+# Скільки останніх місяців показує сторінка звітів
+REPORT_MONTHS = 12
+# Помилки БД (і недоступного файлу архіву), які показуються користувачу замість результату фонової операції
+DB_ERRORS = (sqlite3.Error, db.QueryTimeoutError, db.PoolTimeoutError, db.PoolClosedError,
+             db.WriteQueueFullError, archive.ArchiveError) + STORAGE.errors
 
 
 def get_db_conn():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # З'єднання береться з пулу і повертається туди після виходу з блоку `with`
+    return STORAGE.connect()
 
 
-def init_db():
+atexit.register(lambda: STORAGE.close())
+atexit.register(ledger.stop_verifier)
+atexit.register(auth.hash_pool.close)
+atexit.register(recurring.stop_scheduler)
+atexit.register(backup.stop_scheduler)
+
+# Стан пулів і кешу читається в момент запиту /metrics
+pool_gauge = metrics.registry.gauge("budget_db_pool", "Пул з'єднань БД: opened, idle, hits, misses, waits, wait_time",
+                                    ("stat",))
+write_queue_gauge = metrics.registry.gauge("budget_db_write_queue", "Записів, що чекають у черзі запису")
+cache_gauge = metrics.registry.gauge("budget_cache", "Кеш рахунків і головних сторінок", ("cache", "stat"))
+auth_rejected_gauge = metrics.registry.gauge("budget_auth_rejected",
+                                             "Входів, відхилених через переповнений пул хешування")
+startup_gauge = metrics.registry.gauge("budget_startup_seconds",
+                                       "Фази запуску процесу: import, schema, warm, services, first_render", ("phase",))
+first_render_seconds = metrics.registry.histogram("budget_session_first_render_seconds",
+                                                  "Від підключення сесії до її першого вигляду (не спінера)")
+
+
+def collect_metrics():
+    state = STORAGE.stats()
+    for stat, value in (state["pool"] or {}).items():
+        pool_gauge.set(stat, value=value)
+    write_queue_gauge.set(value=state["write_queue"])
+    for cache_name, cache_stats in budget_cache.stats().items():
+        for stat in ("size", "hits", "misses", "evictions", "expirations"):
+            cache_gauge.set(cache_name, stat, value=cache_stats[stat])
+    auth_rejected_gauge.set(value=auth.hash_pool.rejected)
+
+
+metrics.registry.register_callback(collect_metrics)
+
+
+def load_account(account_id):
     with get_db_conn() as conn:
-        c = conn.cursor()
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                username TEXT PRIMARY KEY,
-                password TEXT NOT NULL
-            )
-        """)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS accounts (
-                account_id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                balance REAL NOT NULL,
-                owner_username TEXT NOT NULL,
-                FOREIGN KEY (owner_username) REFERENCES users (username)
-            )
-        """)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS user_accounts_link (
-                username TEXT NOT NULL,
-                account_id TEXT NOT NULL,
-                PRIMARY KEY (username, account_id),
-                FOREIGN KEY (username) REFERENCES users (username),
-                FOREIGN KEY (account_id) REFERENCES accounts (account_id)
-            )
-        """)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS transactions (
-                transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                account_id TEXT NOT NULL,
-                type TEXT NOT NULL,
-                amount REAL NOT NULL,
-                description TEXT,
-                timestamp TEXT NOT NULL,
-                user_username TEXT NOT NULL,
-                FOREIGN KEY (account_id) REFERENCES accounts (account_id),
-                FOREIGN KEY (user_username) REFERENCES users (username)
-            )
-        """)
+        return repository.get_account(conn, account_id)
 
-        try:
-            c.execute("INSERT INTO users (username, password) VALUES (?, ?)", ("user", "pass"))
-        except sqlite3.IntegrityError:
-            pass
 
-        conn.commit()
+def get_account(account_id):
+    # Рядок рахунку читається з кешу процесу; записи скидають його через budget_cache.invalidate_*
+    return budget_cache.get_account(account_id, lambda: load_account(account_id))
+
+
+def describe_db_error(exc):
+    if isinstance(exc, (db.QueryTimeoutError, db.PoolTimeoutError)):
+        return "База даних не відповідає вчасно, спробуйте ще раз."
+    if isinstance(exc, db.WriteQueueFullError):
+        return str(exc)
+    if isinstance(exc, archive.ArchiveError):
+        metrics.log_event(log, logging.WARNING, "archive_unavailable", error=str(exc))
+        return f"Архів недоступний: {exc}"
+    return f"Помилка бази даних: {exc}"
+
+
+def recurring_materialized(deltas):
+    # Повторення записані у фоновому потоці: сторінки побачать їх після скидання кешу рахунків
+    for account_id in deltas:
+        budget_cache.invalidate_account(account_id)
+
+
+# Звіт запуску: фаза -> секунди. import - від IMPORT_STARTED до bootstrap(), first_render - перша сесія процесу
+STARTUP = {}
+_bootstrap_lock = threading.Lock()
+_bootstrapped = False
+
+
+@contextmanager
+def startup_phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP[name] = time.perf_counter() - started
+        startup_gauge.set(name, value=STARTUP[name])
+
+
+def init_db():
+    # SQLite: WAL, synchronous, busy_timeout, cache_size, mmap_size - з BUDGET_DB_CONFIG або змінних середовища
+    STORAGE.configure()
+    # Таблиці та індекси створюються версійованими міграціями (без обмеження часу запиту)
+    STORAGE.migrate()
+    with get_db_conn() as conn:
+        has_demo_user = repository.get_user(conn, "user") is not None
+    if not has_demo_user:
+        # Демо-користувач; scrypt-хеш рахується лише при першому запуску
+        auth.register(STORAGE, "user", "pass")
+
+
+def warm_up():
+    # Кожне з'єднання пулу читає схему й готує запити входу та головної сторінки (кеш підготовлених
+    # запитів sqlite3 живе на з'єднанні), записувач відкриває своє з'єднання, а хеш для входу
+    # з неіснуючим ім'ям рахується наперед. Перша сесія не платить за жодне з цього.
+    with ExitStack() as stack:
+        for _ in range(db.DEFAULT_POOL_SIZE):
+            conn = stack.enter_context(get_db_conn())
+            repository.get_user(conn, "user")
+            repository.get_accounts_with_recent_tx(conn, ["user"])
+    STORAGE.run_write(lambda conn: None)
+    auth.warm_up()
+
+
+def start_services():
+    # Фоновий перерахунок балансів з транзакцій (BUDGET_VERIFY_INTERVAL)
+    ledger.start_verifier(STORAGE)
+    # Планувальник регулярних транзакцій (BUDGET_RECURRING_POLL)
+    recurring.start_scheduler(STORAGE, on_materialized=recurring_materialized)
+    # Знімки SQLite без зупинки (BUDGET_BACKUP_INTERVAL)
+    backup.start_scheduler(STORAGE)
+    # /metrics на BUDGET_METRICS_PORT; кожен із кількох воркерів займає наступний вільний порт
+    metrics.start_http_server(attempts=int(os.environ.get("BUDGET_WORKERS", "1")))
+
+
+def bootstrap():
+    # Підготовка процесу - один раз, до запуску веб-сервера (run, create_asgi_app): схема, прогрів і фонові
+    # служби. Сесії (main) викликають її теж, але для них це лише перевірка прапорця.
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        STARTUP["import"] = time.perf_counter() - IMPORT_STARTED
+        startup_gauge.set("import", value=STARTUP["import"])
+        with startup_phase("schema"):
+            init_db()
+        with startup_phase("warm"):
+            warm_up()
+        with startup_phase("services"):
+            start_services()
+        _bootstrapped = True
+    metrics.log_event(log, logging.INFO, "startup", **{phase: round(seconds, 4) for phase, seconds in STARTUP.items()})
+
+
+def session_rendered(seconds):
+    # Перший вигляд (не спінер) кожної сесії; для першої сесії процесу - ще й фаза first_render звіту запуску
+    first_render_seconds.observe(seconds)
+    with _bootstrap_lock:
+        first = "first_render" not in STARTUP
+        if first:
+            STARTUP["first_render"] = seconds
+    if first:
+        startup_gauge.set("first_render", value=seconds)
+        metrics.log_event(log, logging.INFO, "first_render", seconds=round(seconds, 4),
+                          since_start=round(time.perf_counter() - IMPORT_STARTED, 4))
 
 
 def main(page: ft.Page):
+    # Процес зазвичай уже підготовлений у run() чи create_asgi_app(), тоді це лише перевірка прапорця
+    bootstrap()
+    session_started = time.perf_counter()
     page.title = "Сімейний бюджет"
     page.vertical_alignment = ft.MainAxisAlignment.CENTER
     page.horizontal_alignment = ft.CrossAxisAlignment.CENTER
     page.theme_mode = ft.ThemeMode.LIGHT
 
-    init_db()
+    metrics.watch_connection(page.connection)
 
     # Поля вводу
     username_field = ft.TextField(label="Ім'я користувача", width=300)
@@ -86,24 +238,123 @@ def main(page: ft.Page):
     transaction_amount_field = ft.TextField(label="Сума", keyboard_type=ft.KeyboardType.NUMBER, width=300,
                                             autofocus=True)
     transaction_desc_field = ft.TextField(label="Опис / Коментар", width=300)
+    transaction_repeat_dropdown = ft.Dropdown(label="Повторювати", width=300, value="", options=[
+        ft.dropdown.Option("", "Не повторювати"),
+        ft.dropdown.Option("FREQ=DAILY", "Щодня"),
+        ft.dropdown.Option("FREQ=WEEKLY", "Щотижня"),
+        ft.dropdown.Option("FREQ=MONTHLY", "Щомісяця"),
+        ft.dropdown.Option("FREQ=YEARLY", "Щороку"),
+    ])
     transaction_error_text = ft.Text(value="", color="red")
     edit_transaction_amount_field = ft.TextField(label="Сума", keyboard_type=ft.KeyboardType.NUMBER, width=300)
     edit_transaction_desc_field = ft.TextField(label="Опис / Коментар", width=300)
     edit_transaction_error_text = ft.Text(value="", color="red")
 
+    # Модель відкритої сторінки рахунку (None, якщо вона не показана)
+    details_vm = None
+    # Зміни спільних рахунків від інших сесій приходять через page.pubsub
+    account_events = events.AccountEventBus(page.pubsub, page.session_id)
+    # Рахунок, для якого вибрано файл виписки (до завершення завантаження)
+    pending_import = {}
+    # Номер останнього показаного вигляду: фонове завантаження для вигляду, з якого вже пішли, відкидається
+    view_generation = 0
+    # Чи показано вже перший вигляд (не спінер): його час іде у звіт запуску
+    rendered = False
+
+    def run_in_background(work, on_done, on_error, errors=(), submit=None):
+        # work() виконується в пулі потоків БД (STORAGE.submit), тож обробник Flet повертається одразу.
+        # on_done(результат) або on_error(повідомлення) викликаються з того потоку, коли запит завершиться;
+        # errors - додаткові очікувані винятки, текст яких показується користувачу;
+        # submit - інший пул замість пулу БД (хешування паролів).
+        def finished(future):
+            try:
+                result = future.result()
+            except CancelledError:
+                return
+            except DB_ERRORS as exc:
+                on_error(describe_db_error(exc))
+                return
+            except errors as exc:
+                on_error(str(exc))
+                return
+            except Exception as exc:
+                # Непередбачена помилка не має лишати користувача перед спінером без відповіді
+                metrics.log_event(log, logging.ERROR, "background_failed", error=repr(exc))
+                on_error("Не вдалося виконати операцію. Спробуйте ще раз.")
+                return
+            on_done(result)
+
+        try:
+            future = (submit or STORAGE.submit)(work)
+        except errors as exc:
+            # Переповнений пул відмовляє одразу, ще до виконання work
+            on_error(str(exc))
+            return
+        future.add_done_callback(finished)
+
+    def show_error(text_control, message):
+        text_control.value = message
+        page.update()
+
+    def build_loading_view():
+        return ft.Column([ft.ProgressRing(), ft.Text("Завантаження...", color="grey")],
+                         width=800, horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=20)
+
+    def build_load_error_view(message):
+        return ft.Column([
+            ft.Text(message, color="red", text_align=ft.TextAlign.CENTER),
+            ft.Row([
+                ft.TextButton("На головну", on_click=lambda e: go_to_view(None)),
+                ft.FilledButton("Спробувати ще раз", icon=ft.Icons.REFRESH, on_click=lambda e: update_view()),
+            ], alignment=ft.MainAxisAlignment.CENTER),
+        ], width=800, horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=20)
+
+    def load_view(load, build, name):
+        # Спінер показується одразу, дані читаються у фоні, вигляд будується з готових даних.
+        # build може повернути None, якщо сам перейшов на інший вигляд.
+        generation = view_generation
+        started = time.perf_counter()
+        show_view(build_loading_view(), "loading")
+
+        def loaded(data):
+            if generation != view_generation:
+                return
+            load_seconds = time.perf_counter() - started
+            build_started = time.perf_counter()
+            view = build(data)
+            if view is not None:
+                show_view(view, name, time.perf_counter() - build_started, load_seconds)
+
+        def failed(message):
+            if generation == view_generation:
+                show_view(build_load_error_view(message), "load_error")
+
+        run_in_background(load, loaded, failed)
+
     def handle_login(e):
-        username = username_field.value
-        password = password_field.value
-        with get_db_conn() as conn:
-            c = conn.cursor()
-            c.execute("SELECT password FROM users WHERE username = ?", (username,))
-            user_data = c.fetchone()
-        if user_data and user_data["password"] == password:
-            page.session.set("current_user", username)
-            update_view()
-        else:
-            login_error_text.value = "Неправильне ім'я користувача або пароль"
-            page.update()
+        username = username_field.value or ""
+        password = password_field.value or ""
+        user_key = f"user:{username.lower()}"
+        keys = [user_key] + ([f"ip:{page.client_ip}"] if page.client_ip else [])
+        try:
+            auth.login_limiter.hit(*keys)
+        except auth.RateLimitedError as exc:
+            show_error(login_error_text, str(exc))
+            return
+
+        def checked(success):
+            if success:
+                auth.login_limiter.reset(user_key)
+                page.session.set("current_user", username)
+                page.client_storage.set(sessions.CLIENT_STORAGE_KEY, sessions.issue_token(username))
+                update_view()
+            else:
+                show_error(login_error_text, "Неправильне ім'я користувача або пароль")
+
+        # Перевірка пароля (scrypt) іде в окремому обмеженому пулі, а не в пулі БД
+        run_in_background(lambda: auth.login(STORAGE, username, password), checked,
+                          lambda message: show_error(login_error_text, message),
+                          errors=(auth.AuthBusyError,), submit=auth.hash_pool.submit)
 
     def handle_registration(e):
         username = new_username_field.value
@@ -112,38 +363,55 @@ def main(page: ft.Page):
         is_valid, error_message = validation.validate_registration(username, password)
 
         if not is_valid:
-            register_info_text.value = error_message
             register_info_text.color = 'red'
-        else:
-            with get_db_conn() as conn:
-                c = conn.cursor()
-                c.execute("SELECT * FROM users WHERE username = ?", (username,))
-                if c.fetchone():
-                    register_info_text.value = f"Користувач '{username}' вже існує."
-                    register_info_text.color = 'red'
-                else:
-                    c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-                    conn.commit()
-                    register_info_text.value = "Реєстрація успішна! Тепер ви можете увійти."
-                    register_info_text.color = 'green'
-                    new_username_field.value = ""
-                    new_password_field.value = ""
-        page.update()
+            show_error(register_info_text, error_message)
+            return
+
+        def created(success):
+            if not success:
+                register_info_text.value = f"Користувач '{username}' вже існує."
+                register_info_text.color = 'red'
+            else:
+                register_info_text.value = "Реєстрація успішна! Тепер ви можете увійти."
+                register_info_text.color = 'green'
+                new_username_field.value = ""
+                new_password_field.value = ""
+            page.update()
+
+        def failed(message):
+            register_info_text.color = 'red'
+            show_error(register_info_text, message)
+
+        if page.client_ip:
+            try:
+                auth.login_limiter.hit(f"ip:{page.client_ip}")
+            except auth.RateLimitedError as exc:
+                failed(str(exc))
+                return
+
+        run_in_background(lambda: auth.register(STORAGE, username, password), created, failed,
+                          errors=(auth.AuthBusyError,), submit=auth.hash_pool.submit)
 
     def handle_logout(e):
         page.session.set("current_user", None)
+        page.client_storage.remove(sessions.CLIENT_STORAGE_KEY)
         go_to_view("login")
 
-    def add_transaction_logic(account_id, trans_type, amount, description, user_who_added):
-        with get_db_conn() as conn:
-            c = conn.cursor()
-            c.execute("""
-                INSERT INTO transactions (account_id, type, amount, description, timestamp, user_username)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (account_id, trans_type, amount, description, datetime.now().isoformat(), user_who_added))
-            update_amount = amount if trans_type == "income" else -amount
-            c.execute("UPDATE accounts SET balance = balance + ? WHERE account_id = ?", (update_amount, account_id))
-            conn.commit()
+    def add_transaction_logic(account_id, trans_type, amount, description, user_who_added, schedule=None):
+        # Запис іде через чергу запису сховища, коміт робить вона. З розкладом (RRULE) разом із
+        # транзакцією створюється правило, наступні повторення запише планувальник.
+        try:
+            if schedule:
+                result = STORAGE.run_write(recurring.add_recurring_transaction,
+                                           account_id, trans_type, amount, description, user_who_added, schedule,
+                                           timeout=db.DEFAULT_QUERY_TIMEOUT)
+                recurring.notify_scheduler()
+                return result
+            return STORAGE.run_write(repository.add_transaction,
+                                     account_id, trans_type, amount, description, user_who_added,
+                                     timeout=db.DEFAULT_QUERY_TIMEOUT)
+        finally:
+            budget_cache.invalidate_account(account_id)
 
     def handle_add_transaction(e):
         transaction_error_text.value = ""
@@ -151,10 +419,9 @@ def main(page: ft.Page):
         current_user = page.session.get("current_user")
         account_id = page.session.get("current_account_id")
 
-        is_valid, amount = validation.validate_transaction_amount(transaction_amount_field.value)
+        is_valid, amount = validation.validate_amount_minor(transaction_amount_field.value)
 
         if not is_valid:
-            print("Неправильна сума")
             transaction_error_text.value = "Сума має бути додатнім числом (наприклад: 150.50)"
             page.update()
             return
@@ -162,10 +429,24 @@ def main(page: ft.Page):
         description = transaction_desc_field.value.strip() or (
             "Дохід" if trans_type == "income" else "Витрата"
         )
-        add_transaction_logic(account_id, trans_type, amount, description, current_user)
-        transaction_amount_field.value = ""
-        transaction_desc_field.value = ""
-        go_to_view("account_details")
+        schedule = transaction_repeat_dropdown.value or None
+
+        def saved(result):
+            tx, balance = result
+            if details_vm is not None and details_vm.account_id == account_id:
+                details_vm.insert_transaction(tx)
+                details_vm.set_balance(balance)
+            account_events.publish(events.TRANSACTION_ADDED, account_id, transaction=tx, balance=balance)
+            transaction_amount_field.value = ""
+            transaction_desc_field.value = ""
+            transaction_repeat_dropdown.value = ""
+            if schedule and details_vm is not None and details_vm.account_id == account_id:
+                load_recurring_rules(details_vm)
+            go_to_view("account_details")
+
+        run_in_background(lambda: add_transaction_logic(account_id, trans_type, amount, description, current_user,
+                                                        schedule),
+                          saved, lambda message: show_error(transaction_error_text, message))
 
     def handle_add_account(e):
         add_account_error_text.value = ""
@@ -173,79 +454,117 @@ def main(page: ft.Page):
         name = account_name_field.value.strip()
         current_user = page.session.get("current_user")
         if not name:
-            add_account_error_text.value = "Назва рахунку не може бути порожньою."
-            page.update()
+            show_error(add_account_error_text, "Назва рахунку не може бути порожньою.")
             return
-        with get_db_conn() as conn:
-            c = conn.cursor()
-            c.execute("SELECT COUNT(*) FROM user_accounts_link WHERE username = ?", (current_user,))
-            count = c.fetchone()[0]
-            if count >= 4:
-                add_account_error_text.value = "Ви досягли ліміту в 4 рахунки."
-                page.update()
+
+        def create_account(conn):
+            # Повертає текст помилки або None. Перевірка ліміту й вставка - в одній транзакції запису
+            if repository.count_user_accounts(conn, current_user) >= 4:
+                return "Ви досягли ліміту в 4 рахунки."
+            repository.create_account(conn, str(uuid.uuid4()), name, current_user)
+            return None
+
+        def create():
+            try:
+                return STORAGE.run_write(create_account, timeout=db.DEFAULT_QUERY_TIMEOUT)
+            finally:
+                budget_cache.invalidate_user(current_user)
+
+        def created(error):
+            if error:
+                show_error(add_account_error_text, error)
                 return
-            new_id = str(uuid.uuid4())
-            c.execute("INSERT INTO accounts (account_id, name, balance, owner_username) VALUES (?, ?, 0.0, ?)",
-                      (new_id, name, current_user))
-            c.execute("INSERT INTO user_accounts_link (username, account_id) VALUES (?, ?)", (current_user, new_id))
-            conn.commit()
             account_name_field.value = ""
             go_to_view(None)
 
+        run_in_background(create, created, lambda message: show_error(add_account_error_text, message))
+
     def handle_join_account(e):
         account_id_to_join = join_link_field.value.strip()
         current_user = page.session.get("current_user")
-        with get_db_conn() as conn:
-            c = conn.cursor()
-            c.execute("SELECT * FROM accounts WHERE account_id = ?", (account_id_to_join,))
-            if not c.fetchone():
-                print(f"Помилка: Рахунок з ID {account_id_to_join} не знайдено.")
-                return
-            c.execute("SELECT COUNT(*) FROM user_accounts_link WHERE username = ?", (current_user,))
-            if c.fetchone()[0] >= 4:
-                print(f"Помилка: Ви досягли ліміту в 4 рахунки.")
-                return
-            c.execute("SELECT * FROM user_accounts_link WHERE username = ? AND account_id = ?",
-                      (current_user, account_id_to_join))
-            if c.fetchone():
-                print(f"Помилка: Рахунок вже у вашому списку.")
+
+        def join_account(conn):
+            # Повертає текст помилки або None
+            if not repository.get_account(conn, account_id_to_join):
+                return f"Рахунок з ID {account_id_to_join} не знайдено."
+            if repository.count_user_accounts(conn, current_user) >= 4:
+                return "Ви досягли ліміту в 4 рахунки."
+            if repository.is_linked(conn, current_user, account_id_to_join):
+                return "Рахунок вже у вашому списку."
+            repository.link_user(conn, current_user, account_id_to_join)
+            return None
+
+        def join():
+            try:
+                return STORAGE.run_write(join_account, timeout=db.DEFAULT_QUERY_TIMEOUT)
+            finally:
+                budget_cache.invalidate_user(current_user)
+
+        def joined(error):
+            if error:
+                show_error(add_account_error_text, error)
                 return
-            c.execute("INSERT INTO user_accounts_link (username, account_id) VALUES (?, ?)",
-                      (current_user, account_id_to_join))
-            conn.commit()
-            print(f"Рахунок {account_id_to_join} успішно додано!")
+            account_events.publish(events.PARTICIPANT_JOINED, account_id_to_join, username=current_user)
+            metrics.log_event(log, logging.INFO, "account_joined", account_id=account_id_to_join, user=current_user)
             join_link_field.value = ""
             go_to_view(None)
 
+        run_in_background(join, joined, lambda message: show_error(add_account_error_text, message))
+
     def handle_delete_account(e):
         account_id = page.session.get("current_account_id")
         current_user = page.session.get("current_user")
         if not account_id:
             go_to_view(None)
             return
-        with get_db_conn() as conn:
-            c = conn.cursor()
-            c.execute("SELECT owner_username FROM accounts WHERE account_id = ?", (account_id,))
-            account_data = c.fetchone()
-            if account_data and account_data["owner_username"] == current_user:
-                print("Ви власник. Видалення рахунку...")
-                c.execute("DELETE FROM user_accounts_link WHERE account_id = ?", (account_id,))
-                c.execute("DELETE FROM transactions WHERE account_id = ?", (account_id,))
-                c.execute("DELETE FROM accounts WHERE account_id = ?", (account_id,))
+
+        def delete_account(conn):
+            account_data = repository.get_account(conn, account_id)
+            is_owner = bool(account_data and account_data["owner_username"] == current_user)
+            if is_owner:
+                repository.delete_account(conn, account_id)
+            else:
+                repository.unlink_user(conn, current_user, account_id)
+            return is_owner
+
+        def delete():
+            try:
+                is_owner = STORAGE.run_write(delete_account, timeout=db.DEFAULT_QUERY_TIMEOUT)
+            finally:
+                budget_cache.invalidate_account(account_id)
+                budget_cache.invalidate_user(current_user)
+            metrics.log_event(log, logging.INFO, "account_deleted" if is_owner else "account_left",
+                              account_id=account_id, user=current_user)
+            return is_owner
+
+        def deleted(is_owner):
+            if is_owner:
+                account_events.publish(events.ACCOUNT_DELETED, account_id)
             else:
-                print("Ви не власник. Вихід з рахунку...")
-                c.execute("DELETE FROM user_accounts_link WHERE username = ? AND account_id = ?",
-                          (current_user, account_id))
-            conn.commit()
-        go_to_view(None)
+                account_events.publish(events.PARTICIPANT_REMOVED, account_id, username=current_user)
+            go_to_view(None)
+
+        run_in_background(delete, deleted, show_message)
 
     def handle_remove_participant(e, username_to_remove):
         account_id = page.session.get("current_account_id")
-        with get_db_conn() as conn:
-            conn.execute("DELETE FROM user_accounts_link WHERE username = ? AND account_id = ?",
-                         (username_to_remove, account_id))
-            conn.commit()
-        update_view()
+
+        def remove_participant():
+            try:
+                STORAGE.run_write(repository.unlink_user, username_to_remove, account_id,
+                                  timeout=db.DEFAULT_QUERY_TIMEOUT)
+            finally:
+                budget_cache.invalidate_user(username_to_remove)
+
+        def removed(_):
+            account_events.publish(events.PARTICIPANT_REMOVED, account_id, username=username_to_remove)
+            if details_vm is not None and details_vm.account_id == account_id:
+                details_vm.remove_participant(username_to_remove)
+                details_vm.participants_column.update()
+            else:
+                update_view()
+
+        run_in_background(remove_participant, removed, show_message)
 
     def handle_edit_transaction(e):
         edit_transaction_error_text.value = ""
@@ -253,60 +572,166 @@ def main(page: ft.Page):
         account_id = page.session.get("current_account_id")
 
         try:
-            new_amount = float(edit_transaction_amount_field.value)
-            new_description = edit_transaction_desc_field.value.strip()
-
-            if new_amount <= 0:
-                edit_transaction_error_text.value = "Сума має бути додатнім числом"
-                page.update()
-                return
-
-            with get_db_conn() as conn:
-                c = conn.cursor()
-                c.execute("SELECT amount, type FROM transactions WHERE transaction_id = ?", (transaction_id,))
-                old_tx = c.fetchone()
-                old_amount = old_tx["amount"]
-                tx_type = old_tx["type"]
-
-                c.execute("UPDATE transactions SET amount = ?, description = ? WHERE transaction_id = ?",
-                          (new_amount, new_description, transaction_id))
-
-                balance_change = 0.0
-                if tx_type == "income":
-                    balance_change = new_amount - old_amount
-                else:
-                    balance_change = old_amount - new_amount
+            new_amount = money.to_minor(edit_transaction_amount_field.value)
+        except (ValueError, TypeError):
+            show_error(edit_transaction_error_text, "Сума має бути числом (наприклад: 150.50)")
+            return
+        new_description = edit_transaction_desc_field.value.strip()
 
-                c.execute("UPDATE accounts SET balance = balance + ? WHERE account_id = ?",
-                          (balance_change, account_id))
-                conn.commit()
+        if new_amount <= 0:
+            show_error(edit_transaction_error_text, "Сума має бути додатнім числом")
+            return
 
+        def update_transaction():
+            try:
+                return STORAGE.run_write(repository.update_transaction,
+                                         transaction_id, new_amount, new_description, timeout=db.DEFAULT_QUERY_TIMEOUT)
+            finally:
+                budget_cache.invalidate_account(account_id)
+
+        def saved(result):
+            tx, balance = result
+            if details_vm is not None and details_vm.account_id == account_id:
+                details_vm.replace_transaction(tx)
+                details_vm.set_balance(balance)
+            account_events.publish(events.TRANSACTION_EDITED, account_id, transaction=tx, balance=balance)
             go_to_view("account_details")
 
-        except (ValueError, TypeError):
-            edit_transaction_error_text.value = "Сума має бути числом (наприклад: 150.50)"
-            page.update()
+        # Транзакцію могли видалити в іншій сесії, поки була відкрита форма
+        run_in_background(update_transaction, saved, lambda message: show_error(edit_transaction_error_text, message),
+                          errors=(repository.TransactionNotFoundError,))
 
     def handle_delete_transaction(e):
         transaction_id = page.session.get("current_transaction_id")
         account_id = page.session.get("current_account_id")
 
+        def delete_transaction():
+            try:
+                return STORAGE.run_write(repository.delete_transaction, transaction_id,
+                                         timeout=db.DEFAULT_QUERY_TIMEOUT)
+            finally:
+                budget_cache.invalidate_account(account_id)
+
+        def deleted(balance):
+            if details_vm is not None and details_vm.account_id == account_id:
+                details_vm.remove_transaction(transaction_id)
+                details_vm.set_balance(balance)
+            account_events.publish(events.TRANSACTION_DELETED, account_id, transaction_id=transaction_id,
+                                   balance=balance)
+            go_to_view("account_details")
+
+        run_in_background(delete_transaction, deleted, lambda message: show_error(edit_transaction_error_text, message),
+                          errors=(repository.TransactionNotFoundError,))
+
+    def show_import_status(account_id, message, running=False):
+        if details_vm is None or details_vm.account_id != account_id:
+            return
+        details_vm.import_status_text.value = message
+        details_vm.import_progress.visible = running
+        page.update()
+
+    def run_statement_import(path, file_name, account_id):
+        current_user = page.session.get("current_user")
+        show_import_status(account_id, "Імпорт...", running=True)
+
+        def report(state):
+            show_import_status(account_id, f"Оброблено рядків: {state['processed']}, додано: {state['inserted']}",
+                               running=True)
+
+        try:
+            with importer.open_statement(path) as f:
+                result = importer.import_file(STORAGE.run_write, f, account_id,
+                                              current_user, importer.detect_format(file_name), progress=report)
+        except (importer.StatementImportError, UnicodeDecodeError, OSError) as exc:
+            show_import_status(account_id, f"Помилка імпорту: {exc}")
+            return
+        finally:
+            budget_cache.invalidate_account(account_id)
+
         with get_db_conn() as conn:
-            c = conn.cursor()
-            c.execute("SELECT amount, type FROM transactions WHERE transaction_id = ?", (transaction_id,))
-            tx = c.fetchone()
-            amount = tx["amount"]
-            tx_type = tx["type"]
+            balance = repository.get_balance(conn, account_id)
+        if details_vm is not None and details_vm.account_id == account_id:
+            details_vm.reload_transactions()
+            details_vm.set_balance(balance)
+        account_events.publish(events.TRANSACTIONS_IMPORTED, account_id, balance=balance)
+        message = f"Додано {result['inserted']}, пропущено дублікатів {result['duplicates']}"
+        if result["errors"]:
+            line_number, error = result["errors"][0]
+            message += f", помилок {result['error_count']} (рядок {line_number}: {error})"
+        show_import_status(account_id, message)
+
+    def start_statement_import(path, file_name, account_id, remove_after=False):
+        # Імпорт іде у фоновому потоці БД; прогрес показується в details_vm.import_status_text
+        def work():
+            try:
+                run_statement_import(path, file_name, account_id)
+            finally:
+                if remove_after and os.path.exists(path):
+                    os.remove(path)
+
+        run_in_background(work, lambda _: None,
+                          lambda message: show_import_status(account_id, f"Помилка імпорту: {message}"))
+
+    def handle_statement_picked(e: ft.FilePickerResultEvent):
+        if not e.files:
+            return
+        account_id = page.session.get("current_account_id")
+        picked = e.files[0]
+        if picked.path:
+            # Десктоп-режим: файл доступний локально
+            start_statement_import(picked.path, picked.name, account_id)
+            return
+        # Веб-режим: спочатку завантажуємо файл у UPLOAD_DIR, імпорт - в on_upload
+        upload_name = f"{uuid.uuid4().hex}_{picked.name}"
+        pending_import[upload_name] = (account_id, picked.name)
+        show_import_status(account_id, "Завантаження файлу...", running=True)
+        statement_picker.upload([ft.FilePickerUploadFile(upload_name,
+                                                         upload_url=page.get_upload_url(upload_name, 600))])
+
+    def handle_statement_upload(e: ft.FilePickerUploadEvent):
+        if e.file_name not in pending_import:
+            return
+        if e.error:
+            account_id, _ = pending_import.pop(e.file_name)
+            show_import_status(account_id, f"Помилка завантаження: {e.error}")
+            return
+        if e.progress is None or e.progress < 1:
+            return
+        account_id, file_name = pending_import.pop(e.file_name)
+        start_statement_import(os.path.join(UPLOAD_DIR, e.file_name), file_name, account_id, remove_after=True)
 
-            c.execute("DELETE FROM transactions WHERE transaction_id = ?", (transaction_id,))
+    statement_picker = ft.FilePicker(on_result=handle_statement_picked, on_upload=handle_statement_upload)
+    page.overlay.append(statement_picker)
 
-            balance_change = -amount if tx_type == "income" else amount
+    def show_message(message):
+        page.open(ft.SnackBar(ft.Text(message)))
 
-            c.execute("UPDATE accounts SET balance = balance + ? WHERE account_id = ?", (balance_change, account_id))
-            conn.commit()
+    def handle_export(load_account_ids, base_name, fmt):
+        # Файл пишеться потоково на диск у фоновому потоці, а браузер забирає його за посиланням
+        file_name = f"{base_name}.{fmt}"
 
-        go_to_view("account_details")
+        def export():
+            return exporter.export_to_dir(get_db_conn, load_account_ids(), EXPORT_DIR, file_name, fmt)
+
+        def exported(result):
+            relative_path, count = result
+            if page.web:
+                page.launch_url(f"/exports/{urllib.parse.quote(relative_path)}")
+                show_message(f"Вивантажено транзакцій: {count}")
+            else:
+                show_message(f"Вивантажено транзакцій: {count} у {os.path.join(EXPORT_DIR, relative_path)}")
 
+        show_message("Експорт...")
+        run_in_background(export, exported, lambda message: show_message(f"Помилка експорту: {message}"),
+                          errors=(exporter.ExportError, OSError))
+
+    def handle_export_account(fmt):
+        account_id = page.session.get("current_account_id")
+        handle_export(lambda: [account_id], f"account-{account_id[:8]}", fmt)
+
+    def handle_export_user(e):
+        current_user = page.session.get("current_user")
+        handle_export(lambda: exporter.user_account_ids(get_db_conn, current_user), f"budget-{current_user}", "csv")
 
     def go_to_view(view_name):
         page.session.set("view", view_name)
@@ -323,19 +748,23 @@ def main(page: ft.Page):
     def open_transaction_page(trans_type):
         transaction_amount_field.value = ""
         transaction_desc_field.value = ""
+        transaction_repeat_dropdown.value = ""
         page.session.set("transaction_type", trans_type)
         go_to_view("add_transaction")
 
     def open_edit_transaction_page(transaction_id):
-        with get_db_conn() as conn:
-            tx = conn.execute("SELECT amount, description FROM transactions WHERE transaction_id = ?",
-                              (transaction_id,)).fetchone()
+        def load_transaction():
+            with get_db_conn() as conn:
+                return repository.get_transaction(conn, transaction_id)
 
-        if tx:
-            edit_transaction_amount_field.value = str(tx["amount"])
-            edit_transaction_desc_field.value = tx["description"]
-            page.session.set("current_transaction_id", transaction_id)
-            go_to_view("edit_transaction")
+        def loaded(tx):
+            if tx:
+                edit_transaction_amount_field.value = money.format_minor(tx["amount"])
+                edit_transaction_desc_field.value = tx["description"]
+                page.session.set("current_transaction_id", transaction_id)
+                go_to_view("edit_transaction")
+
+        run_in_background(load_transaction, loaded, show_message)
 
     def build_login_view():
         return ft.Column(
@@ -386,68 +815,190 @@ def main(page: ft.Page):
             width=800, spacing=15
         )
 
-    def build_account_details_view():
-        account_id = page.session.get("current_account_id")
+    def build_transaction_tile(t):
         current_user = page.session.get("current_user")
+        timestamp_str = records.format_timestamp(t['ts'])
+        user_str = t['user_username']
+        transaction_id = t['transaction_id']
+
+        is_author = (user_str == current_user)
+
+        return ft.ListTile(
+            leading=ft.Icon(ft.Icons.ARROW_UPWARD if t["type"] == "income" else ft.Icons.ARROW_DOWNWARD,
+                            color='green' if t["type"] == "income" else 'red'),
+            title=ft.Text(t['description']),
+            subtitle=ft.Text(f"{timestamp_str} - {user_str}"),
+            trailing=ft.Text(f"{'+' if t['type'] == 'income' else '-'}{money.format_minor(t['amount'])} грн",
+                             weight=ft.FontWeight.BOLD),
+            on_click=(lambda e, id=transaction_id: open_edit_transaction_page(id)) if is_author else None
+        )
 
-        with get_db_conn() as conn:
-            c = conn.cursor()
-            c.execute("SELECT * FROM accounts WHERE account_id = ?", (account_id,))
-            account = c.fetchone()
-            c.execute("SELECT * FROM transactions WHERE account_id = ? ORDER BY timestamp DESC", (account_id,))
-            transactions = c.fetchall()
-            c.execute("SELECT username FROM user_accounts_link WHERE account_id = ?", (account_id,))
-            participants = c.fetchall()
+    def build_participant_tile(username):
+        is_current_owner = (username == page.session.get("current_user"))
+
+        participant_tile = ft.ListTile(
+            leading=ft.Icon(ft.Icons.PERSON),
+            title=ft.Text(f"{username} {'(Власник)' if is_current_owner else ''}"),
+        )
 
+        if not is_current_owner:
+            participant_tile.trailing = ft.IconButton(
+                icon=ft.Icons.REMOVE_CIRCLE_OUTLINE,
+                icon_color="red",
+                tooltip="Видалити учасника",
+                on_click=lambda e, u=username: handle_remove_participant(e, u)
+            )
+        return participant_tile
+
+    def apply_account_event(event):
+        # Застосовуємо зміну з іншої сесії до відкритої сторінки рахунку без повторних запитів
+        if details_vm is None or details_vm.account_id != event.account_id:
+            return
+        payload = event.payload
+        if event.kind == events.ACCOUNT_DELETED or (
+                event.kind == events.PARTICIPANT_REMOVED
+                and payload["username"] == page.session.get("current_user")):
+            go_to_view(None)
+            return
+        if event.kind == events.TRANSACTION_ADDED:
+            details_vm.insert_transaction(payload["transaction"])
+        elif event.kind == events.TRANSACTION_EDITED:
+            details_vm.replace_transaction(payload["transaction"])
+        elif event.kind == events.TRANSACTION_DELETED:
+            details_vm.remove_transaction(payload["transaction_id"])
+        elif event.kind == events.PARTICIPANT_JOINED:
+            if details_vm.is_owner:
+                details_vm.add_participant(payload["username"], build_participant_tile(payload["username"]))
+        elif event.kind == events.PARTICIPANT_REMOVED:
+            details_vm.remove_participant(payload["username"])
+        elif event.kind == events.ACCOUNT_RENAMED:
+            details_vm.set_name(payload["name"])
+        elif event.kind == events.TRANSACTIONS_IMPORTED:
+            details_vm.reload_transactions()
+        if "balance" in payload:
+            details_vm.set_balance(payload["balance"])
+        page.update()
+
+    def load_account_details(account_id):
+        # Виконується у фоновому потоці: рахунок, учасники і перша сторінка історії
+        account = get_account(account_id)
         if account is None:
-            go_to_view(None);
-            return ft.Container()
+            return None
+        with get_db_conn() as conn:
+            participants = repository.get_participants(conn, account_id)
+            rules = recurring.get_account_rules(conn, account_id)
+        # Історія вантажиться сторінками; у ListView живуть лише плитки з поточного вікна
+        history = pagination.HistoryWindow(get_db_conn, account_id)
+        history.load_first()
+        return account, participants, history, rules
+
+    def build_recurring_tile(vm, rule):
+        # Правило може видалити власник рахунку або автор правила
+        sign = "+" if rule["type"] == "income" else "-"
+        tile = ft.ListTile(
+            leading=ft.Icon(ft.Icons.REPEAT),
+            title=ft.Text(f'{rule["description"]}: {sign}{money.format_minor(rule["amount"])} грн', size=14),
+            subtitle=ft.Text(f'{recurring.describe_rule(rule["schedule"])}, наступна {rule["next_due"][:10]}',
+                             size=12),
+            dense=True,
+        )
+        if vm.is_owner or rule["user_username"] == page.session.get("current_user"):
+            tile.trailing = ft.IconButton(ft.Icons.DELETE_OUTLINE, tooltip="Припинити повторення",
+                                          on_click=lambda e: handle_delete_rule(vm, rule["rule_id"]))
+        return tile
+
+    def show_recurring_rules(vm, rules):
+        tiles = [build_recurring_tile(vm, rule) for rule in rules]
+        vm.set_recurring([ft.Text("Регулярні операції:", size=18)] + tiles if tiles else [])
+
+    def load_recurring_rules(vm):
+        def load():
+            with get_db_conn() as conn:
+                return recurring.get_account_rules(conn, vm.account_id)
+
+        def loaded(rules):
+            show_recurring_rules(vm, rules)
+            if vm.root is not None and vm.root.page:
+                vm.recurring_column.update()
+
+        run_in_background(load, loaded, show_message)
+
+    def handle_delete_rule(vm, rule_id):
+        def delete():
+            STORAGE.run_write(recurring.delete_rule, rule_id, timeout=db.DEFAULT_QUERY_TIMEOUT)
+
+        run_in_background(delete, lambda _: load_recurring_rules(vm), show_message)
+
+    def build_account_details_view(data):
+        nonlocal details_vm
+        if data is None:
+            go_to_view(None)
+            return None
+        account, participants, history, rules = data
+        account_id = account["account_id"]
+        current_user = page.session.get("current_user")
+
+        vm = view_models.AccountDetailsViewModel(account_id, history, build_transaction_tile,
+                                                 run_in_background=run_in_background, show_error=show_message)
 
         rename_account_field = ft.TextField(label="Змінити назву", value=account["name"])
+        vm.rename_field = rename_account_field
 
         def handle_rename(e):
             new_name = rename_account_field.value.strip()
-            if new_name:
-                with get_db_conn() as conn:
-                    conn.execute("UPDATE accounts SET name = ? WHERE account_id = ?", (new_name, account_id))
-                    conn.commit()
-                update_view()
+            if not new_name:
+                return
+
+            def rename():
+                try:
+                    STORAGE.run_write(repository.rename_account, account_id, new_name,
+                                      timeout=db.DEFAULT_QUERY_TIMEOUT)
+                finally:
+                    budget_cache.invalidate_account(account_id)
+
+            def renamed(_):
+                vm.set_name(new_name)
+                vm.title_text.update()
+                rename_account_field.update()
+                account_events.publish(events.ACCOUNT_RENAMED, account_id, name=new_name)
+
+            run_in_background(rename, renamed, show_message)
 
         is_owner = (account["owner_username"] == current_user)
         delete_button_text = "Видалити рахунок (Ви Власник)" if is_owner else "Покинути рахунок"
         delete_button_icon = ft.Icons.DELETE_FOREVER if is_owner else ft.Icons.LOGOUT
 
-        participants_list_controls = []
+        vm.is_owner = is_owner
         if is_owner:
-            participants_list_controls.append(ft.Text("Учасники:", size=18))
-            for p in participants:
-                username = p["username"]
-                is_current_owner = (username == current_user)
-
-                participant_tile = ft.ListTile(
-                    leading=ft.Icon(ft.Icons.PERSON),
-                    title=ft.Text(f"{username} {'(Власник)' if is_current_owner else ''}"),
-                )
-
-                if not is_current_owner:
-                    participant_tile.trailing = ft.IconButton(
-                        icon=ft.Icons.REMOVE_CIRCLE_OUTLINE,
-                        icon_color="red",
-                        tooltip="Видалити учасника",
-                        on_click=lambda e, u=username: handle_remove_participant(e, u)
-                    )
-                participants_list_controls.append(participant_tile)
+            vm.participants_column.controls.append(ft.Text("Учасники:", size=18))
+            for username in participants:
+                vm.add_participant(username, build_participant_tile(username))
+        show_recurring_rules(vm, rules)
 
+        vm.balance_text = ft.Text(f"{money.format_minor(account['balance'])} грн", size=32, weight=ft.FontWeight.BOLD)
         left_column = ft.Column(
             [
                 ft.Text("Поточний баланс:", size=16, color="grey"),
-                ft.Text(f"{account['balance']:.2f} грн", size=32, weight=ft.FontWeight.BOLD),
+                vm.balance_text,
                 ft.Divider(height=10),
                 ft.Text("Операції:", size=18),
                 ft.ElevatedButton("Додати дохід", icon=ft.Icons.ADD, on_click=lambda e: open_transaction_page("income"),
                                   expand=True),
                 ft.ElevatedButton("Додати витрату", icon=ft.Icons.REMOVE,
                                   on_click=lambda e: open_transaction_page("expense"), expand=True),
+                ft.ElevatedButton("Імпорт виписки (CSV/OFX)", icon=ft.Icons.UPLOAD_FILE,
+                                  on_click=lambda e: statement_picker.pick_files(
+                                      allowed_extensions=["csv", "ofx", "qfx"]), expand=True),
+                vm.import_progress,
+                vm.import_status_text,
+                vm.recurring_column,
+                ft.Row([
+                    ft.TextButton("Експорт CSV", icon=ft.Icons.DOWNLOAD,
+                                  on_click=lambda e: handle_export_account("csv")),
+                    ft.TextButton("Експорт Parquet", icon=ft.Icons.DOWNLOAD, disabled=not exporter.PARQUET_AVAILABLE,
+                                  tooltip=None if exporter.PARQUET_AVAILABLE else "Потрібен пакет pyarrow",
+                                  on_click=lambda e: handle_export_account("parquet")),
+                ], wrap=True),
                 ft.Divider(height=10),
                 ft.Text("Спільний доступ:", size=18),
                 ft.TextField(label="ID для запрошення (скопіюйте це)", value=f"{account_id}", read_only=True),
@@ -461,57 +1012,55 @@ def main(page: ft.Page):
                                   on_click=lambda e: go_to_view("delete_account")),
 
                 ft.Divider(height=10),
-                *participants_list_controls
+                vm.participants_column
             ],
             width=350,
             spacing=10,
             scroll=ft.ScrollMode.AUTO  # скрол, якщо не вміщається
         )
 
-        transactions_list = ft.ListView(spacing=5, height=600, expand=True)
-        if not transactions:
-            transactions_list.controls.append(ft.Text("Історія транзакцій порожня."))
-        else:
-            for t in transactions:
-                timestamp_str = datetime.fromisoformat(t['timestamp']).strftime('%Y-%m-%d %H:%M')
-                user_str = t['user_username']
-                transaction_id = t['transaction_id']
-
-                is_author = (user_str == current_user)
-
-                tx_tile = ft.ListTile(
-                    leading=ft.Icon(ft.Icons.ARROW_UPWARD if t["type"] == "income" else ft.Icons.ARROW_DOWNWARD,
-                                    color='green' if t["type"] == "income" else 'red'),
-                    title=ft.Text(t['description']),
-                    subtitle=ft.Text(f"{timestamp_str} - {user_str}"),
-                    trailing=ft.Text(f"{'+' if t['type'] == 'income' else '-'}{t['amount']:.2f} грн",
-                                     weight=ft.FontWeight.BOLD),
-                    on_click=(lambda e, id=transaction_id: open_edit_transaction_page(id)) if is_author else None
-                )
-                transactions_list.controls.append(tx_tile)
+        vm.render_transactions()
+
+        def apply_history_filter(history_filter):
+            # Нове вікно з фільтрами читається у фоні; до відповіді список показує попереднє
+            history_window = pagination.HistoryWindow(get_db_conn, account_id, history_filter=history_filter)
+
+            def applied(_):
+                vm.set_history(history_window)
+                vm.transactions_list.update()
+
+            run_in_background(history_window.load_first, applied, show_message)
+
+        filter_bar = view_models.HistoryFilterBar(apply_history_filter, members=participants)
 
         right_column = ft.Column(
             [
                 ft.Text("Історія транзакцій (клікніть на свою для редагування):", size=18),
-                transactions_list
+                filter_bar.root,
+                vm.transactions_list
             ],
             width=430
         )
 
-        return ft.Column([
+        vm.title_text = ft.Text(account["name"], size=24, weight=ft.FontWeight.BOLD, expand=True)
+        vm.root = ft.Column([
             ft.Row([
                 ft.IconButton(ft.Icons.ARROW_BACK, on_click=lambda e: go_to_view(None), tooltip="Назад"),
-                ft.Text(account["name"], size=24, weight=ft.FontWeight.BOLD, expand=True),
+                vm.title_text,
             ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
             ft.Divider(height=10),
             ft.Row([left_column, right_column], spacing=20, vertical_alignment=ft.CrossAxisAlignment.START, height=650)
             # Задаємо висоту
         ], width=800, spacing=10)
+        details_vm = vm
+        account_events.watch(account_id, apply_account_event)
+        return vm.root
 
-    def build_add_transaction_view():
-        account_id = page.session.get("current_account_id")
-        with get_db_conn() as conn:
-            account = conn.execute("SELECT name FROM accounts WHERE account_id = ?", (account_id,)).fetchone()
+    def build_add_transaction_view(account):
+        if account is None:
+            # Рахунок видалив власник або користувач його покинув в іншій сесії
+            go_to_view(None)
+            return None
         trans_type = page.session.get("transaction_type")
         title = "Додати дохід" if trans_type == "income" else "Додати витрату"
         return ft.Column([
@@ -522,6 +1071,7 @@ def main(page: ft.Page):
             ft.Text(f'{title} до "{account["name"]}"', size=20, weight=ft.FontWeight.BOLD),
             transaction_amount_field,
             transaction_desc_field,
+            transaction_repeat_dropdown,
             transaction_error_text,
             ft.Row(
                 [
@@ -532,13 +1082,10 @@ def main(page: ft.Page):
             )
         ], width=800, spacing=20)
 
-    def build_edit_transaction_view():
-        account_id = page.session.get("current_account_id")
-        transaction_id = page.session.get("current_transaction_id")
-
-        with get_db_conn() as conn:
-            account = conn.execute("SELECT name FROM accounts WHERE account_id = ?", (account_id,)).fetchone()
-
+    def build_edit_transaction_view(account):
+        if account is None:
+            go_to_view(None)
+            return None
         return ft.Column([
             ft.Row([
                 ft.IconButton(ft.Icons.ARROW_BACK, on_click=lambda e: go_to_view("account_details"), tooltip="Назад"),
@@ -559,18 +1106,15 @@ def main(page: ft.Page):
             )
         ], width=800, spacing=20)
 
-    def build_delete_confirmation_view():
-        account_id = page.session.get("current_account_id")
+    def build_delete_confirmation_view(account):
         current_user = page.session.get("current_user")
-        with get_db_conn() as conn:
-            account = conn.execute("SELECT * FROM accounts WHERE account_id = ?", (account_id,)).fetchone()
         if account is None:
-            go_to_view(None);
-            return ft.Container()
+            go_to_view(None)
+            return None
         is_owner = (account["owner_username"] == current_user)
         if is_owner:
             title_text = "Видалити рахунок?"
-            warning_text = f"Усі транзакції та баланс ({account['balance']:.2f} грн) будуть видалені НАЗАВЖДИ."
+            warning_text = f"Усі транзакції та баланс ({money.format_minor(account['balance'])} грн) будуть видалені НАЗАВЖДИ."
             button_text = "Так, видалити"
         else:
             title_text = "Покинути рахунок?"
@@ -595,31 +1139,258 @@ def main(page: ft.Page):
             width=800, spacing=20, horizontal_alignment=ft.CrossAxisAlignment.CENTER
         )
 
-    def build_main_view():
-        current_user = page.session.get("current_user")
+    def build_report_table(title, rows, key_label, key_names=None):
+        key_names = key_names or {}
+        return ft.Column([
+            ft.Text(title, size=18),
+            ft.DataTable(
+                columns=[
+                    ft.DataColumn(ft.Text(key_label)),
+                    ft.DataColumn(ft.Text("Доходи"), numeric=True),
+                    ft.DataColumn(ft.Text("Витрати"), numeric=True),
+                    ft.DataColumn(ft.Text("Операцій"), numeric=True),
+                ],
+                rows=[ft.DataRow(cells=[
+                    ft.DataCell(ft.Text(key_names.get(r["key"], r["key"]))),
+                    ft.DataCell(ft.Text(money.format_minor(r["income"]))),
+                    ft.DataCell(ft.Text(money.format_minor(r["expense"]))),
+                    ft.DataCell(ft.Text(str(r["count"]))),
+                ]) for r in rows],
+            ),
+        ])
+
+    def load_analytics_series(account_id):
+        try:
+            with get_db_conn() as conn:
+                return analytics.analytics_cache.get_series(conn, account_id)
+        except analytics.AnalyticsUnavailableError as exc:
+            return exc
+
+    def build_analytics_section(series):
+        # Графік балансу з ковзним середнім, витрати за днями тижня і прогноз на 30 днів
+        if isinstance(series, analytics.AnalyticsUnavailableError):
+            return ft.Text(str(series), color="grey")
+        if not len(series):
+            return ft.Text("Для аналітики поки немає транзакцій.")
+
+        days, balance = series.daily_balance()
+        average = analytics.moving_average(balance, 7)
+        future_days, future_balance = series.forecast(30)
+        chart_days, chart_balance = analytics.downsample(days, balance, 200)
+        _, chart_average = analytics.downsample(days, average, 200)
+
+        def line(xs, ys, color, dash=None):
+            return ft.LineChartData(
+                data_points=[ft.LineChartDataPoint(float(x), float(y)) for x, y in zip(xs, ys)],
+                color=color, stroke_width=2, dash_pattern=dash,
+            )
+
+        chart = ft.LineChart(
+            data_series=[
+                line(chart_days, chart_balance, "blue"),
+                line(chart_days, chart_average, "orange"),
+                line(future_days, future_balance, "grey", [6, 4]),
+            ],
+            bottom_axis=ft.ChartAxis(labels=[
+                ft.ChartAxisLabel(value=float(day), label=ft.Text(analytics.day_to_date(day).strftime("%m.%y"),
+                                                                  size=10))
+                for day in (chart_days[0], chart_days[-1], future_days[-1])
+            ], labels_size=30),
+            left_axis=ft.ChartAxis(labels_size=50),
+            height=250,
+            expand=True,
+        )
+        weekdays = series.weekday_spending()
+        return ft.Column([
+            ft.Text("Аналітика рахунку", size=18),
+            ft.Text("Баланс по днях (синій), ковзне середнє за 7 днів (помаранчевий), прогноз (сірий)",
+                    size=12, color="grey"),
+            chart,
+            ft.Text(f"Прогноз балансу на {analytics.day_to_date(future_days[-1]).strftime('%Y-%m-%d')}: "
+                    f"{future_balance[-1]:.2f} грн"),
+            ft.Text("Витрати за днями тижня:", size=14),
+            ft.Row([ft.Column([ft.Text(name, weight=ft.FontWeight.BOLD), ft.Text(f"{value:.2f}")],
+                              horizontal_alignment=ft.CrossAxisAlignment.CENTER)
+                    for name, value in zip(analytics.WEEKDAY_NAMES, weekdays)], spacing=20),
+        ], spacing=10)
+
+    def load_reports(current_user, selected):
+        # Звіти читаються лише з monthly_rollups: рядків стільки, скільки місяців/учасників, а не транзакцій
+        home = budget_cache.get_home(current_user, lambda: load_home(current_user))
+        account_names = {acc["account_id"]: acc["name"] for acc in home["accounts"]}
+        if selected not in account_names:
+            selected = None
+        account_ids = [selected] if selected else list(account_names)
+        since = rollups.first_period(REPORT_MONTHS)
+        with get_db_conn() as conn:
+            report = {
+                "account_names": account_names,
+                "selected": selected,
+                "monthly": rollups.monthly_report(conn, account_ids, since),
+                "members": rollups.member_report(conn, account_ids, since),
+                "by_account": rollups.account_report(conn, account_ids, since),
+            }
+        report["series"] = load_analytics_series(selected) if selected else None
+        return report
+
+    def build_reports_view(report):
+        account_names = report["account_names"]
+        selected = report["selected"]
+        monthly = report["monthly"]
+
+        def handle_account_change(e):
+            page.session.set("report_account_id", e.control.value or None)
+            update_view()
+
+        account_dropdown = ft.Dropdown(
+            label="Рахунок", width=300, value=selected or "",
+            options=[ft.dropdown.Option("", "Усі рахунки")] + [
+                ft.dropdown.Option(account_id, name) for account_id, name in account_names.items()],
+            on_change=handle_account_change,
+        )
+
+        # Стовпчики - у гривнях, підписи - точні суми з копійками
+        max_value = max([max(r["income"], r["expense"]) for r in monthly] + [money.MINOR_PER_UNIT])
+        chart = ft.BarChart(
+            bar_groups=[
+                ft.BarChartGroup(x=i, bar_rods=[
+                    ft.BarChartRod(from_y=0, to_y=money.from_minor(r["income"]), width=10, color="green",
+                                   tooltip=f"Доходи: {money.format_minor(r['income'])}"),
+                    ft.BarChartRod(from_y=0, to_y=money.from_minor(r["expense"]), width=10, color="red",
+                                   tooltip=f"Витрати: {money.format_minor(r['expense'])}"),
+                ]) for i, r in enumerate(monthly)
+            ],
+            bottom_axis=ft.ChartAxis(labels=[
+                ft.ChartAxisLabel(value=i, label=ft.Text(r["key"], size=10)) for i, r in enumerate(monthly)
+            ], labels_size=30),
+            left_axis=ft.ChartAxis(labels_size=50),
+            max_y=money.from_minor(max_value) * 1.1,
+            height=300,
+            expand=True,
+        )
+
+        return ft.Column([
+            ft.Row([
+                ft.IconButton(ft.Icons.ARROW_BACK, on_click=lambda e: go_to_view(None), tooltip="Назад"),
+                ft.Text(f"Звіти за {REPORT_MONTHS} міс.", size=24, weight=ft.FontWeight.BOLD, expand=True),
+            ]),
+            account_dropdown,
+            chart if monthly else ft.Text("За цей період транзакцій немає."),
+            build_report_table("За місяцями", monthly, "Місяць"),
+            build_report_table("За учасниками", report["members"], "Учасник"),
+            build_report_table("За рахунками", report["by_account"], "Рахунок", account_names),
+            build_analytics_section(report["series"]) if selected else ft.Text(
+                "Виберіть рахунок, щоб побачити графік балансу та прогноз.", color="grey"),
+        ], width=800, spacing=20, scroll=ft.ScrollMode.AUTO)
+
+    def build_search_result(t):
+        tile = build_home_tile(t, t['account_name'])
+        tile.on_click = (lambda id=t["account_id"]: lambda e: open_account_details(id))()
+        return tile
+
+    def build_search_view(home):
+        # Пошук по описах транзакцій рахунків користувача (FTS5); результати догружаються сторінками
+        account_names = {acc["account_id"]: acc["name"] for acc in home["accounts"]}
+        query_field = ft.TextField(label="Опис (наприклад, стоматолог)", width=400, autofocus=True)
+        account_dropdown = ft.Dropdown(
+            label="Рахунок", width=250, value="",
+            options=[ft.dropdown.Option("", "Усі рахунки")] + [
+                ft.dropdown.Option(account_id, name) for account_id, name in account_names.items()],
+        )
+        author_field = ft.TextField(label="Автор", width=200)
+        date_from_field = ft.TextField(label="З дати", hint_text="РРРР-ММ-ДД", width=150)
+        date_to_field = ft.TextField(label="По дату", hint_text="РРРР-ММ-ДД", width=150)
+        min_amount_field = ft.TextField(label="Сума від", keyboard_type=ft.KeyboardType.NUMBER, width=150)
+        max_amount_field = ft.TextField(label="Сума до", keyboard_type=ft.KeyboardType.NUMBER, width=150)
+        search_error_text = ft.Text(value="", color="red")
+        results = ft.Column(spacing=5)
+        more_button = ft.TextButton("Показати ще", visible=False)
+        # Поточний запит і курсор останнього показаного рядка; відповідь на старий запит відкидається
+        state = {"request": None, "cursor": None}
+
+        def run_search(cursor):
+            request = state["request"]
+            account_ids = [request["account_id"]] if request["account_id"] else list(account_names)
+
+            def work():
+                with get_db_conn() as conn:
+                    return search.search_transactions(
+                        conn, account_ids, request["text"], request["date_from"], request["date_to"],
+                        request["min_amount"], request["max_amount"], request["author"], after=cursor)
+
+            def found(result):
+                if state["request"] is not request:
+                    return
+                rows, has_more = result
+                if cursor is None:
+                    results.controls.clear()
+                    if not rows:
+                        results.controls.append(ft.Text("Нічого не знайдено."))
+                results.controls.extend(build_search_result(t) for t in rows)
+                if rows:
+                    state["cursor"] = pagination.row_cursor(rows[-1])
+                more_button.visible = has_more
+                page.update()
+
+            run_in_background(work, found, lambda message: show_error(search_error_text, message))
+
+        def handle_search(e):
+            is_valid, filters = validation.validate_search_filters(
+                date_from_field.value, date_to_field.value, min_amount_field.value, max_amount_field.value)
+            if not is_valid:
+                show_error(search_error_text, filters)
+                return
+            search_error_text.value = ""
+            state["request"] = dict(filters, text=query_field.value, account_id=account_dropdown.value or None,
+                                    author=(author_field.value or "").strip() or None)
+            state["cursor"] = None
+            run_search(None)
+
+        query_field.on_submit = handle_search
+        more_button.on_click = lambda e: run_search(state["cursor"])
+
+        return ft.Column([
+            ft.Row([
+                ft.IconButton(ft.Icons.ARROW_BACK, on_click=lambda e: go_to_view(None), tooltip="Назад"),
+                ft.Text("Пошук транзакцій", size=24, weight=ft.FontWeight.BOLD, expand=True),
+            ]),
+            ft.Row([query_field, ft.ElevatedButton("Знайти", icon=ft.Icons.SEARCH, on_click=handle_search)]),
+            ft.Row([account_dropdown, author_field], wrap=True),
+            ft.Row([date_from_field, date_to_field, min_amount_field, max_amount_field], wrap=True),
+            search_error_text,
+            results,
+            more_button,
+        ], width=800, spacing=15, scroll=ft.ScrollMode.AUTO)
+
+    def load_home(current_user):
         with get_db_conn() as conn:
-            c = conn.cursor()
-            c.execute("SELECT account_id FROM user_accounts_link WHERE username = ?", (current_user,))
-            user_account_ids_tuples = c.fetchall()
-            user_account_ids = [row["account_id"] for row in user_account_ids_tuples]
-            accounts = []
-            if user_account_ids:
-                placeholders = ','.join('?' for _ in user_account_ids)
-                c.execute(f"SELECT * FROM accounts WHERE account_id IN ({placeholders})", user_account_ids)
-                accounts = c.fetchall()
-            all_transactions = []
-            if user_account_ids:
-                c.execute(f"""
-                    SELECT t.*, a.name as account_name FROM transactions t
-                    JOIN accounts a ON t.account_id = a.account_id
-                    WHERE t.account_id IN ({placeholders})
-                    ORDER BY t.timestamp DESC
-                    LIMIT 10
-                """, user_account_ids)
-                all_transactions = c.fetchall()
+            return repository.get_accounts_with_recent_tx(conn, [current_user])[current_user]
+
+    def load_main(current_user):
+        return budget_cache.get_home(current_user, lambda: load_home(current_user))
+
+    def build_home_tile(t, account_name):
+        timestamp_str = records.format_timestamp(t['ts'])
+        user_str = t['user_username']
+        return ft.ListTile(
+            leading=ft.Icon(ft.Icons.ARROW_UPWARD if t["type"] == "income" else ft.Icons.ARROW_DOWNWARD,
+                            color='green' if t["type"] == "income" else 'red'),
+            title=ft.Text(f"{t['description']} ({account_name})"),
+            subtitle=ft.Text(f"{timestamp_str} - {user_str}"),
+            trailing=ft.Text(f"{'+' if t['type'] == 'income' else '-'}{money.format_minor(t['amount'])} грн",
+                             weight=ft.FontWeight.BOLD)
+        )
+
+    def build_main_view(home):
+        current_user = page.session.get("current_user")
+        accounts = home["accounts"]
+        all_transactions = home["transactions"]
 
         header = ft.Row([
             ft.Text(f"Вітаємо, {current_user}!", size=24, weight=ft.FontWeight.BOLD, expand=True),
+            ft.IconButton(ft.Icons.SEARCH, on_click=lambda e: go_to_view("search"), tooltip="Пошук транзакцій"),
+            ft.IconButton(ft.Icons.BAR_CHART, on_click=lambda e: go_to_view("reports"), tooltip="Звіти"),
+            ft.IconButton(ft.Icons.DOWNLOAD, on_click=handle_export_user, tooltip="Експорт усіх рахунків (CSV)"),
             ft.IconButton(ft.Icons.LOGOUT, on_click=handle_logout, tooltip="Вийти")
         ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN)
 
@@ -644,7 +1415,7 @@ def main(page: ft.Page):
                 card = ft.Container(
                     content=ft.Column([
                         ft.Text(acc["name"], size=16, weight=ft.FontWeight.BOLD),
-                        ft.Text(f"{acc['balance']:.2f} грн", size=20),
+                        ft.Text(f"{money.format_minor(acc['balance'])} грн", size=20),
                     ]),
                     padding=15,
                     width=220,
@@ -659,16 +1430,36 @@ def main(page: ft.Page):
                 transactions_list.controls.append(ft.Text("Історія транзакцій порожня."))
             else:
                 for t in all_transactions:
-                    timestamp_str = datetime.fromisoformat(t['timestamp']).strftime('%Y-%m-%d %H:%M')
-                    user_str = t['user_username']
-                    transactions_list.controls.append(ft.ListTile(
-                        leading=ft.Icon(ft.Icons.ARROW_UPWARD if t["type"] == "income" else ft.Icons.ARROW_DOWNWARD,
-                                        color='green' if t["type"] == "income" else 'red'),
-                        title=ft.Text(f"{t['description']} ({t['account_name']})"),
-                        subtitle=ft.Text(f"{timestamp_str} - {user_str}"),
-                        trailing=ft.Text(f"{'+' if t['type'] == 'income' else '-'}{t['amount']:.2f} грн",
-                                         weight=ft.FontWeight.BOLD)
-                    ))
+                    transactions_list.controls.append(build_home_tile(t, t['account_name']))
+
+            # З фільтрами список читається сторінками по всіх рахунках користувача (pagination.HistoryWindow)
+            account_names = {acc["account_id"]: acc["name"] for acc in accounts}
+            filtered = view_models.HistoryListViewModel(
+                None, lambda t: build_home_tile(t, account_names.get(t['account_id'], "")), height=400,
+                run_in_background=run_in_background, show_error=show_message)
+            filtered.transactions_list.visible = False
+            transactions_title = ft.Text("Останні транзакції (всі рахунки):", size=18)
+
+            def apply_home_filter(history_filter):
+                if history_filter.is_default:
+                    transactions_title.value = "Останні транзакції (всі рахунки):"
+                    transactions_list.visible = True
+                    filtered.transactions_list.visible = False
+                    page.update()
+                    return
+                history_window = pagination.HistoryWindow(get_db_conn, list(account_names),
+                                                          history_filter=history_filter)
+
+                def applied(_):
+                    transactions_title.value = "Транзакції за фільтром (всі рахунки):"
+                    transactions_list.visible = False
+                    filtered.transactions_list.visible = True
+                    filtered.set_history(history_window)
+                    page.update()
+
+                run_in_background(history_window.load_first, applied, show_message)
+
+            filter_bar = view_models.HistoryFilterBar(apply_home_filter)
             return ft.Column([
                 header,
                 ft.Text("Ваші рахунки:", size=18),
@@ -676,41 +1467,153 @@ def main(page: ft.Page):
                 ft.ElevatedButton("Додати рахунок", icon=ft.Icons.ADD, on_click=lambda e: go_to_view("add_account"),
                                   disabled=len(accounts) >= 4),
                 ft.Divider(height=20),
-                ft.Text("Останні транзакції (всі рахунки):", size=18),
-                transactions_list
+                transactions_title,
+                filter_bar.root,
+                transactions_list,
+                filtered.transactions_list,
             ], width=800, spacing=20)
 
+    # Вигляди, з яких можна повернутися до сторінки рахунку без її перебудови
+    account_subviews = ("account_details", "add_transaction", "edit_transaction", "delete_account")
+    # Форми рахунку: будуються з рядка рахунку, прочитаного у фоні
+    account_forms = {"add_transaction": build_add_transaction_view, "edit_transaction": build_edit_transaction_view,
+                     "delete_account": build_delete_confirmation_view}
+
+    def show_view(view, name, build_seconds=0.0, load_seconds=None):
+        # Сторінка рахунку лишається на page прихованою, поки відкриті її форми, тож при
+        # поверненні Flet надсилає лише зміну visible та змінені елементи, а не все дерево.
+        # Час побудови, відправки, кількість елементів і байтів іде в metrics з міткою name.
+        nonlocal rendered
+        controls = []
+        if details_vm is not None:
+            details_vm.root.visible = view is details_vm.root
+            controls.append(details_vm.root)
+        if details_vm is None or view is not details_vm.root:
+            controls.append(view)
+        page.controls.clear()
+        page.controls.extend(controls)
+        with metrics.render(name, view, build_seconds, load_seconds):
+            page.update()
+        if not rendered and name != "loading":
+            rendered = True
+            session_rendered(time.perf_counter() - session_started)
+
     def update_view():
-        page.clean()
+        nonlocal details_vm, view_generation
+        view_generation += 1
         current_user = page.session.get("current_user")
         current_view = page.session.get("view")
+        account_id = page.session.get("current_account_id")
+
+        started = time.perf_counter()
+
+        if not current_user or current_view not in account_subviews or (
+                details_vm is not None and details_vm.account_id != account_id):
+            details_vm = None
+            account_events.unwatch()
 
         if not current_user:
             if current_view == "register":
-                page.add(build_register_view())
+                view = build_register_view()
             else:
-                page.add(build_login_view())
+                current_view = "login"
+                view = build_login_view()
         else:
+            # Сторінки, що читають БД, будуються після фонового завантаження (спочатку спінер)
+            view = None
             if current_view == "add_account":
-                page.add(build_add_account_view())
+                view = build_add_account_view()
             elif current_view == "account_details":
-                page.add(build_account_details_view())
-            elif current_view == "add_transaction":
-                page.add(build_add_transaction_view())
-            elif current_view == "edit_transaction":
-                page.add(build_edit_transaction_view())
-            elif current_view == "delete_account":
-                page.add(build_delete_confirmation_view())
-            else:
-                page.add(build_main_view())
+                if details_vm is None:
+                    load_view(lambda: load_account_details(account_id), build_account_details_view, current_view)
+                    return
+                view = details_vm.root
+            elif current_view in account_forms:
+                # Рядок рахунку (назва, власник) читається у фоні: на промаху кешу це запит до БД
+                load_view(lambda: get_account(account_id), account_forms[current_view], current_view)
+                return
+            elif current_view == "search":
+                load_view(lambda: load_main(current_user), build_search_view, current_view)
+                return
+            elif current_view == "reports":
+                selected = page.session.get("report_account_id")
+                load_view(lambda: load_reports(current_user, selected), build_reports_view, current_view)
+                return
+            if view is None:
+                page.session.set("view", None)
+                load_view(lambda: load_main(current_user), build_main_view, "main")
+                return
 
-        page.update()
+        show_view(view, current_view or "main", time.perf_counter() - started)
 
-    if not page.session.get("view"):
+    if not page.session.get("current_user"):
+        # Перепідключення (зокрема до іншого воркера): користувач відновлюється з підписаного токена
+        restored = sessions.verify_token(page.client_storage.get(sessions.CLIENT_STORAGE_KEY))
+        if restored:
+            page.session.set("current_user", restored)
+            page.session.set("view", None)
+
+    if not page.session.get("view") and not page.session.get("current_user"):
         page.session.set("view", "login")
 
     update_view()
 
 
+def configure_logging():
+    # Події (render, slow_query, ...) - рядки JSON у повідомленні; BUDGET_LOG_LEVEL=DEBUG додає кожен запит
+    logging.basicConfig(level=os.environ.get("BUDGET_LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+
+def create_asgi_app():
+    # Фабрика для uvicorn: кожен воркер імпортує main і має власні пул з'єднань, кеш і pubsub
+    configure_logging()
+    bootstrap()
+    return ft.app(target=main, upload_dir=UPLOAD_DIR, assets_dir=ASSETS_DIR, export_asgi_app=True)
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Сімейний бюджет")
+    parser.add_argument("--host", default=os.environ.get("BUDGET_HOST"),
+                        help="адреса веб-сервера; якщо задана, браузер не відкривається")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("BUDGET_PORT", "0")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("BUDGET_WORKERS", "1")))
+    parser.add_argument("--db-url", default=os.environ.get("BUDGET_DB_URL", DB_FILE),
+                        help="шлях до SQLite або postgresql://...")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    global STORAGE, DB_ERRORS
+    db_url = storage.absolute_url(args.db_url)
+    if db_url != STORAGE.url:
+        STORAGE = storage.from_url(db_url)
+        DB_ERRORS = DB_ERRORS + STORAGE.errors
+
+    if args.workers > 1:
+        if uvicorn is None:
+            parser.error("для кількох воркерів потрібен uvicorn (pip install uvicorn flet-web)")
+        if not args.port:
+            parser.error("для кількох воркерів потрібен --port")
+        if not os.environ.get("FLET_SECRET_KEY"):
+            # Завантаження виписок підписуються цим ключем і можуть потрапити до іншого воркера
+            parser.error("для кількох воркерів задайте FLET_SECRET_KEY, однаковий для всіх процесів")
+        # Воркери - окремі процеси, що імпортують main заново; сховище їм передається через середовище
+        os.environ["BUDGET_DB_URL"] = db_url
+        os.environ["BUDGET_WORKERS"] = str(args.workers)
+        # Кеш рахунків у воркерах вимкнено (cache.budget_cache), а живі оновлення page.pubsub ходять лише
+        # між сесіями одного воркера: сесії інших воркерів бачать зміни при наступному відкритті сторінки
+        metrics.log_event(log, logging.WARNING, "workers_live_updates_local", workers=args.workers)
+        uvicorn.run("main:create_asgi_app", factory=True, host=args.host or "127.0.0.1", port=args.port,
+                    workers=args.workers)
+        return
+
+    view = ft.AppView.WEB_BROWSER if args.host is None else None
+    try:
+        bootstrap()
+        ft.app(target=main, host=args.host, port=args.port, view=view, upload_dir=UPLOAD_DIR, assets_dir=ASSETS_DIR)
+    finally:
+        STORAGE.close()
+
+
 if __name__ == "__main__":
-    ft.app(target=main, view=ft.AppView.WEB_BROWSER)
\ No newline at end of file
+    run()
\ No newline at end of file
@@ -0,0 +1,339 @@
+import bisect
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Вимірювання продуктивності: час і кількість рядків кожного запиту до БД, час побудови й відправки
+# кожного вигляду. Лічильники й гістограми в пам'яті процесу віддаються у форматі Prometheus
+# на локальному HTTP-порту (BUDGET_METRICS_PORT), події пишуться в журнал рядками JSON,
+# повільні запити - окремим журналом budget.slow_query.
+
+ENABLED = os.environ.get("BUDGET_METRICS", "1") != "0"
+SLOW_QUERY_MS = float(os.environ.get("BUDGET_SLOW_QUERY_MS", "250"))
+METRICS_HOST = os.environ.get("BUDGET_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("BUDGET_METRICS_PORT", "0"))
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+log = logging.getLogger("budget")
+slow_log = logging.getLogger("budget.slow_query")
+
+
+def log_event(logger, level, event, **fields):
+    # Один рядок JSON на подію; нічого не серіалізується, якщо рівень вимкнено
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps({"event": event, **fields}, ensure_ascii=False, default=str))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(zip(self.label_names, label_values))} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, *label_values, value):
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label_values -> [лічильники по кошиках..., понад останній кошик, кількість, сума]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [0] * (len(self.buckets) + 3)
+            state[bisect.bisect_left(self.buckets, value)] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def count(self, *label_values):
+        state = self._values.get(label_values)
+        return state[-2] if state else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for label_values, state in items:
+            labels = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {state[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        # Значення, які дешевше прочитати в момент запиту /metrics (пул з'єднань, кеш)
+        self.callbacks = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self.add(Counter(name, help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=()):
+        return self.add(Gauge(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=SECONDS_BUCKETS):
+        return self.add(Histogram(name, help_text, label_names, buckets))
+
+    def register_callback(self, fn):
+        # fn() оновлює gauge-и цього реєстру перед кожним зчитуванням
+        self.callbacks.append(fn)
+
+    def render(self):
+        for fn in self.callbacks:
+            try:
+                fn()
+            except Exception as exc:
+                log_event(log, logging.WARNING, "metrics_callback_failed", error=str(exc))
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+query_seconds = registry.histogram("budget_db_query_seconds", "Час запиту до БД разом з вибіркою рядків",
+                                   ("query",))
+query_rows = registry.counter("budget_db_query_rows_total", "Рядків прочитано або змінено запитами", ("query",))
+slow_queries = registry.counter("budget_db_slow_queries_total", "Запитів, довших за BUDGET_SLOW_QUERY_MS",
+                                ("query",))
+query_info = registry.gauge("budget_db_query_info", "Нормалізований текст запиту для мітки query",
+                            ("query", "sql"))
+write_seconds = registry.histogram("budget_db_write_seconds",
+                                   "Час транзакції черги запису; backup - чи йшло тоді резервне копіювання",
+                                   ("backup",))
+backup_running = registry.gauge("budget_backup_running", "Резервних копіювань, що йдуть зараз")
+backup_seconds = registry.histogram("budget_backup_seconds", "Час створення знімка БД",
+                                    buckets=(1, 5, 15, 60, 300, 900, 3600))
+backups_total = registry.counter("budget_backups_total", "Знімків БД: ok - створено, failed - невдало", ("result",))
+backup_bytes = registry.gauge("budget_backup_bytes", "Розмір останнього знімка БД")
+view_load_seconds = registry.histogram("budget_view_load_seconds", "Час фонового читання даних вигляду",
+                                       ("view",))
+view_build_seconds = registry.histogram("budget_view_build_seconds", "Час побудови дерева елементів вигляду",
+                                        ("view",))
+view_update_seconds = registry.histogram("budget_view_update_seconds", "Час page.update() при показі вигляду",
+                                         ("view",))
+view_controls = registry.histogram("budget_view_controls", "Кількість елементів у показаному вигляді",
+                                   ("view",), COUNT_BUCKETS)
+view_bytes = registry.histogram("budget_view_bytes", "Байтів змін, надісланих клієнту при показі вигляду",
+                                ("view",), BYTES_BUCKETS)
+
+
+# Запити
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\bIN \((?:\s*\?\s*,)+\s*\?\s*\)", re.IGNORECASE)
+_ALIAS_RE = re.compile(r"\bAS ([A-Za-z_]+?)\d+\b", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    # (короткий id, нормалізований текст): літерали -> ?, списки IN (?, ?, ...) -> IN (?...),
+    # однакові гілки UNION ALL (по одній на рахунок) - одна, тож мітка не залежить від кількості рахунків
+    text = _SPACE_RE.sub(" ", _LITERAL_RE.sub("?", sql)).strip()
+    text = _ALIAS_RE.sub(r"AS \1?", _LIST_RE.sub("IN (?...)", text))
+    parts = []
+    for part in text.split(" UNION ALL "):
+        if not parts or parts[-1] != part:
+            parts.append(part)
+    text = " UNION ALL ".join(parts)
+    query_id = hashlib.sha1(text.encode()).hexdigest()[:12]
+    query_info.set(query_id, text[:300], value=1)
+    return query_id, text
+
+
+def observe_query(sql, seconds, rows):
+    query_id, text = fingerprint(sql)
+    query_seconds.observe(seconds, query_id)
+    if rows > 0:
+        query_rows.inc(query_id, amount=rows)
+    if log.isEnabledFor(logging.DEBUG):
+        log_event(log, logging.DEBUG, "query", query=query_id, ms=round(seconds * 1000, 3), rows=rows)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc(query_id)
+        log_event(slow_log, logging.WARNING, "slow_query", query=query_id, sql=text, ms=round(seconds * 1000, 1),
+                  rows=rows)
+
+
+def observe_write(seconds):
+    # Час транзакцій записувача окремо під час резервного копіювання і без нього: вплив копії на записи
+    if ENABLED:
+        write_seconds.observe(seconds, "running" if backup_running.value() else "idle")
+
+
+# Вигляди
+
+_local = threading.local()
+
+
+def count_controls(control):
+    count = 0
+    stack = [control]
+    while stack:
+        current = stack.pop()
+        count += 1
+        stack.extend(child for child in current._get_children() if child is not None)
+    return count
+
+
+def watch_connection(conn):
+    # Обгортає send_commands з'єднання Flet (одне на процес), щоб рахувати байти змін, надісланих
+    # під час показу вигляду в цьому потоці. Інші page.update() не серіалізуються вдруге.
+    if conn is None or getattr(conn, "budget_metrics_watched", False):
+        return
+    from flet.core.protocol import CommandEncoder
+
+    send_commands = conn.send_commands
+
+    def counted_send_commands(session_id, commands):
+        state = getattr(_local, "render", None)
+        if state is not None:
+            state["bytes"] += len(json.dumps(commands, cls=CommandEncoder, separators=(",", ":")))
+        return send_commands(session_id, commands)
+
+    conn.send_commands = counted_send_commands
+    conn.budget_metrics_watched = True
+
+
+@contextmanager
+def render(view_name, root, build_seconds=0.0, load_seconds=None):
+    # Огортає page.update() при показі вигляду; build_seconds і load_seconds міряє викликач
+    if not ENABLED:
+        yield
+        return
+    state = {"bytes": 0}
+    _local.render = state
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _local.render = None
+        update_seconds = time.perf_counter() - started
+        controls = count_controls(root)
+        if load_seconds is not None:
+            view_load_seconds.observe(load_seconds, view_name)
+        view_build_seconds.observe(build_seconds, view_name)
+        view_update_seconds.observe(update_seconds, view_name)
+        view_controls.observe(controls, view_name)
+        view_bytes.observe(state["bytes"], view_name)
+        log_event(log, logging.INFO, "render", view=view_name,
+                  load_ms=None if load_seconds is None else round(load_seconds * 1000, 1),
+                  build_ms=round(build_seconds * 1000, 1), update_ms=round(update_seconds * 1000, 1),
+                  controls=controls, bytes=state["bytes"])
+
+
+# HTTP
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port=METRICS_PORT, host=METRICS_HOST, attempts=1):
+    # Раз на процес. Кілька воркерів на одній машині займають перший вільний порт з
+    # port .. port + attempts - 1. None, якщо порт не задано або всі зайняті.
+    global _server
+    with _server_lock:
+        if _server is not None or not port:
+            return _server
+        for candidate in range(port, port + max(1, attempts)):
+            try:
+                _server = ThreadingHTTPServer((host, candidate), _MetricsHandler)
+                break
+            except OSError:
+                continue
+        else:
+            log_event(log, logging.WARNING, "metrics_port_busy", host=host, port=port, attempts=attempts)
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="budget-metrics", daemon=True).start()
+        log_event(log, logging.INFO, "metrics_started", host=host, port=_server.server_address[1])
+        return _server
+
+
+def stop_http_server():
+    global _server
+    with _server_lock:
+        server, _server = _server, None
+    if server is not None:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,472 @@
+def _migrate_to_minor_units(conn):
+    # SQLite не змінює тип стовпця, тому таблиці перебудовуються. Баланс більше не зберігається
+    # в accounts: він рахується з контрольної точки та транзакцій після неї (див. ledger.py).
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()
+    conn.execute("""
+        CREATE TABLE transactions_new (
+            transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id TEXT NOT NULL,
+            type TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            description TEXT,
+            timestamp TEXT NOT NULL,
+            user_username TEXT NOT NULL,
+            import_hash TEXT,
+            FOREIGN KEY (account_id) REFERENCES accounts (account_id),
+            FOREIGN KEY (user_username) REFERENCES users (username)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO transactions_new
+            (transaction_id, account_id, type, amount, description, timestamp, user_username, import_hash)
+        SELECT transaction_id, account_id, type, CAST(ROUND(amount * 100) AS INTEGER), description, timestamp,
+               user_username, import_hash
+        FROM transactions
+    """)
+    conn.execute("DROP TABLE transactions")
+    conn.execute("ALTER TABLE transactions_new RENAME TO transactions")
+    # AUTOINCREMENT не повинен повторно видати номери видалених транзакцій
+    if sequence is not None:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'transactions'", (sequence[0],))
+    conn.execute("CREATE INDEX idx_transactions_account_timestamp ON transactions (account_id, timestamp)")
+    conn.execute("CREATE INDEX idx_transactions_user ON transactions (user_username)")
+    conn.execute("""
+        CREATE UNIQUE INDEX idx_transactions_import_hash
+        ON transactions (import_hash) WHERE import_hash IS NOT NULL
+    """)
+    # Дельта після контрольної точки читається діапазоном (account_id, transaction_id)
+    conn.execute("CREATE INDEX idx_transactions_account_id ON transactions (account_id, transaction_id)")
+
+    conn.execute("""
+        CREATE TABLE accounts_new (
+            account_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            owner_username TEXT NOT NULL,
+            FOREIGN KEY (owner_username) REFERENCES users (username)
+        )
+    """)
+    conn.execute("INSERT INTO accounts_new (account_id, name, owner_username) "
+                 "SELECT account_id, name, owner_username FROM accounts")
+    conn.execute("DROP TABLE accounts")
+    conn.execute("ALTER TABLE accounts_new RENAME TO accounts")
+
+    conn.execute("DROP TABLE monthly_rollups")
+    conn.execute("""
+        CREATE TABLE monthly_rollups (
+            account_id TEXT NOT NULL,
+            period TEXT NOT NULL,
+            type TEXT NOT NULL,
+            user_username TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (account_id, period, type, user_username)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO monthly_rollups (account_id, period, type, user_username, total, count)
+        SELECT account_id, substr(timestamp, 1, 7), type, user_username, SUM(amount), COUNT(*)
+        FROM transactions
+        GROUP BY 1, 2, 3, 4
+    """)
+
+    conn.execute("""
+        CREATE TABLE balance_checkpoints (
+            account_id TEXT NOT NULL,
+            up_to_transaction_id INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (account_id, up_to_transaction_id)
+        ) WITHOUT ROWID
+    """)
+    # Перша контрольна точка - сума всіх наявних транзакцій рахунку
+    conn.execute("""
+        INSERT INTO balance_checkpoints (account_id, up_to_transaction_id, balance, created_at)
+        SELECT account_id, MAX(transaction_id), SUM(CASE type WHEN 'income' THEN amount ELSE -amount END),
+               datetime('now')
+        FROM transactions
+        GROUP BY account_id
+    """)
+
+
+# Індекс FTS5 по описах (міграція 8); такий самий є в кожному файлі архіву (archive.py)
+FTS_TABLE_SQL = """
+    CREATE VIRTUAL TABLE transactions_fts USING fts5(
+        description,
+        content = 'transactions',
+        content_rowid = 'transaction_id',
+        tokenize = "unicode61 remove_diacritics 0 separators 'ʼ'",
+        prefix = '2 3'
+    )
+"""
+
+# Тригери індексу FTS5 (міграція 8); DROP TABLE transactions видаляє їх разом з таблицею
+FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts (rowid, description) VALUES (new.transaction_id, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, description)
+        VALUES ('delete', old.transaction_id, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER transactions_fts_update AFTER UPDATE OF description ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, description)
+        VALUES ('delete', old.transaction_id, old.description);
+        INSERT INTO transactions_fts (rowid, description) VALUES (new.transaction_id, new.description);
+    END
+    """,
+]
+
+
+def _add_epoch_timestamps(conn):
+    # ts - секунди епохи для часу з timestamp (records.py). SQLite додає через ALTER TABLE лише віртуальні
+    # згенеровані стовпці, тож таблиця перебудовується, щоб ts зберігався в рядку і не рахувався при читанні.
+    # Індекс (account_id, ts) замінює (account_id, timestamp): за ним ідуть сортування, курсори й фільтри дат.
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()
+    conn.execute("""
+        CREATE TABLE transactions_new (
+            transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id TEXT NOT NULL,
+            type TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            description TEXT,
+            timestamp TEXT NOT NULL,
+            user_username TEXT NOT NULL,
+            import_hash TEXT,
+            ts INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', timestamp) AS INTEGER)) STORED,
+            FOREIGN KEY (account_id) REFERENCES accounts (account_id),
+            FOREIGN KEY (user_username) REFERENCES users (username)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO transactions_new
+            (transaction_id, account_id, type, amount, description, timestamp, user_username, import_hash)
+        SELECT transaction_id, account_id, type, amount, description, timestamp, user_username, import_hash
+        FROM transactions
+    """)
+    conn.execute("DROP TABLE transactions")
+    conn.execute("ALTER TABLE transactions_new RENAME TO transactions")
+    if sequence is not None:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'transactions'", (sequence[0],))
+    conn.execute("CREATE INDEX idx_transactions_account_ts ON transactions (account_id, ts)")
+    conn.execute("CREATE INDEX idx_transactions_user ON transactions (user_username)")
+    conn.execute("""
+        CREATE UNIQUE INDEX idx_transactions_import_hash
+        ON transactions (import_hash) WHERE import_hash IS NOT NULL
+    """)
+    conn.execute("CREATE INDEX idx_transactions_account_id ON transactions (account_id, transaction_id)")
+    conn.execute("CREATE INDEX idx_transactions_account_amount ON transactions (account_id, amount)")
+    # Рядки зберегли transaction_id, тож сам індекс FTS лишається чинним
+    for trigger in FTS_TRIGGERS:
+        conn.execute(trigger)
+
+
+# Версія схеми зберігається в PRAGMA user_version. Кожна міграція - це
+# (версія, опис, кроки), де крок - SQL-рядок або функція, що приймає з'єднання.
+# Нові міграції додаються лише в кінець списку, старі не змінюються.
+MIGRATIONS = [
+    (1, "Початкова схема", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS accounts (
+            account_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            balance REAL NOT NULL,
+            owner_username TEXT NOT NULL,
+            FOREIGN KEY (owner_username) REFERENCES users (username)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_accounts_link (
+            username TEXT NOT NULL,
+            account_id TEXT NOT NULL,
+            PRIMARY KEY (username, account_id),
+            FOREIGN KEY (username) REFERENCES users (username),
+            FOREIGN KEY (account_id) REFERENCES accounts (account_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id TEXT NOT NULL,
+            type TEXT NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT,
+            timestamp TEXT NOT NULL,
+            user_username TEXT NOT NULL,
+            FOREIGN KEY (account_id) REFERENCES accounts (account_id),
+            FOREIGN KEY (user_username) REFERENCES users (username)
+        )
+        """,
+    ]),
+    (2, "Індекс історії рахунку (account_id, timestamp)", [
+        "CREATE INDEX IF NOT EXISTS idx_transactions_account_timestamp ON transactions (account_id, timestamp)",
+    ]),
+    (3, "Індекс учасників рахунку", [
+        "CREATE INDEX IF NOT EXISTS idx_user_accounts_link_account ON user_accounts_link (account_id)",
+    ]),
+    (4, "Індекс транзакцій за автором", [
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (user_username)",
+    ]),
+    (5, "Хеш імпортованих транзакцій для дедуплікації", [
+        "ALTER TABLE transactions ADD COLUMN import_hash TEXT",
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_import_hash
+        ON transactions (import_hash) WHERE import_hash IS NOT NULL
+        """,
+    ]),
+    (6, "Місячні підсумки для звітів", [
+        """
+        CREATE TABLE IF NOT EXISTS monthly_rollups (
+            account_id TEXT NOT NULL,
+            period TEXT NOT NULL,
+            type TEXT NOT NULL,
+            user_username TEXT NOT NULL,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (account_id, period, type, user_username)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO monthly_rollups (account_id, period, type, user_username, total, count)
+        SELECT account_id, substr(timestamp, 1, 7), type, user_username, SUM(amount), COUNT(*)
+        FROM transactions
+        GROUP BY 1, 2, 3, 4
+        """,
+    ]),
+    (7, "Суми в копійках і контрольні точки балансу", [_migrate_to_minor_units]),
+    # Індекс FTS5 з зовнішнім вмістом: текст лежить лише в transactions, тригери оновлюють індекс у тій самій
+    # транзакції, що й запис (зокрема пачки імпорту). remove_diacritics 0 - "й", "ї" не зливаються з "и", "і".
+    # Міграція, що перебудовує transactions, має створити ці тригери заново.
+    (8, "Повнотекстовий пошук по описах транзакцій", [
+        FTS_TABLE_SQL,
+        *FTS_TRIGGERS,
+        "INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')",
+    ]),
+    # Сортування історії за сумою і фільтр діапазону сум (pagination.HistoryFilter) без повного сортування
+    (9, "Індекс сум транзакцій", [
+        "CREATE INDEX IF NOT EXISTS idx_transactions_account_amount ON transactions (account_id, amount)",
+    ]),
+    # Правила регулярних транзакцій (recurring.py); частковий індекс next_due дає найближче правило
+    (10, "Регулярні транзакції", [
+        """
+        CREATE TABLE IF NOT EXISTS recurring_rules (
+            rule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id TEXT NOT NULL,
+            type TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            description TEXT,
+            user_username TEXT NOT NULL,
+            schedule TEXT NOT NULL,
+            starts_at TEXT NOT NULL,
+            next_due TEXT,
+            occurrences INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_until TEXT,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (account_id) REFERENCES accounts (account_id),
+            FOREIGN KEY (user_username) REFERENCES users (username)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_recurring_rules_next_due
+        ON recurring_rules (next_due) WHERE next_due IS NOT NULL
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_recurring_rules_account ON recurring_rules (account_id)",
+    ]),
+    (11, "Час транзакцій у секундах епохи", [_add_epoch_timestamps]),
+    # Реєстр річних файлів архіву (archive.py): межі ts для вибору файлів і остання завершена партія.
+    # У PostgreSQL архіву у файлах немає, тож там цієї міграції немає.
+    (12, "Реєстр архіву транзакцій", [
+        """
+        CREATE TABLE IF NOT EXISTS archive_years (
+            year INTEGER PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            batch INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            min_ts INTEGER NOT NULL,
+            max_ts INTEGER NOT NULL,
+            archived_at TEXT NOT NULL
+        )
+        """,
+    ]),
+]
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version(migrations=MIGRATIONS):
+    return migrations[-1][0] if migrations else 0
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    # Кожна міграція виконується в окремій транзакції разом зі зміною user_version,
+    # тож після збою БД залишається на останній успішно застосованій версії
+    version = get_version(conn)
+    applied = []
+    for target, description, steps in migrations:
+        if target <= version:
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN")
+        try:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {int(target)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = target
+        applied.append((target, description))
+    return applied
+
+
+# PostgreSQL (storage.PostgresStorage): історії SQLite-міграцій тут немає, схема створюється одразу
+# в стані останньої версії MIGRATIONS. Номер версії - у таблиці schema_version.
+POSTGRES_MIGRATIONS = [
+    (7, "Початкова схема PostgreSQL", [
+        """
+        CREATE TABLE users (
+            username TEXT PRIMARY KEY,
+            password TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE accounts (
+            account_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            owner_username TEXT NOT NULL REFERENCES users (username)
+        )
+        """,
+        """
+        CREATE TABLE user_accounts_link (
+            username TEXT NOT NULL REFERENCES users (username),
+            account_id TEXT NOT NULL REFERENCES accounts (account_id),
+            PRIMARY KEY (username, account_id)
+        )
+        """,
+        "CREATE INDEX idx_user_accounts_link_account ON user_accounts_link (account_id)",
+        """
+        CREATE TABLE transactions (
+            transaction_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            account_id TEXT NOT NULL REFERENCES accounts (account_id),
+            type TEXT NOT NULL,
+            amount BIGINT NOT NULL,
+            description TEXT,
+            timestamp TEXT NOT NULL,
+            user_username TEXT NOT NULL REFERENCES users (username),
+            import_hash TEXT
+        )
+        """,
+        "CREATE INDEX idx_transactions_account_timestamp ON transactions (account_id, timestamp)",
+        "CREATE INDEX idx_transactions_user ON transactions (user_username)",
+        "CREATE UNIQUE INDEX idx_transactions_import_hash ON transactions (import_hash) WHERE import_hash IS NOT NULL",
+        "CREATE INDEX idx_transactions_account_id ON transactions (account_id, transaction_id)",
+        """
+        CREATE TABLE monthly_rollups (
+            account_id TEXT NOT NULL,
+            period TEXT NOT NULL,
+            type TEXT NOT NULL,
+            user_username TEXT NOT NULL,
+            total BIGINT NOT NULL,
+            count BIGINT NOT NULL,
+            PRIMARY KEY (account_id, period, type, user_username)
+        )
+        """,
+        """
+        CREATE TABLE balance_checkpoints (
+            account_id TEXT NOT NULL,
+            up_to_transaction_id BIGINT NOT NULL,
+            balance BIGINT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (account_id, up_to_transaction_id)
+        )
+        """,
+        # strftime('%s', timestamp) з SQLite, яким repository рахує секунди епохи для аналітики
+        """
+        CREATE FUNCTION strftime(format TEXT, value TEXT) RETURNS TEXT AS $$
+            SELECT CASE format WHEN '%s' THEN CAST(EXTRACT(EPOCH FROM CAST(value AS TIMESTAMP)) AS BIGINT)::TEXT END
+        $$ LANGUAGE SQL IMMUTABLE
+        """,
+    ]),
+    (8, "Повнотекстовий пошук по описах транзакцій", [
+        """
+        CREATE INDEX idx_transactions_description_fts
+        ON transactions USING GIN (to_tsvector('simple', COALESCE(description, '')))
+        """,
+    ]),
+    (9, "Індекс сум транзакцій", [
+        "CREATE INDEX idx_transactions_account_amount ON transactions (account_id, amount, transaction_id)",
+    ]),
+    (10, "Регулярні транзакції", [
+        """
+        CREATE TABLE recurring_rules (
+            rule_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            account_id TEXT NOT NULL REFERENCES accounts (account_id),
+            type TEXT NOT NULL,
+            amount BIGINT NOT NULL,
+            description TEXT,
+            user_username TEXT NOT NULL REFERENCES users (username),
+            schedule TEXT NOT NULL,
+            starts_at TEXT NOT NULL,
+            next_due TEXT,
+            occurrences BIGINT NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_until TEXT,
+            created_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX idx_recurring_rules_next_due ON recurring_rules (next_due) WHERE next_due IS NOT NULL",
+        "CREATE INDEX idx_recurring_rules_account ON recurring_rules (account_id)",
+    ]),
+    # strftime тут - IMMUTABLE-функція з міграції 7, тож стовпець можна зробити згенерованим.
+    # ts - місцевий час timestamp без поясу в секундах, а не мітка UTC (див. records.py)
+    (11, "Час транзакцій у секундах епохи", [
+        "ALTER TABLE transactions ADD COLUMN ts BIGINT GENERATED ALWAYS AS (CAST(strftime('%s', timestamp) AS BIGINT)) "
+        "STORED",
+        "DROP INDEX idx_transactions_account_timestamp",
+        "CREATE INDEX idx_transactions_account_ts ON transactions (account_id, ts, transaction_id)",
+    ]),
+]
+
+
+def get_postgres_version(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate_postgres(conn, migrations=POSTGRES_MIGRATIONS):
+    # DDL у PostgreSQL транзакційний: міграція і запис її версії комітяться разом.
+    # Блокування не дає двом воркерам, що стартують одночасно, застосувати міграцію двічі.
+    conn.execute("SELECT pg_advisory_xact_lock(?)", (7_120_251,))
+    version = get_postgres_version(conn)
+    applied = []
+    for target, description, steps in migrations:
+        if target <= version:
+            continue
+        for step in steps:
+            if callable(step):
+                step(conn)
+            else:
+                conn.execute(step)
+        conn.execute("INSERT INTO schema_version (version) VALUES (?)", (target,))
+        version = target
+        applied.append((target, description))
+    return applied
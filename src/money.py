@@ -0,0 +1,41 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+# Суми зберігаються цілими копійками: додавання й віднімання точні, без похибки float.
+# Перетворення в гривні - лише на межі з користувачем (введення, показ, експорт).
+
+MINOR_PER_UNIT = 100
+# Найбільша сума однієї транзакції (гривень, не включно): копійки лишаються в INTEGER SQLite (int64)
+# навіть у сумі мільйонів таких транзакцій
+MAX_UNITS = 10 ** 13
+_CENT = Decimal("0.01")
+
+
+def to_minor(value) -> int:
+    # "150.50", 150.5 або Decimal -> 15050. Через str, щоб 0.1 + 0.2 не давало 30.000000000000004 копійки.
+    try:
+        amount = Decimal(str(value).strip().replace(",", "."))
+    except InvalidOperation:
+        raise ValueError(f"Неправильна сума: {value}") from None
+    # Перевірка до quantize: для величезних значень (1e30) він сам кидає InvalidOperation
+    if not amount.is_finite() or abs(amount) >= MAX_UNITS:
+        raise ValueError(f"Неправильна сума: {value}")
+    try:
+        return int(amount.quantize(_CENT, rounding=ROUND_HALF_UP) * MINOR_PER_UNIT)
+    except InvalidOperation:
+        raise ValueError(f"Неправильна сума: {value}") from None
+
+
+def from_minor(minor: int) -> float:
+    return minor / MINOR_PER_UNIT
+
+
+def to_decimal(minor: int) -> Decimal:
+    # 15050 -> Decimal("150.50") для експорту без втрати точності
+    return Decimal(int(minor)).scaleb(-2)
+
+
+def format_minor(minor: int) -> str:
+    # 15050 -> "150.50", -5 -> "-0.05"
+    sign = "-" if minor < 0 else ""
+    units, cents = divmod(abs(int(minor)), MINOR_PER_UNIT)
+    return f"{sign}{units}.{cents:02d}"
@@ -0,0 +1,295 @@
+import os
+from datetime import timedelta
+
+import archive
+import records
+
+# Розмір сторінки історії та кількість сторінок, які одночасно тримаємо в ListView
+HISTORY_PAGE_SIZE = int(os.environ.get("BUDGET_HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGES = int(os.environ.get("BUDGET_HISTORY_MAX_PAGES", "4"))
+
+# Keyset-пагінація по (ts, transaction_id): індекс (account_id, ts)
+# містить rowid, тож обидва напрямки читаються з індексу без сортування і без OFFSET.
+# Вибираються лише стовпці records.TransactionRow. Сторінка спершу читається з робочої БД; роки архіву
+# (archive.py) дочитуються, лише якщо їхні рядки можуть потрапити на цю сторінку.
+_OLDER_SQL = f"""
+    SELECT {records.select_list()} FROM transactions
+    WHERE account_id = ? AND (ts, transaction_id) < (?, ?)
+    ORDER BY ts DESC, transaction_id DESC
+    LIMIT ?
+"""
+_FIRST_SQL = f"""
+    SELECT {records.select_list()} FROM transactions
+    WHERE account_id = ?
+    ORDER BY ts DESC, transaction_id DESC
+    LIMIT ?
+"""
+_NEWER_SQL = f"""
+    SELECT {records.select_list()} FROM transactions
+    WHERE account_id = ? AND (ts, transaction_id) > (?, ?)
+    ORDER BY ts ASC, transaction_id ASC
+    LIMIT ?
+"""
+
+
+# Стовпці, за якими можна сортувати; обидва мають індекс (account_id, стовпець) з rowid
+SORT_COLUMNS = {"date": "ts", "amount": "amount"}
+TRANSACTION_TYPES = ("income", "expense")
+
+
+class HistoryFilter:
+    # Фільтри й сортування списку транзакцій. Перетворюються на параметризовані умови SQL;
+    # діапазони дат і сум звужують той самий індекс, яким іде сортування. Дати - date, date_to включно;
+    # суми - копійки без знака.
+    def __init__(self, date_from=None, date_to=None, trans_type=None, member=None, min_amount=None,
+                 max_amount=None, sort="date", descending=True):
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Невідоме сортування: {sort}")
+        if trans_type is not None and trans_type not in TRANSACTION_TYPES:
+            raise ValueError(f"Невідомий тип транзакції: {trans_type}")
+        self.date_from = date_from
+        self.date_to = date_to
+        self.trans_type = trans_type
+        self.member = member
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.sort = sort
+        self.descending = descending
+
+    @property
+    def sort_column(self):
+        return SORT_COLUMNS[self.sort]
+
+    @property
+    def is_default(self):
+        return self.keeps_time_order and not self.conditions()[0]
+
+    @property
+    def keeps_time_order(self):
+        # Від новіших до старіших, як у вікні без фільтрів: нову транзакцію можна додати на початок
+        return self.sort == "date" and self.descending
+
+    def cursor(self, row):
+        return (row[self.sort_column], row["transaction_id"])
+
+    def ts_range(self):
+        # Межі ts фільтра дат включно; None - без межі
+        return (None if self.date_from is None else records.date_to_ts(self.date_from),
+                None if self.date_to is None else records.date_to_ts(self.date_to + timedelta(days=1)) - 1)
+
+    def conditions(self):
+        # (умови без account_id і курсора, їхні параметри)
+        conditions, params = [], []
+        if self.date_from is not None:
+            conditions.append("ts >= ?")
+            params.append(records.date_to_ts(self.date_from))
+        if self.date_to is not None:
+            conditions.append("ts < ?")
+            params.append(records.date_to_ts(self.date_to + timedelta(days=1)))
+        if self.trans_type is not None:
+            conditions.append("type = ?")
+            params.append(self.trans_type)
+        if self.member:
+            conditions.append("user_username = ?")
+            params.append(self.member)
+        if self.min_amount is not None:
+            conditions.append("amount >= ?")
+            params.append(self.min_amount)
+        if self.max_amount is not None:
+            conditions.append("amount <= ?")
+            params.append(self.max_amount)
+        return conditions, params
+
+    def matches(self, row):
+        # Та сама перевірка для одного рядка (точкові зміни вікна після запису)
+        ts = row["ts"]
+        return ((self.date_from is None or ts >= records.date_to_ts(self.date_from))
+                and (self.date_to is None or ts < records.date_to_ts(self.date_to + timedelta(days=1)))
+                and (self.trans_type is None or row["type"] == self.trans_type)
+                and (not self.member or row["user_username"] == self.member)
+                and (self.min_amount is None or row["amount"] >= self.min_amount)
+                and (self.max_amount is None or row["amount"] <= self.max_amount))
+
+
+def _page_query(account_ids, history_filter, after, forward, limit, table="transactions"):
+    # forward - у напрямку сортування фільтра (до старіших при date DESC), інакше - назад.
+    # Кожен рахунок читається окремим підзапитом з LIMIT по своєму індексу, тож для кількох рахунків
+    # сортується не більше len(account_ids) * limit рядків, а не вся їхня історія.
+    column = history_filter.sort_column
+    descending = history_filter.descending == forward
+    direction = "DESC" if descending else "ASC"
+    conditions, condition_params = history_filter.conditions()
+    where = ["account_id = ?"] + conditions
+    if after is not None:
+        where.append(f"({column}, transaction_id) {'<' if descending else '>'} (?, ?)")
+    order_by = f"ORDER BY {column} {direction}, transaction_id {direction}"
+    sql = f"SELECT {records.select_list()} FROM {table} WHERE {' AND '.join(where)} {order_by} LIMIT ?"
+    params = [*condition_params, *(after or ()), limit]
+    if len(account_ids) == 1:
+        return sql, [account_ids[0], *params]
+    union = " UNION ALL ".join(f"SELECT * FROM ({sql}) AS page{i}" for i in range(len(account_ids)))
+    union_params = [value for account_id in account_ids for value in (account_id, *params)]
+    return f"{union} {order_by} LIMIT ?", union_params + [limit]
+
+
+def _account_ids(account_id):
+    # Один рахунок (рядок) або кілька (список) - наприклад, усі рахунки користувача на головній
+    return [account_id] if isinstance(account_id, str) else list(account_id)
+
+
+def _is_plain(account_id, history_filter):
+    return isinstance(account_id, str) and (history_filter is None or history_filter.is_default)
+
+
+def row_cursor(row):
+    return (row["ts"], row["transaction_id"])
+
+
+def _row_ts(row):
+    return row["ts"]
+
+
+def _with_archive(conn, rows, account_ids, history_filter, after, forward, limit):
+    # Доповнює сторінку з робочої БД рядками років архіву, що перетинають діапазон сторінки
+    descending = history_filter.descending == forward
+    lo, hi = history_filter.ts_range()
+    by_time = history_filter.sort == "date"
+    if by_time and after is not None:
+        if descending:
+            hi = after[0] if hi is None else min(hi, after[0])
+        else:
+            lo = after[0] if lo is None else max(lo, after[0])
+
+    def fetch(source):
+        return records.fetch_all(conn.execute(*_page_query(account_ids, history_filter, after, forward, limit,
+                                                           source.table)))
+
+    return archive.fill(conn, rows, fetch, limit, history_filter.cursor, descending, lo, hi,
+                        _row_ts if by_time else None)
+
+
+def fetch_older(conn, account_id, page_size=HISTORY_PAGE_SIZE, after=None, history_filter=None):
+    # Повертає (рядки в порядку сортування фільтра - за замовчуванням від новіших, чи є ще далі)
+    if _is_plain(account_id, history_filter):
+        if after is None:
+            cur = conn.execute(_FIRST_SQL, (account_id, page_size + 1))
+        else:
+            cur = conn.execute(_OLDER_SQL, (account_id, after[0], after[1], page_size + 1))
+    else:
+        cur = conn.execute(*_page_query(_account_ids(account_id), history_filter or HistoryFilter(), after, True,
+                                        page_size + 1))
+    rows = _with_archive(conn, records.fetch_all(cur), _account_ids(account_id), history_filter or HistoryFilter(),
+                         after, True, page_size + 1)
+    return rows[:page_size], len(rows) > page_size
+
+
+def fetch_newer(conn, account_id, page_size=HISTORY_PAGE_SIZE, before=None, history_filter=None):
+    # Повертає сторінку перед `before` у тому ж порядку (від новіших до старіших без фільтра)
+    if _is_plain(account_id, history_filter):
+        cur = conn.execute(_NEWER_SQL, (account_id, before[0], before[1], page_size + 1))
+    else:
+        cur = conn.execute(*_page_query(_account_ids(account_id), history_filter or HistoryFilter(), before, False,
+                                        page_size + 1))
+    rows = _with_archive(conn, records.fetch_all(cur), _account_ids(account_id), history_filter or HistoryFilter(),
+                         before, False, page_size + 1)
+    has_more = len(rows) > page_size
+    return list(reversed(rows[:page_size])), has_more
+
+
+class HistoryWindow:
+    # Вікно з кількох сторінок історії. Коли сторінок стає більше за max_pages,
+    # найдальша від напрямку прокрутки відкидається, тож пам'ять не росте з довжиною історії.
+    def __init__(self, connect, account_id, page_size=HISTORY_PAGE_SIZE, max_pages=HISTORY_MAX_PAGES,
+                 history_filter=None):
+        if page_size < 1 or max_pages < 1:
+            raise ValueError("Розмір сторінки та вікна має бути не менше 1.")
+        self.connect = connect
+        self.account_id = account_id
+        self.filter = history_filter or HistoryFilter()
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.pages = []
+        self.has_older = False
+        self.has_newer = False
+        self.stale = False
+
+    def rows(self):
+        return [row for page in self.pages for row in page]
+
+    def load_first(self):
+        with self.connect() as conn:
+            rows, self.has_older = fetch_older(conn, self.account_id, self.page_size, history_filter=self.filter)
+        self.pages = [rows] if rows else []
+        self.has_newer = False
+        self.stale = False
+        return rows
+
+    def load_older(self):
+        if not self.pages:
+            return self.load_first()
+        if not self.has_older:
+            return []
+        with self.connect() as conn:
+            rows, self.has_older = fetch_older(conn, self.account_id, self.page_size,
+                                               after=self.filter.cursor(self.pages[-1][-1]),
+                                               history_filter=self.filter)
+        if rows:
+            self.pages.append(rows)
+            if len(self.pages) > self.max_pages:
+                self.pages.pop(0)
+                self.has_newer = True
+        return rows
+
+    def load_newer(self):
+        if not self.pages or not self.has_newer:
+            return []
+        with self.connect() as conn:
+            rows, self.has_newer = fetch_newer(conn, self.account_id, self.page_size,
+                                               before=self.filter.cursor(self.pages[0][0]),
+                                               history_filter=self.filter)
+        if rows:
+            self.pages.insert(0, rows)
+            if len(self.pages) > self.max_pages:
+                self.pages.pop()
+                self.has_older = True
+        return rows
+
+    # Точкові зміни вікна після запису, щоб не перечитувати сторінки з БД. За іншого сортування
+    # місце рядка знає лише запит: вікно лише позначається застарілим (stale), а першу сторінку
+    # перечитує власник (load_first) поза потоком інтерфейсу.
+    def prepend(self, row):
+        if not self.filter.keeps_time_order:
+            self.stale = True
+            return False
+        # Нова транзакція найновіша, тож вона видима лише коли вікно показує початок історії
+        if self.has_newer or not self.filter.matches(row):
+            return False
+        if self.pages:
+            self.pages[0].insert(0, row)
+        else:
+            self.pages = [[row]]
+        return True
+
+    def replace(self, row):
+        if not self.filter.keeps_time_order:
+            self.stale = True
+            return False
+        if not self.filter.matches(row):
+            # Після редагування транзакція більше не підходить під фільтр
+            return self.remove(row["transaction_id"])
+        for page_rows in self.pages:
+            for i, existing in enumerate(page_rows):
+                if existing["transaction_id"] == row["transaction_id"]:
+                    page_rows[i] = row
+                    return True
+        return False
+
+    def remove(self, transaction_id):
+        for page_index, page_rows in enumerate(self.pages):
+            for i, existing in enumerate(page_rows):
+                if existing["transaction_id"] == transaction_id:
+                    del page_rows[i]
+                    if not page_rows:
+                        del self.pages[page_index]
+                    return True
+        return False
@@ -0,0 +1,83 @@
+import sqlite3
+import sys
+from datetime import date, timedelta
+from functools import lru_cache
+
+# Компактні рядки транзакцій для списків (історія рахунку, головна сторінка, пошук). Запити вибирають
+# лише показувані стовпці, а рядок - кортеж без словника атрибутів з доступом за назвою, як у sqlite3.Row.
+# Час - стовпець ts (міграція 11): strftime('%s', timestamp) над timestamp, який зберігається місцевим часом
+# без поясу (datetime.now(); імпорт переводить час зі зсувом у місцевий). Тобто ts - це місцевий час, прочитаний
+# так, ніби він в UTC, а не справжня мітка UTC: межі дат (date_to_ts) рахуються так само, а format_timestamp
+# повертає ту саму місцеву дату й час без перерахунку поясу. Показ і порівняння не розбирають ISO-рядок.
+
+SECONDS_PER_DAY = 86400
+# Менше за будь-який ts: початковий курсор вивантаження від найстаріших
+MIN_TS = -(2 ** 63)
+_EPOCH = date(1970, 1, 1)
+
+TRANSACTION_COLUMNS = ("transaction_id", "account_id", "type", "amount", "description", "ts", "user_username")
+
+
+def select_list(alias="") -> str:
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(prefix + column for column in TRANSACTION_COLUMNS)
+
+
+class TransactionRow(tuple):
+    __slots__ = ()
+    columns = TRANSACTION_COLUMNS
+    _index = {column: i for i, column in enumerate(columns)}
+    # Значення, однакові в багатьох рядках (рахунок, тип, автор), зберігаються одним об'єктом на всі рядки
+    _shared = (1, 2, 6)
+
+    @classmethod
+    def from_values(cls, values):
+        values = list(values)
+        for i in cls._shared:
+            values[i] = sys.intern(values[i])
+        return cls(values)
+
+    def __getitem__(self, key):
+        if key.__class__ is str:
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return self.columns
+
+
+class AccountTransactionRow(TransactionRow):
+    # Те саме з назвою рахунку (головна сторінка, пошук)
+    __slots__ = ()
+    columns = TRANSACTION_COLUMNS + ("account_name",)
+    _index = {column: i for i, column in enumerate(columns)}
+    _shared = (1, 2, 6, 7)
+
+
+def fetch_all(cursor, record=TransactionRow) -> list:
+    # Рядки виконаного курсора як record. sqlite3 і psycopg застосовують row_factory під час вибірки,
+    # тож запит іде звичайним conn.execute - з обмеженням часу і вимірюванням
+    if isinstance(cursor, sqlite3.Cursor):
+        cursor.row_factory = lambda _, row: record.from_values(row)
+    else:
+        cursor.row_factory = lambda _: record.from_values
+    return cursor.fetchall()
+
+
+def date_to_ts(value: date) -> int:
+    return (value - _EPOCH).days * SECONDS_PER_DAY
+
+
+def ts_to_date(ts: int) -> date:
+    return _EPOCH + timedelta(days=ts // SECONDS_PER_DAY)
+
+
+@lru_cache(maxsize=4096)
+def _format_day(day: int) -> str:
+    return (_EPOCH + timedelta(days=day)).isoformat()
+
+
+def format_timestamp(ts: int) -> str:
+    # "РРРР-ММ-ДД ГГ:ХХ"; рядок дати кешується по днях, година й хвилини - арифметикою
+    day, seconds = divmod(ts, SECONDS_PER_DAY)
+    return f"{_format_day(day)} {seconds // 3600:02d}:{seconds // 60 % 60:02d}"
@@ -0,0 +1,380 @@
+import argparse
+import calendar
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import db
+import metrics
+import repository
+import storage
+
+# Регулярні транзакції (оренда, зарплата, підписки). Правило зберігає рахунок, тип, суму, опис
+# і розклад у підмножині RRULE; next_due - час наступного повторення, індекс по ньому дає
+# найближче правило одним читанням, тож планувальник не переглядає всі правила на кожному кроці.
+# Кожне повторення пишеться з import_hash "recurring:<правило>:<час>" (унікальний індекс),
+# а next_due зсувається в тій самій транзакції, тому перезапуски й кілька воркерів не створюють дублікатів.
+
+POLL_INTERVAL = float(os.environ.get("BUDGET_RECURRING_POLL", "60"))
+BATCH_SIZE = int(os.environ.get("BUDGET_RECURRING_BATCH", "100"))
+# Скільки секунд правило належить воркеру, що його взяв; після падіння воркера правило візьме інший
+LEASE_SECONDS = float(os.environ.get("BUDGET_RECURRING_LEASE", "300"))
+# Скільки пропущених повторень одного правила надолужується за один прохід (після довгого простою)
+MAX_CATCH_UP = int(os.environ.get("BUDGET_RECURRING_CATCH_UP", "366"))
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+FREQUENCY_NAMES = {"DAILY": "щодня", "WEEKLY": "щотижня", "MONTHLY": "щомісяця", "YEARLY": "щороку"}
+WEEKDAY_NAMES = ("пн", "вт", "ср", "чт", "пт", "сб", "нд")
+
+log = logging.getLogger("budget.recurring")
+
+CLAIM_SQL = """
+    UPDATE recurring_rules SET lease_owner = ?, lease_until = ?
+    WHERE rule_id IN (
+        SELECT rule_id FROM recurring_rules
+        WHERE next_due IS NOT NULL AND next_due <= ? AND (lease_until IS NULL OR lease_until < ?)
+        ORDER BY next_due
+        LIMIT ?
+    )
+    RETURNING rule_id
+"""
+ADVANCE_SQL = """
+    UPDATE recurring_rules SET next_due = ?, occurrences = ?, lease_owner = NULL, lease_until = NULL
+    WHERE rule_id = ?
+"""
+
+
+# Розклад
+
+def parse_rule(text: str) -> dict:
+    # FREQ=DAILY|WEEKLY|MONTHLY|YEARLY; INTERVAL=n; BYDAY=MO,WE (щотижня); BYMONTHDAY=n або -1 (останній день);
+    # COUNT=n; UNTIL=РРРРММДД[THHMMSS]. ValueError з текстом для користувача, якщо правило некоректне.
+    parts = {}
+    for item in (text or "").strip().removeprefix("RRULE:").split(";"):
+        if not item:
+            continue
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Некоректна частина розкладу: {item}")
+        parts[key.strip().upper()] = value.strip().upper()
+    unknown = set(parts) - {"FREQ", "INTERVAL", "BYDAY", "BYMONTHDAY", "COUNT", "UNTIL"}
+    if unknown:
+        raise ValueError(f"Непідтримувані частини розкладу: {', '.join(sorted(unknown))}")
+    if parts.get("FREQ") not in FREQUENCIES:
+        raise ValueError("Розклад має містити FREQ=DAILY, WEEKLY, MONTHLY або YEARLY.")
+    rule = {"freq": parts["FREQ"], "interval": 1, "byday": None, "bymonthday": None, "count": None, "until": None}
+    try:
+        rule["interval"] = int(parts.get("INTERVAL", "1"))
+        if "COUNT" in parts:
+            rule["count"] = int(parts["COUNT"])
+        if "BYMONTHDAY" in parts:
+            rule["bymonthday"] = int(parts["BYMONTHDAY"])
+        if "UNTIL" in parts:
+            until = parts["UNTIL"].rstrip("Z")
+            rule["until"] = datetime.strptime(until, "%Y%m%dT%H%M%S" if "T" in until else "%Y%m%d")
+            if "T" not in until:
+                rule["until"] += timedelta(days=1, microseconds=-1)
+    except ValueError:
+        raise ValueError("Некоректне число або дата в розкладі.") from None
+    if "BYDAY" in parts:
+        days = parts["BYDAY"].split(",")
+        if rule["freq"] != "WEEKLY" or not set(days) <= set(WEEKDAYS):
+            raise ValueError("BYDAY підтримується лише для FREQ=WEEKLY (MO,TU,WE,TH,FR,SA,SU).")
+        rule["byday"] = tuple(sorted(WEEKDAYS.index(day) for day in set(days)))
+    if rule["bymonthday"] is not None and (rule["freq"] != "MONTHLY" or not 1 <= abs(rule["bymonthday"]) <= 31):
+        raise ValueError("BYMONTHDAY (1..31 або -1..-31) підтримується лише для FREQ=MONTHLY.")
+    if rule["interval"] < 1 or (rule["count"] is not None and rule["count"] < 1):
+        raise ValueError("INTERVAL і COUNT мають бути додатними.")
+    return rule
+
+
+def format_rule(rule: dict) -> str:
+    # Канонічний текст, який зберігається в recurring_rules.schedule
+    parts = [f"FREQ={rule['freq']}"]
+    if rule["interval"] != 1:
+        parts.append(f"INTERVAL={rule['interval']}")
+    if rule["byday"]:
+        parts.append("BYDAY=" + ",".join(WEEKDAYS[day] for day in rule["byday"]))
+    if rule["bymonthday"] is not None:
+        parts.append(f"BYMONTHDAY={rule['bymonthday']}")
+    if rule["count"] is not None:
+        parts.append(f"COUNT={rule['count']}")
+    if rule["until"] is not None:
+        parts.append("UNTIL=" + rule["until"].strftime("%Y%m%dT%H%M%S"))
+    return ";".join(parts)
+
+
+def describe_rule(schedule: str) -> str:
+    rule = parse_rule(schedule)
+    text = FREQUENCY_NAMES[rule["freq"]]
+    if rule["interval"] != 1:
+        text += f" (інтервал {rule['interval']})"
+    if rule["byday"]:
+        text += " (" + ", ".join(WEEKDAY_NAMES[day] for day in rule["byday"]) + ")"
+    if rule["bymonthday"] is not None:
+        text += " (останнього дня)" if rule["bymonthday"] == -1 else f" ({rule['bymonthday']}-го)"
+    return text
+
+
+def _add_months(start: datetime, months: int, day: int) -> datetime:
+    # День місяця обрізається до його довжини: 31 -> 30 квітня, 28/29 лютого; від'ємний - від кінця
+    year, month = divmod(start.month - 1 + months, 12)
+    year += start.year
+    last = calendar.monthrange(year, month + 1)[1]
+    day = last + day + 1 if day < 0 else day
+    return start.replace(year=year, month=month + 1, day=min(max(day, 1), last))
+
+
+def next_after(rule: dict, start: datetime, after: datetime):
+    # Найближче повторення, пізніше за after (і не раніше за start), або None після UNTIL. COUNT рахує викликач.
+    freq, interval = rule["freq"], rule["interval"]
+    if freq == "WEEKLY" and rule["byday"]:
+        week_start = start.date() - timedelta(days=start.weekday())
+        day = max(start, after).date()
+        for _ in range(7 * interval + 7):
+            candidate = datetime.combine(day, start.time())
+            if (candidate >= start and candidate > after and day.weekday() in rule["byday"]
+                    and (day - week_start).days // 7 % interval == 0):
+                break
+            day += timedelta(days=1)
+    elif freq in ("DAILY", "WEEKLY"):
+        step = timedelta(days=interval * (7 if freq == "WEEKLY" else 1))
+        candidate = start if after < start else start + step * ((after - start) // step + 1)
+    else:
+        months = interval * (12 if freq == "YEARLY" else 1)
+        day = rule["bymonthday"] or start.day
+        k = max(0, ((after.year - start.year) * 12 + after.month - start.month) // months)
+        candidate = _add_months(start, k * months, day)
+        while candidate < start or candidate <= after:
+            k += 1
+            candidate = _add_months(start, k * months, day)
+    if rule["until"] is not None and candidate > rule["until"]:
+        return None
+    return candidate
+
+
+def first_occurrence(rule: dict, start: datetime):
+    return next_after(rule, start, start - timedelta(microseconds=1))
+
+
+def occurrence_key(rule_id: int, due: datetime) -> str:
+    return f"recurring:{rule_id}:{due.isoformat()}"
+
+
+def _ts(value: datetime) -> str:
+    return value.isoformat(timespec="seconds")
+
+
+# Правила
+
+def create_rule(conn: sqlite3.Connection, account_id: str, trans_type: str, amount: int, description: str,
+                username: str, schedule: str, starts_at: datetime = None, first_done: bool = False) -> int:
+    # Повертає rule_id. starts_at - початок розкладу; first_done - повторення в starts_at уже записане
+    # (UI пише першу транзакцію одразу), тож правило починає з наступного
+    rule = parse_rule(schedule)
+    starts_at = (starts_at or datetime.now()).replace(microsecond=0)
+    due = first_occurrence(rule, starts_at)
+    occurrences = 0
+    if first_done and due == starts_at:
+        occurrences = 1
+        due = next_after(rule, starts_at, due) if rule["count"] is None or rule["count"] > 1 else None
+    return conn.execute("""
+        INSERT INTO recurring_rules (account_id, type, amount, description, user_username, schedule, starts_at,
+                                     next_due, occurrences, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        RETURNING rule_id
+    """, (account_id, trans_type, amount, description, username, format_rule(rule), _ts(starts_at),
+          _ts(due) if due else None, occurrences, datetime.now().isoformat())).fetchone()[0]
+
+
+def add_recurring_transaction(conn: sqlite3.Connection, account_id: str, trans_type: str, amount: int,
+                              description: str, username: str, schedule: str) -> tuple:
+    # Перша транзакція пишеться зараз, як звичайна; правило повторює її за розкладом.
+    # Повертає (рядок транзакції, баланс) як repository.add_transaction.
+    now = datetime.now().replace(microsecond=0)
+    result = repository.add_transaction(conn, account_id, trans_type, amount, description, username,
+                                        now.isoformat())
+    create_rule(conn, account_id, trans_type, amount, description, username, schedule, now, first_done=True)
+    return result
+
+
+def get_account_rules(conn: sqlite3.Connection, account_id: str) -> list:
+    return conn.execute("""
+        SELECT * FROM recurring_rules WHERE account_id = ? AND next_due IS NOT NULL ORDER BY next_due
+    """, (account_id,)).fetchall()
+
+
+def delete_rule(conn: sqlite3.Connection, rule_id: int):
+    conn.execute("DELETE FROM recurring_rules WHERE rule_id = ?", (rule_id,))
+
+
+def next_due_time(conn: sqlite3.Connection):
+    # Одне читання з індексу next_due
+    row = conn.execute("SELECT MIN(next_due) FROM recurring_rules WHERE next_due IS NOT NULL").fetchone()
+    return datetime.fromisoformat(row[0]) if row[0] else None
+
+
+# Матеріалізація
+
+def claim_due(conn: sqlite3.Connection, owner: str, now: datetime, lease: float = LEASE_SECONDS,
+              limit: int = BATCH_SIZE) -> list:
+    # Позначає до limit правил, що настали і не зайняті іншим воркером; повертає їхні rule_id
+    rows = conn.execute(CLAIM_SQL, (owner, _ts(now + timedelta(seconds=lease)), _ts(now), _ts(now), limit)).fetchall()
+    return [row[0] for row in rows]
+
+
+def materialize(conn: sqlite3.Connection, owner: str, rule_ids: list, now: datetime) -> dict:
+    # Усі повторення взятих правил - один executemany, підсумки й контрольна точка - раз на рахунок.
+    # Правило, яке тим часом забрав інший воркер (прострочена оренда), пропускається.
+    # Повертає ({account_id: зміна балансу в копійках}, кількість нових транзакцій).
+    rules = conn.execute(f"""
+        SELECT * FROM recurring_rules
+        WHERE rule_id IN ({",".join("?" * len(rule_ids))}) AND lease_owner = ?
+    """, (*rule_ids, owner)).fetchall()
+    pending = []
+    advanced = []
+    for rule in rules:
+        parsed = parse_rule(rule["schedule"])
+        start = datetime.fromisoformat(rule["starts_at"])
+        due = datetime.fromisoformat(rule["next_due"])
+        occurrences = rule["occurrences"]
+        caught_up = 0
+        while due is not None and due <= now and caught_up < MAX_CATCH_UP:
+            pending.append((rule["account_id"], rule["type"], rule["amount"], rule["description"], due.isoformat(),
+                            rule["user_username"], occurrence_key(rule["rule_id"], due)))
+            occurrences += 1
+            caught_up += 1
+            if parsed["count"] is not None and occurrences >= parsed["count"]:
+                due = None
+            else:
+                due = next_after(parsed, start, due)
+        advanced.append((_ts(due) if due else None, occurrences, rule["rule_id"]))
+    existing = repository.existing_import_hashes(conn, [row[6] for row in pending])
+    new = [row for row in pending if row[6] not in existing]
+    deltas = repository.add_transactions_many(conn, new) if new else {}
+    conn.executemany(ADVANCE_SQL, advanced)
+    return deltas, len(new)
+
+
+def run_due(store, owner: str, now: datetime = None, batch: int = BATCH_SIZE, lease: float = LEASE_SECONDS,
+            on_materialized=None) -> dict:
+    # Бере правила пачками по batch, доки є ті, що настали. on_materialized(deltas) - після кожної пачки.
+    now = now or datetime.now()
+    report = {"rules": 0, "transactions": 0, "accounts": {}}
+    while True:
+        rule_ids = store.run_write(claim_due, owner, now, lease, batch)
+        if not rule_ids:
+            break
+        deltas, inserted = store.run_write(materialize, owner, rule_ids, now)
+        report["rules"] += len(rule_ids)
+        report["transactions"] += inserted
+        for account_id, delta in deltas.items():
+            report["accounts"][account_id] = report["accounts"].get(account_id, 0) + delta
+        if deltas and on_materialized is not None:
+            on_materialized(deltas)
+        if len(rule_ids) < batch:
+            break
+    return report
+
+
+class RecurringScheduler:
+    # Фоновий потік: спить до найближчого next_due (не довше poll, щоб помітити правила інших воркерів),
+    # notify() будить його одразу після створення правила в цьому процесі
+    def __init__(self, store, poll=POLL_INTERVAL, on_materialized=None):
+        self.store = store
+        self.poll = poll
+        self.on_materialized = on_materialized
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.last_report = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="recurring-scheduler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def notify(self):
+        self._wake.set()
+
+    def wait_time(self, next_due, now):
+        # Правило, що вже настало, але лишилося після проходу, тримає інший воркер - чекаємо poll
+        if next_due is None or next_due <= now:
+            return self.poll
+        return min(self.poll, (next_due - now).total_seconds())
+
+    def _run(self):
+        while not self._stop.is_set():
+            next_due = None
+            try:
+                self.last_report = run_due(self.store, self.owner, on_materialized=self.on_materialized)
+                if self.last_report["rules"]:
+                    metrics.log_event(log, logging.INFO, "recurring_materialized", rules=self.last_report["rules"],
+                                      transactions=self.last_report["transactions"],
+                                      accounts=len(self.last_report["accounts"]))
+                with self.store.connect() as conn:
+                    next_due = next_due_time(conn)
+            except (sqlite3.Error, db.PoolClosedError, db.PoolTimeoutError, db.QueryTimeoutError,
+                    db.WriteQueueFullError) + self.store.errors as exc:
+                metrics.log_event(log, logging.ERROR, "recurring_failed", error=str(exc))
+            self._wake.wait(self.wait_time(next_due, datetime.now()))
+            self._wake.clear()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler(store, poll=POLL_INTERVAL, on_materialized=None):
+    # Один планувальник на процес; poll <= 0 - не запускати (повторення пише лише CLI)
+    global _scheduler
+    if poll <= 0:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RecurringScheduler(store, poll, on_materialized).start()
+        return _scheduler
+
+
+def notify_scheduler():
+    if _scheduler is not None:
+        _scheduler.notify()
+
+
+def stop_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.stop(timeout=5)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Запис регулярних транзакцій, час яких настав")
+    parser.add_argument("--db", default="budget.db", help="шлях до SQLite або postgresql://...")
+    args = parser.parse_args(argv)
+
+    store = storage.from_url(args.db)
+    try:
+        store.configure()
+        store.migrate()
+        report = run_due(store, f"cli:{socket.gethostname()}:{os.getpid()}")
+    finally:
+        store.close()
+    print(f"Оброблено правил: {report['rules']}, записано транзакцій: {report['transactions']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
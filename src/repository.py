@@ -0,0 +1,327 @@
+import sqlite3
+from datetime import datetime
+
+import archive
+import ledger
+import records
+import rollups
+
+# Увесь SQL застосунку. Функції приймають відкрите з'єднання першим аргументом,
+# тож їх можна викликати і з пулу (db.connect), і в потоці записувача (db.run_write),
+# і з тестів чи бенчмарків без Flet. Транзакціями керує той, хто викликає.
+
+RECENT_LIMIT = 10
+# SQLite обмежує кількість частин у UNION ALL (SQLITE_MAX_COMPOUND_SELECT = 500)
+_UNION_CHUNK = 100
+
+USER_ACCOUNT_IDS_SQL = "SELECT account_id FROM user_accounts_link WHERE username = ?"
+PARTICIPANTS_SQL = "SELECT username FROM user_accounts_link WHERE account_id = ?"
+# Останні транзакції одного рахунку читаються з індексу (account_id, ts) без сортування
+ACCOUNT_RECENT_SQL = f"""
+    SELECT {records.select_list("t")}, a.name AS account_name FROM transactions t
+    JOIN accounts a ON t.account_id = a.account_id
+    WHERE t.account_id = ?
+    ORDER BY t.ts DESC, t.transaction_id DESC
+    LIMIT ?
+"""
+# Вивантаження історії: keyset по (ts, transaction_id) у хронологічному порядку з індексу рахунку.
+# {table} - робоча таблиця або вигляд року архіву (archive.py), як і в AMOUNT_SERIES_SQL
+EXPORT_BATCH_SQL = f"""
+    SELECT {", ".join(records.TRANSACTION_COLUMNS)}, timestamp FROM {{table}}
+    WHERE account_id = ? AND (ts, transaction_id) > (?, ?)
+    ORDER BY ts ASC, transaction_id ASC
+    LIMIT ?
+"""
+# Ряд (час у секундах епохи, сума зі знаком) для аналітики, в хронологічному порядку з індексу рахунку
+AMOUNT_SERIES_SQL = """
+    SELECT ts, CASE type WHEN 'income' THEN amount ELSE -amount END
+    FROM {table}
+    WHERE account_id = ?
+    ORDER BY ts ASC, transaction_id ASC
+"""
+# Рахунок разом з балансом: остання контрольна точка + транзакції після неї (див. ledger.py)
+ACCOUNT_SELECT_SQL = f"""
+    SELECT a.*, COALESCE(cp.balance, 0) + COALESCE((
+        SELECT SUM({ledger.SIGNED_AMOUNT_SQL}) FROM transactions t
+        WHERE t.account_id = a.account_id AND t.transaction_id > COALESCE(cp.up_to_transaction_id, 0)
+    ), 0) AS balance
+    FROM accounts a
+    LEFT JOIN balance_checkpoints cp ON cp.account_id = a.account_id AND cp.up_to_transaction_id = (
+        SELECT MAX(up_to_transaction_id) FROM balance_checkpoints WHERE account_id = a.account_id)
+"""
+
+
+def _placeholders(values):
+    return ",".join("?" for _ in values)
+
+
+def _recent_sort_key(row):
+    return (row["ts"], row["transaction_id"])
+
+
+def _export_ts(row):
+    return row["ts"]
+
+
+def _series_ts(row):
+    return row[0]
+
+
+# Користувачі
+
+def get_user(conn: sqlite3.Connection, username: str):
+    return conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+
+
+def create_user(conn: sqlite3.Connection, username: str, password_hash: str) -> bool:
+    # False, якщо користувач з таким ім'ям уже є. Пароль хешує auth.hash_password
+    cur = conn.execute("INSERT INTO users (username, password) VALUES (?, ?) ON CONFLICT (username) DO NOTHING",
+                       (username, password_hash))
+    return cur.rowcount == 1
+
+
+def set_password(conn: sqlite3.Connection, username: str, password_hash: str):
+    conn.execute("UPDATE users SET password = ? WHERE username = ?", (password_hash, username))
+
+
+# Рахунки
+
+def get_account(conn: sqlite3.Connection, account_id: str):
+    return conn.execute(f"{ACCOUNT_SELECT_SQL} WHERE a.account_id = ?", (account_id,)).fetchone()
+
+
+def get_accounts(conn: sqlite3.Connection, account_ids: list) -> list:
+    if not account_ids:
+        return []
+    return conn.execute(f"{ACCOUNT_SELECT_SQL} WHERE a.account_id IN ({_placeholders(account_ids)})",
+                        list(account_ids)).fetchall()
+
+
+def get_balance(conn: sqlite3.Connection, account_id: str) -> int:
+    # У копійках
+    return ledger.get_balance(conn, account_id)
+
+
+def create_account(conn: sqlite3.Connection, account_id: str, name: str, owner_username: str):
+    conn.execute("INSERT INTO accounts (account_id, name, owner_username) VALUES (?, ?, ?)",
+                 (account_id, name, owner_username))
+    link_user(conn, owner_username, account_id)
+
+
+def rename_account(conn: sqlite3.Connection, account_id: str, name: str):
+    conn.execute("UPDATE accounts SET name = ? WHERE account_id = ?", (name, account_id))
+
+
+def delete_account(conn: sqlite3.Connection, account_id: str):
+    rollups.delete_account(conn, account_id)
+    ledger.delete_account(conn, account_id)
+    conn.execute("DELETE FROM recurring_rules WHERE account_id = ?", (account_id,))
+    conn.execute("DELETE FROM user_accounts_link WHERE account_id = ?", (account_id,))
+    for source in [archive.HOT, *archive.sources(conn)]:
+        conn.execute(f"DELETE FROM {source.target} WHERE account_id = ?", (account_id,))
+    conn.execute("DELETE FROM accounts WHERE account_id = ?", (account_id,))
+
+
+# Зв'язки користувач - рахунок
+
+def get_user_account_ids(conn: sqlite3.Connection, username: str) -> list:
+    return [row["account_id"] for row in conn.execute(USER_ACCOUNT_IDS_SQL, (username,))]
+
+
+def count_user_accounts(conn: sqlite3.Connection, username: str) -> int:
+    return conn.execute("SELECT COUNT(*) FROM user_accounts_link WHERE username = ?", (username,)).fetchone()[0]
+
+
+def is_linked(conn: sqlite3.Connection, username: str, account_id: str) -> bool:
+    return conn.execute("SELECT 1 FROM user_accounts_link WHERE username = ? AND account_id = ?",
+                        (username, account_id)).fetchone() is not None
+
+
+def link_user(conn: sqlite3.Connection, username: str, account_id: str):
+    conn.execute("INSERT INTO user_accounts_link (username, account_id) VALUES (?, ?)", (username, account_id))
+
+
+def unlink_user(conn: sqlite3.Connection, username: str, account_id: str):
+    conn.execute("DELETE FROM user_accounts_link WHERE username = ? AND account_id = ?", (username, account_id))
+
+
+def get_participants(conn: sqlite3.Connection, account_id: str) -> list:
+    return [row["username"] for row in conn.execute(PARTICIPANTS_SQL, (account_id,))]
+
+
+# Транзакції
+
+def signed_amount(trans_type: str, amount: int) -> int:
+    return amount if trans_type == "income" else -amount
+
+
+class TransactionNotFoundError(LookupError):
+    pass
+
+
+def _find_transaction(conn, transaction_id):
+    # (джерело, рядок): спершу робоча БД, потім роки архіву; (None, None), якщо транзакції немає
+    row = conn.execute("SELECT * FROM transactions WHERE transaction_id = ?", (transaction_id,)).fetchone()
+    if row is not None:
+        return archive.HOT, row
+    for source in archive.sources(conn):
+        row = conn.execute(f"SELECT * FROM {source.table} WHERE transaction_id = ?", (transaction_id,)).fetchone()
+        if row is not None:
+            return source, row
+    return None, None
+
+
+def get_transaction(conn: sqlite3.Connection, transaction_id: int):
+    return _find_transaction(conn, transaction_id)[1]
+
+
+def add_transaction(conn: sqlite3.Connection, account_id: str, trans_type: str, amount: int,
+                    description: str, username: str, timestamp: str = None):
+    # amount - у копійках. Повертає (новий рядок транзакції, новий баланс рахунку)
+    timestamp = timestamp or datetime.now().isoformat()
+    transaction_id = conn.execute("""
+        INSERT INTO transactions (account_id, type, amount, description, timestamp, user_username)
+        VALUES (?, ?, ?, ?, ?, ?)
+        RETURNING transaction_id
+    """, (account_id, trans_type, amount, description, timestamp, username)).fetchone()[0]
+    rollups.apply_delta(conn, account_id, timestamp, trans_type, username, amount, 1)
+    balance = ledger.maybe_checkpoint(conn, account_id)
+    return get_transaction(conn, transaction_id), balance
+
+
+def add_transactions_many(conn: sqlite3.Connection, transactions: list) -> dict:
+    # transactions - кортежі (account_id, type, amount, description, timestamp, username[, import_hash]).
+    # Один executemany на вставку, підсумки групуються, контрольна точка - не частіше одного разу на рахунок.
+    deltas = {}
+    rows = []
+    for account_id, trans_type, amount, description, timestamp, username, *rest in transactions:
+        import_hash = rest[0] if rest else None
+        rows.append((account_id, trans_type, amount, description, timestamp or datetime.now().isoformat(), username,
+                     import_hash))
+        deltas[account_id] = deltas.get(account_id, 0) + signed_amount(trans_type, amount)
+    conn.executemany("""
+        INSERT INTO transactions (account_id, type, amount, description, timestamp, user_username, import_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    rollups.apply_many(conn, ((row[0], row[1], row[2], row[4], row[5]) for row in rows))
+    for account_id in deltas:
+        ledger.maybe_checkpoint(conn, account_id)
+    return deltas
+
+
+def existing_import_hashes(conn: sqlite3.Connection, hashes: list) -> set:
+    found = set()
+    hashes = list(hashes)
+    for start in range(0, len(hashes), 500):
+        chunk = hashes[start:start + 500]
+        # Повторний імпорт старої виписки не має продублювати транзакції, вже перенесені в архів
+        for source in [archive.HOT, *archive.sources(conn)]:
+            found.update(row[0] for row in conn.execute(
+                f"SELECT import_hash FROM {source.table} WHERE import_hash IN ({_placeholders(chunk)})", chunk))
+    return found
+
+
+def update_transaction(conn: sqlite3.Connection, transaction_id: int, amount: int, description: str):
+    # Повертає (оновлений рядок, новий баланс рахунку)
+    source, old_tx = _find_transaction(conn, transaction_id)
+    if source is None:
+        raise TransactionNotFoundError("Транзакції вже не існує.")
+    conn.execute(f"UPDATE {source.target} SET amount = ?, description = ? WHERE transaction_id = ?",
+                 (amount, description, transaction_id))
+    ledger.adjust_checkpoints(conn, old_tx["account_id"], transaction_id,
+                              signed_amount(old_tx["type"], amount) - signed_amount(old_tx["type"], old_tx["amount"]))
+    rollups.apply_delta(conn, old_tx["account_id"], old_tx["timestamp"], old_tx["type"], old_tx["user_username"],
+                        amount - old_tx["amount"], 0)
+    return get_transaction(conn, transaction_id), get_balance(conn, old_tx["account_id"])
+
+
+def delete_transaction(conn: sqlite3.Connection, transaction_id: int) -> int:
+    # Повертає новий баланс рахунку
+    source, tx = _find_transaction(conn, transaction_id)
+    if source is None:
+        raise TransactionNotFoundError("Транзакції вже не існує.")
+    conn.execute(f"DELETE FROM {source.target} WHERE transaction_id = ?", (transaction_id,))
+    ledger.adjust_checkpoints(conn, tx["account_id"], transaction_id, -signed_amount(tx["type"], tx["amount"]))
+    rollups.apply_delta(conn, tx["account_id"], tx["timestamp"], tx["type"], tx["user_username"], -tx["amount"], -1)
+    return get_balance(conn, tx["account_id"])
+
+
+def get_transactions_batch(conn: sqlite3.Connection, account_id: str, after: tuple = None, limit: int = 5000) -> list:
+    # Наступна пачка транзакцій після ключа after = (ts, transaction_id), від старіших до новіших
+    after = after or (records.MIN_TS, 0)
+    params = (account_id, after[0], after[1], limit)
+    rows = conn.execute(EXPORT_BATCH_SQL.format(table="transactions"), params).fetchall()
+    # Архів читається, лише якщо його роки можуть потрапити в цю пачку
+    return archive.fill(conn, rows, lambda source: conn.execute(EXPORT_BATCH_SQL.format(table=source.table),
+                                                                params).fetchall(),
+                        limit, _recent_sort_key, False, after[0], None, _export_ts)
+
+
+def get_amount_series(conn: sqlite3.Connection, account_id: str) -> list:
+    # Звичайні кортежі замість sqlite3.Row: їх одразу перетворює на масив NumPy
+    cur = conn.cursor()
+    cur.row_factory = None
+    rows = cur.execute(AMOUNT_SERIES_SQL.format(table="transactions"), (account_id,)).fetchall()
+    cold = archive.sources(conn)
+    for source in cold:
+        rows += cur.execute(AMOUNT_SERIES_SQL.format(table=source.table), (account_id,)).fetchall()
+    if cold:
+        rows.sort(key=_series_ts)
+    return rows
+
+
+def get_account_version(conn: sqlite3.Connection, account_id: str) -> tuple:
+    # Версія даних рахунку: змінюється при додаванні, видаленні та редагуванні суми
+    last_id, count = conn.execute("SELECT MAX(transaction_id), COUNT(*) FROM transactions WHERE account_id = ?",
+                                  (account_id,)).fetchone()
+    return last_id, count, ledger.get_balance(conn, account_id)
+
+
+def _recent_by_account(conn, account_ids, limit):
+    # Кожен рахунок дає не більше limit рядків з індексу, а злиття робиться в Python.
+    # Це дешевше, ніж ORDER BY по всіх транзакціях кількох рахунків.
+    recent = {}
+    for start in range(0, len(account_ids), _UNION_CHUNK):
+        chunk = account_ids[start:start + _UNION_CHUNK]
+        sql = " UNION ALL ".join(f"SELECT * FROM ({ACCOUNT_RECENT_SQL}) AS recent{i}" for i in range(len(chunk)))
+        params = []
+        for account_id in chunk:
+            params += [account_id, limit]
+        for row in records.fetch_all(conn.execute(sql, params), records.AccountTransactionRow):
+            recent.setdefault(row["account_id"], []).append(row)
+    return recent
+
+
+def _merge_recent(recent_by_account, account_ids, limit):
+    rows = [row for account_id in account_ids for row in recent_by_account.get(account_id, [])]
+    rows.sort(key=_recent_sort_key, reverse=True)
+    return rows[:limit]
+
+
+def get_recent_transactions(conn: sqlite3.Connection, account_ids: list, limit: int = RECENT_LIMIT) -> list:
+    account_ids = list(dict.fromkeys(account_ids))
+    return _merge_recent(_recent_by_account(conn, account_ids, limit), account_ids, limit)
+
+
+def get_accounts_with_recent_tx(conn: sqlite3.Connection, usernames: list, limit: int = RECENT_LIMIT) -> dict:
+    # Дані головної сторінки для кількох користувачів за три запити:
+    # зв'язки, рахунки та останні транзакції всіх задіяних рахунків.
+    # Повертає {username: {"account_ids": [...], "accounts": [...], "transactions": [...]}}
+    result = {username: {"account_ids": [], "accounts": [], "transactions": []} for username in usernames}
+    if not usernames:
+        return result
+    links = conn.execute(
+        f"SELECT username, account_id FROM user_accounts_link WHERE username IN ({_placeholders(usernames)})",
+        list(usernames)).fetchall()
+    for link in links:
+        result[link["username"]]["account_ids"].append(link["account_id"])
+
+    account_ids = list(dict.fromkeys(link["account_id"] for link in links))
+    accounts = {row["account_id"]: row for row in get_accounts(conn, account_ids)}
+
+    recent_by_account = _recent_by_account(conn, account_ids, limit)
+
+    for data in result.values():
+        data["accounts"] = [accounts[account_id] for account_id in data["account_ids"] if account_id in accounts]
+        data["transactions"] = _merge_recent(recent_by_account, data["account_ids"], limit)
+    return result
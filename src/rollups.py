@@ -0,0 +1,146 @@
+import argparse
+import sqlite3
+import sys
+from datetime import date
+
+import archive
+import storage
+
+# Підсумки транзакцій за місяць у розрізі (рахунок, місяць, тип, користувач).
+# repository оновлює їх у тій самій транзакції, що й transactions, а звіти читають лише їх,
+# тож вартість звіту залежить від кількості місяців, а не транзакцій.
+
+UPSERT_SQL = """
+    INSERT INTO monthly_rollups (account_id, period, type, user_username, total, count)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (account_id, period, type, user_username)
+    DO UPDATE SET total = monthly_rollups.total + excluded.total, count = monthly_rollups.count + excluded.count
+"""
+# Групи, в яких не лишилося транзакцій, видаляємо, щоб звіт не показував порожні місяці
+_PRUNE_SQL = """
+    DELETE FROM monthly_rollups
+    WHERE account_id = ? AND period = ? AND type = ? AND user_username = ? AND count <= 0
+"""
+# Частина перерахунку для одного джерела: робочої таблиці або року архіву (archive.sources)
+REBUILD_SELECT_SQL = """
+    SELECT account_id, substr(timestamp, 1, 7) AS period, type, user_username, SUM(amount) AS total, COUNT(*) AS count
+    FROM {table} {where}
+    GROUP BY 1, 2, 3, 4
+"""
+
+
+def period_of(timestamp: str) -> str:
+    return timestamp[:7]
+
+
+def apply_delta(conn: sqlite3.Connection, account_id: str, timestamp: str, trans_type: str, username: str,
+                amount: int, count: int):
+    key = (account_id, period_of(timestamp), trans_type, username)
+    conn.execute(UPSERT_SQL, (*key, amount, count))
+    if count < 0:
+        conn.execute(_PRUNE_SQL, key)
+
+
+def apply_many(conn: sqlite3.Connection, transactions):
+    # transactions - ітерація (account_id, type, amount, timestamp, username); групуємо перед записом
+    groups = {}
+    for account_id, trans_type, amount, timestamp, username in transactions:
+        key = (account_id, period_of(timestamp), trans_type, username)
+        total, count = groups.get(key, (0, 0))
+        groups[key] = (total + amount, count + 1)
+    conn.executemany(UPSERT_SQL, [(*key, total, count) for key, (total, count) in groups.items()])
+
+
+def delete_account(conn: sqlite3.Connection, account_id: str):
+    conn.execute("DELETE FROM monthly_rollups WHERE account_id = ?", (account_id,))
+
+
+def _rebuild_sql(conn, where=""):
+    # Підсумки рахуються з робочої таблиці разом з роками архіву, як і existing_import_hashes
+    parts = " UNION ALL ".join(REBUILD_SELECT_SQL.format(table=source.table, where=where)
+                               for source in [archive.HOT, *archive.sources(conn)])
+    return f"""
+        INSERT INTO monthly_rollups (account_id, period, type, user_username, total, count)
+        SELECT account_id, period, type, user_username, SUM(total), SUM(count) FROM ({parts}) AS parts
+        GROUP BY 1, 2, 3, 4
+    """
+
+
+def rebuild(conn: sqlite3.Connection, account_ids: list = None) -> int:
+    # Перераховує підсумки з transactions та архіву (для наявних даних або після ручних змін у БД)
+    if account_ids is None:
+        conn.execute("DELETE FROM monthly_rollups")
+        conn.execute(_rebuild_sql(conn))
+    else:
+        sql = _rebuild_sql(conn, "WHERE account_id = ?")
+        for account_id in account_ids:
+            delete_account(conn, account_id)
+            conn.execute(sql, (account_id,) * sql.count("?"))
+    return conn.execute("SELECT COUNT(*) FROM monthly_rollups").fetchone()[0]
+
+
+# Звіти
+
+def _placeholders(values):
+    return ",".join("?" for _ in values)
+
+
+def first_period(months: int, today: date = None) -> str:
+    # Перший місяць вікна з `months` останніх місяців, включно з поточним
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _summary(conn, group_column, account_ids, since):
+    if not account_ids:
+        return []
+    return conn.execute(f"""
+        SELECT {group_column} AS key, type, SUM(total) AS total, SUM(count) AS count
+        FROM monthly_rollups
+        WHERE account_id IN ({_placeholders(account_ids)}) AND period >= ?
+        GROUP BY {group_column}, type
+        ORDER BY {group_column}
+    """, [*account_ids, since]).fetchall()
+
+
+def _pivot(rows):
+    # [(key, type, total, count)] -> [{"key", "income", "expense", "count"}] у порядку ключів
+    result = {}
+    for row in rows:
+        item = result.setdefault(row["key"], {"key": row["key"], "income": 0, "expense": 0, "count": 0})
+        item[row["type"]] += row["total"]
+        item["count"] += row["count"]
+    return list(result.values())
+
+
+def monthly_report(conn: sqlite3.Connection, account_ids: list, since: str) -> list:
+    return _pivot(_summary(conn, "period", account_ids, since))
+
+
+def member_report(conn: sqlite3.Connection, account_ids: list, since: str) -> list:
+    return _pivot(_summary(conn, "user_username", account_ids, since))
+
+
+def account_report(conn: sqlite3.Connection, account_ids: list, since: str) -> list:
+    return _pivot(_summary(conn, "account_id", account_ids, since))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перерахунок місячних підсумків для звітів")
+    parser.add_argument("--db", default="budget.db", help="шлях до SQLite або postgresql://...")
+    parser.add_argument("--account", action="append", help="ID рахунку (можна кілька; за замовчуванням усі)")
+    args = parser.parse_args(argv)
+
+    store = storage.from_url(args.db)
+    store.configure()
+    try:
+        count = store.run_write(rebuild, args.account)
+    finally:
+        store.close()
+    print(f"Підсумкових рядків: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import os
+import re
+from datetime import date, timedelta
+
+import archive
+import records
+import storage
+
+# Повнотекстовий пошук по описах транзакцій. У SQLite - віртуальна таблиця FTS5 transactions_fts,
+# яку тригери з міграції 8 оновлюють разом із transactions; у PostgreSQL - GIN-індекс по to_tsvector.
+# Результати йдуть від новіших до старіших з keyset-пагінацією по (ts, transaction_id).
+# Кожен файл архіву (archive.py) має власний індекс FTS5; його роки шукаються, лише якщо можуть дати рядки сторінки.
+
+SEARCH_PAGE_SIZE = int(os.environ.get("BUDGET_SEARCH_PAGE_SIZE", "50"))
+
+# Токени як у unicode61: літери й цифри, решта (зокрема апостроф у "м'ясо") - роздільники
+_TOKEN_RE = re.compile(r"[^\W_ʼ]+")
+
+
+def query_phrases(text) -> list:
+    # Кожне слово запиту - фраза з його токенів: "м'ясо" -> ["м", "ясо"]
+    phrases = []
+    for word in (text or "").lower().split():
+        tokens = _TOKEN_RE.findall(word)
+        if tokens:
+            phrases.append(tokens)
+    return phrases
+
+
+def fts_query(phrases) -> str:
+    # Синтаксис FTS5: усі слова обов'язкові, останній токен кожного слова - префікс ("стом" знайде "стоматолог")
+    return " ".join('"' + " ".join(tokens) + '"*' for tokens in phrases)
+
+
+def ts_query(phrases) -> str:
+    # Той самий запит для to_tsquery PostgreSQL
+    return " & ".join(" <-> ".join(tokens) + ":*" for tokens in phrases)
+
+
+def _placeholders(values):
+    return ",".join("?" * len(values))
+
+
+def _fetch(conn, sql, source, params):
+    # {table} - таблиця чи вигляд року архіву, {fts} - його індекс (лише в запиті SQLite з текстом)
+    return records.fetch_all(conn.execute(sql.format(table=source.table, fts=source.fts), params),
+                             records.AccountTransactionRow)
+
+
+def _row_ts(row):
+    return row["ts"]
+
+
+def _row_key(row):
+    return (row["ts"], row["transaction_id"])
+
+
+def search_transactions(conn, account_ids: list, text: str = "", date_from: date = None, date_to: date = None,
+                        min_amount: int = None, max_amount: int = None, author: str = None,
+                        page_size: int = SEARCH_PAGE_SIZE, after: tuple = None) -> tuple:
+    # Повертає (рядки від новіших до старіших з account_name, чи є ще). Суми - у копійках, без знака;
+    # date_to включно. after - курсор pagination.row_cursor останнього рядка попередньої сторінки.
+    if not account_ids:
+        return [], False
+    where = [f"t.account_id IN ({_placeholders(account_ids)})"]
+    params = list(account_ids)
+    phrases = query_phrases(text)
+    if phrases:
+        if storage.dialect_of(conn) == "postgresql":
+            where.append("to_tsvector('simple', COALESCE(t.description, '')) @@ to_tsquery('simple', ?)")
+            params.append(ts_query(phrases))
+        else:
+            where.append("t.transaction_id IN (SELECT rowid FROM {fts} WHERE transactions_fts MATCH ?)")
+            params.append(fts_query(phrases))
+    lo = hi = None
+    if date_from is not None:
+        lo = records.date_to_ts(date_from)
+        where.append("t.ts >= ?")
+        params.append(lo)
+    if date_to is not None:
+        where.append("t.ts < ?")
+        params.append(records.date_to_ts(date_to + timedelta(days=1)))
+        hi = params[-1] - 1
+    if min_amount is not None:
+        where.append("t.amount >= ?")
+        params.append(min_amount)
+    if max_amount is not None:
+        where.append("t.amount <= ?")
+        params.append(max_amount)
+    if author:
+        where.append("t.user_username = ?")
+        params.append(author)
+    if after is not None:
+        where.append("(t.ts, t.transaction_id) < (?, ?)")
+        params.extend(after)
+        hi = after[0] if hi is None else min(hi, after[0])
+    sql = f"""
+        SELECT {records.select_list("t")}, a.name AS account_name
+        FROM {{table}} t
+        JOIN accounts a ON a.account_id = t.account_id
+        WHERE {" AND ".join(where)}
+        ORDER BY t.ts DESC, t.transaction_id DESC
+        LIMIT ?
+    """
+    params.append(page_size + 1)
+    rows = archive.fill(conn, _fetch(conn, sql, archive.HOT, params), lambda source: _fetch(conn, sql, source, params),
+                        page_size + 1, _row_key, True, lo, hi, _row_ts)
+    return rows[:page_size], len(rows) > page_size
@@ -0,0 +1,49 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+
+# Вхід користувача не прив'язаний до процесу. page.session живе в пам'яті воркера, що обслуговує
+# з'єднання; після перепідключення до іншого воркера (балансувальник, перезапуск) сесія порожня.
+# Тому після входу браузер отримує підписаний токен у page.client_storage, і будь-який воркер
+# з тим самим секретом відновлює з нього користувача.
+
+CLIENT_STORAGE_KEY = "budget.session"
+SESSION_TTL = int(os.environ.get("BUDGET_SESSION_TTL", str(7 * 24 * 3600)))
+
+# Без BUDGET_SECRET_KEY (або FLET_SECRET_KEY) токени дійсні лише в процесі, що їх видав
+_PROCESS_SECRET = secrets.token_hex(32)
+
+
+def secret_key():
+    return os.environ.get("BUDGET_SECRET_KEY") or os.environ.get("FLET_SECRET_KEY") or _PROCESS_SECRET
+
+
+def _sign(payload: bytes, secret: str) -> str:
+    return hmac.new(secret.encode(), payload, hashlib.sha256).hexdigest()
+
+
+def issue_token(username: str, secret: str = None, now: float = None, ttl: int = None) -> str:
+    expires = int((now or time.time()) + (ttl or SESSION_TTL))
+    payload = f"{expires}:{username}".encode()
+    return base64.urlsafe_b64encode(payload).decode() + "." + _sign(payload, secret or secret_key())
+
+
+def verify_token(token, secret: str = None, now: float = None):
+    # Ім'я користувача або None, якщо токен підроблений, пошкоджений чи прострочений
+    if not token or "." not in token:
+        return None
+    encoded, signature = token.rsplit(".", 1)
+    try:
+        payload = base64.urlsafe_b64decode(encoded.encode())
+        expires, username = payload.decode().split(":", 1)
+        expires = int(expires)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _sign(payload, secret or secret_key())):
+        return None
+    if expires < (now or time.time()):
+        return None
+    return username
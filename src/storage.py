@@ -0,0 +1,280 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import db
+import metrics
+import migrations
+
+# PostgreSQL - необов'язковий бекенд; psycopg імпортується, лише коли створюється PostgresStorage,
+# тож запуск із SQLite за нього не платить
+psycopg = None
+_IntegerNumericLoader = None
+
+# Сховище даних застосунку. repository, ledger і rollups працюють з будь-яким з'єднанням,
+# що має execute/executemany з плейсхолдерами "?" і рядками з доступом за іменем та номером;
+# бекенд дає такі з'єднання, чергу запису, міграції та власні класи помилок.
+# URL: "budget.db" або "sqlite:///шлях/до/budget.db" - SQLite, "postgresql://..." - PostgreSQL.
+
+# Ключ pg_advisory_xact_lock: записи всіх процесів і вузлів виконуються по одному, як у SQLite
+POSTGRES_WRITE_LOCK = 7_120_250
+
+
+class StorageError(Exception):
+    pass
+
+
+class Storage:
+    # Інтерфейс бекенда; спільна частина - пул фонових потоків для інтерфейсу (db.submit)
+    url = None
+    errors = ()
+
+    def configure(self):
+        pass
+
+    def connect(self, query_timeout=db.DEFAULT_QUERY_TIMEOUT):
+        # Контекстний менеджер: з'єднання з пулу, commit при успіху, rollback при помилці
+        raise NotImplementedError
+
+    def run_write(self, fn, *args, timeout=None):
+        # fn(conn, *args) в одній транзакції запису; записи не виконуються паралельно
+        raise NotImplementedError
+
+    def migrate(self):
+        raise NotImplementedError
+
+    def submit(self, fn, *args):
+        return db.submit(fn, *args)
+
+    def stats(self):
+        return db.stats()
+
+    def close(self):
+        db.close_pool()
+
+
+class SQLiteStorage(Storage):
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path):
+        self.url = path
+        self.path = path
+
+    def configure(self):
+        return db.configure(self.path)
+
+    def connect(self, query_timeout=db.DEFAULT_QUERY_TIMEOUT):
+        return db.connect(self.path, query_timeout)
+
+    def run_write(self, fn, *args, timeout=None):
+        return db.run_write(self.path, fn, *args, timeout=timeout)
+
+    def migrate(self):
+        with self.connect(query_timeout=None) as conn:
+            return migrations.migrate(conn)
+
+
+# PostgreSQL
+
+def dialect_of(conn):
+    # Для тих небагатьох запитів, що відрізняються між бекендами (повнотекстовий пошук)
+    return getattr(conn, "dialect", "sqlite")
+
+
+def to_pyformat(sql):
+    # "?" -> "%s"; буквальний "%" у SQL psycopg вимагає подвоювати
+    return sql.replace("%", "%%").replace("?", "%s")
+
+
+class Row(tuple):
+    # Аналог sqlite3.Row: row[0], row["name"], dict(row)
+    def __new__(cls, values, index):
+        row = super().__new__(cls, values)
+        row._index = index
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._index)
+
+
+def _row_factory(cursor):
+    index = {column.name: i for i, column in enumerate(cursor.description or ())}
+    return lambda values: Row(values, index)
+
+
+def import_psycopg():
+    global psycopg, _IntegerNumericLoader
+    if _IntegerNumericLoader is not None:
+        return psycopg
+    try:
+        import psycopg.pq
+        import psycopg.rows
+        from psycopg.types.numeric import NumericLoader
+    except ImportError:
+        psycopg = None
+        raise StorageError("Для PostgreSQL потрібен пакет psycopg (pip install \"psycopg[binary]\").") from None
+
+    class IntegerNumericLoader(NumericLoader):
+        # SUM(bigint) у PostgreSQL має тип numeric; суми в копійках цілі, тож повертаємо int
+        def load(self, data):
+            value = super().load(data)
+            return int(value) if value == value.to_integral_value() else value
+
+    _IntegerNumericLoader = IntegerNumericLoader
+    return psycopg
+
+
+def _measured(sql, execute, *args, cur=None):
+    # cur - курсор, якщо execute повертає None (executemany у psycopg)
+    if not metrics.ENABLED:
+        return execute(*args) or cur
+    started = time.perf_counter()
+    cur = execute(*args) or cur
+    metrics.observe_query(sql, time.perf_counter() - started, max(cur.rowcount, 0))
+    return cur
+
+
+class PostgresConnection:
+    # Обгортка psycopg з інтерфейсом sqlite3.Connection, якого очікують repository, ledger і db.ConnectionPool
+    dialect = "postgresql"
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.query_timeout = None
+        self.timed_out = False
+
+    @property
+    def in_transaction(self):
+        return self.raw.info.transaction_status != psycopg.pq.TransactionStatus.IDLE
+
+    def execute(self, sql, params=()):
+        if sql.strip().upper() == "BEGIN":
+            # psycopg відкриває транзакцію сам; явний BEGIN (ledger.verify_all) означає потребу в знімку
+            if self.in_transaction:
+                return self.raw.cursor()
+            return self.raw.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        return _measured(sql, self.raw.execute, to_pyformat(sql), params or ())
+
+    def cursor(self):
+        return PostgresCursor(self.raw)
+
+    def executemany(self, sql, params):
+        cur = self.raw.cursor()
+        return _measured(sql, cur.executemany, to_pyformat(sql), list(params), cur=cur)
+
+    def finish_query(self):
+        # psycopg читає всі рядки ще в execute, тож запит записується в metrics одразу
+        pass
+
+    def start_timer(self):
+        self.timed_out = False
+        if self.query_timeout is not None:
+            # SET LOCAL діє до кінця поточної транзакції, тобто блоку connect()
+            self.raw.execute("SELECT set_config('statement_timeout', %s, true)",
+                             (str(int(self.query_timeout * 1000)),))
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+
+class PostgresCursor:
+    # conn.cursor() з row_factory = None - звичайні кортежі, як у sqlite3 (repository.get_amount_series)
+    def __init__(self, raw):
+        self.raw = raw
+        self.row_factory = _row_factory
+
+    def execute(self, sql, params=()):
+        cur = self.raw.cursor(row_factory=self.row_factory or psycopg.rows.tuple_row)
+        return _measured(sql, cur.execute, to_pyformat(sql), params or ())
+
+
+class PostgresPool(db.ConnectionPool):
+    def _connect(self):
+        raw = psycopg.connect(self.db_file, row_factory=_row_factory)
+        raw.adapters.register_loader("numeric", _IntegerNumericLoader)
+        return PostgresConnection(raw)
+
+
+class PostgresStorage(Storage):
+    def __init__(self, url, pool_size=db.DEFAULT_POOL_SIZE, pool_timeout=db.DEFAULT_ACQUIRE_TIMEOUT):
+        import_psycopg()
+        self.url = url
+        self.errors = (psycopg.Error,)
+        self.pool = PostgresPool(url, size=pool_size, timeout=pool_timeout)
+
+    def connect(self, query_timeout=db.DEFAULT_QUERY_TIMEOUT):
+        return self._connect(query_timeout)
+
+    @contextmanager
+    def _connect(self, query_timeout):
+        with self.pool.connection() as conn:
+            conn.query_timeout = query_timeout
+            try:
+                with conn:
+                    conn.start_timer()
+                    yield conn
+            except psycopg.errors.QueryCanceled as exc:
+                raise db.QueryTimeoutError(f"Запит не завершився за {query_timeout} с.") from exc
+
+    def run_write(self, fn, *args, timeout=None):
+        # Замість потоку-записувача - транзакційне advisory-блокування, спільне для всіх процесів
+        with self.connect(query_timeout=timeout) as conn:
+            conn.execute("SELECT pg_advisory_xact_lock(?)", (POSTGRES_WRITE_LOCK,))
+            return fn(conn, *args)
+
+    def migrate(self):
+        with self.connect(query_timeout=None) as conn:
+            return migrations.migrate_postgres(conn)
+
+    def stats(self):
+        return {"pool": self.pool.stats(), "write_queue": 0}
+
+    def close(self):
+        self.pool.close()
+        db.close_pool()
+
+
+def from_url(url):
+    parsed = urlparse(url)
+    if parsed.scheme in ("postgresql", "postgres"):
+        return PostgresStorage(url)
+    if parsed.scheme == "sqlite":
+        # sqlite:///budget.db - відносний шлях, sqlite:////srv/budget.db - абсолютний
+        return SQLiteStorage(url[len("sqlite:///"):])
+    if len(parsed.scheme) <= 1:
+        # Звичайний шлях до файлу (або "C:\..." у Windows)
+        return SQLiteStorage(url)
+    raise StorageError(f"Непідтримуване сховище: {parsed.scheme}")
+
+
+def absolute_url(url):
+    # Шлях SQLite стає абсолютним під час запуску: воркери і зміна поточної теки не переводять застосунок на інший файл
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        return os.path.abspath(url[len("sqlite:///"):])
+    if len(parsed.scheme) <= 1:
+        return os.path.abspath(url)
+    return url
@@ -1,3 +1,8 @@
+from datetime import date
+
+import money
+
+
 def validate_registration(username, password):
     MIN_PASSWORD_LENGTH = 8
     MIN_USERNAME_LENGTH = 2
@@ -21,4 +26,44 @@ def validate_transaction_amount(amount_str):
             return False, None
         return True, amount_float
     except (ValueError, TypeError):
-        return False, None
\ No newline at end of file
+        return False, None
+
+
+def validate_amount_minor(amount_str):
+    # Як validate_transaction_amount, але повертає суму в копійках (int)
+    is_valid, _ = validate_transaction_amount(amount_str)
+    if not is_valid:
+        return False, None
+    try:
+        minor = money.to_minor(amount_str)
+    except ValueError:
+        return False, None
+    if minor <= 0:
+        return False, None
+    return True, minor
+
+
+def validate_search_filters(date_from_str, date_to_str, min_amount_str, max_amount_str):
+    # Порожні поля - без обмеження. Повертає (True, {"date_from", "date_to", "min_amount", "max_amount"})
+    # з датами (date) і сумами в копійках, або (False, повідомлення)
+    filters = {}
+    for key, value in (("date_from", date_from_str), ("date_to", date_to_str)):
+        value = (value or "").strip()
+        try:
+            filters[key] = date.fromisoformat(value) if value else None
+        except ValueError:
+            return False, "Дата має бути у форматі РРРР-ММ-ДД."
+    for key, value in (("min_amount", min_amount_str), ("max_amount", max_amount_str)):
+        value = (value or "").strip()
+        try:
+            filters[key] = money.to_minor(value) if value else None
+        except ValueError:
+            return False, "Сума має бути числом."
+        if filters[key] is not None and filters[key] < 0:
+            return False, "Сума не може бути від'ємною."
+    if filters["date_from"] and filters["date_to"] and filters["date_from"] > filters["date_to"]:
+        return False, "Початкова дата пізніша за кінцеву."
+    if (filters["min_amount"] is not None and filters["max_amount"] is not None
+            and filters["min_amount"] > filters["max_amount"]):
+        return False, "Мінімальна сума більша за максимальну."
+    return True, filters
@@ -0,0 +1,214 @@
+import flet as ft
+
+import money
+import pagination
+import validation
+
+
+class HistoryListViewModel:
+    # Список транзакцій з вікна pagination.HistoryWindow: плитки будуються лише для рядків вікна,
+    # прокрутка догружає сусідні сторінки. Запити вікна до БД ідуть через run_in_background(work, on_done,
+    # on_error), щоб обробник Flet не чекав на БД; без нього (тести) вони виконуються одразу.
+    def __init__(self, history, build_tile, height=600, run_in_background=None, show_error=None):
+        self.history = history
+        self.build_tile = build_tile
+        self.run_in_background = run_in_background
+        self.show_error = show_error
+        self.loading = False
+        self.tx_tiles = {}
+        self.empty_text = ft.Text("Історія транзакцій порожня.")
+        self.load_newer_button = ft.TextButton("Показати новіші", icon=ft.Icons.EXPAND_LESS,
+                                               on_click=self.load_newer)
+        self.load_older_button = ft.TextButton("Завантажити ще", icon=ft.Icons.EXPAND_MORE,
+                                               on_click=self.load_older)
+        self.transactions_list = ft.ListView(spacing=5, height=height, expand=True,
+                                             on_scroll=self.handle_scroll, on_scroll_interval=100)
+
+    def set_history(self, history):
+        # Нове вікно з іншими фільтрами; плитки тих самих транзакцій використовуються повторно
+        self.history = history
+        self.render_transactions()
+
+    def render_transactions(self):
+        rows = self.history.rows()
+        # Плитки, що випали з вікна, відпускаємо, решту використовуємо повторно
+        visible_ids = {t['transaction_id'] for t in rows}
+        for transaction_id in list(self.tx_tiles):
+            if transaction_id not in visible_ids:
+                del self.tx_tiles[transaction_id]
+        controls = []
+        if self.history.has_newer:
+            controls.append(self.load_newer_button)
+        for t in rows:
+            tile = self.tx_tiles.get(t['transaction_id'])
+            if tile is None:
+                tile = self.tx_tiles[t['transaction_id']] = self.build_tile(t)
+            controls.append(tile)
+        if self.history.has_older:
+            controls.append(self.load_older_button)
+        if not controls:
+            controls.append(self.empty_text)
+        self.transactions_list.controls = controls
+
+    def load(self, work, rerender=False):
+        # work читає сторінку у вікно; список перемальовується, коли запит щось повернув
+        def done(rows):
+            self.loading = False
+            if rows or rerender:
+                self.render_transactions()
+                if self.transactions_list.page is not None:
+                    self.transactions_list.update()
+
+        def failed(message):
+            self.loading = False
+            if self.show_error is not None:
+                self.show_error(message)
+
+        self.loading = True
+        if self.run_in_background is None:
+            done(work())
+        else:
+            self.run_in_background(work, done, failed)
+
+    def reload_transactions(self):
+        # Після пакетних змін (або зміни за іншого сортування) перечитуємо першу сторінку історії
+        self.load(self.history.load_first, rerender=True)
+
+    def load_newer(self, e=None):
+        # Поки сторінка читається, повторні події прокрутки її не дублюють
+        if not self.loading:
+            self.load(self.history.load_newer)
+
+    def load_older(self, e=None):
+        if not self.loading:
+            self.load(self.history.load_older)
+
+    def handle_scroll(self, e: ft.OnScrollEvent):
+        if e.pixels >= e.max_scroll_extent - 100:
+            self.load_older()
+        elif e.pixels <= e.min_scroll_extent:
+            self.load_newer()
+
+
+class AccountDetailsViewModel(HistoryListViewModel):
+    # Тримає посилання на елементи вигляду рахунку, щоб після дії змінювати лише
+    # потрібні частини (баланс, одну плитку), а не перебудовувати сторінку з нуля
+    def __init__(self, account_id, history, build_tile, run_in_background=None, show_error=None):
+        super().__init__(history, build_tile, run_in_background=run_in_background, show_error=show_error)
+        self.account_id = account_id
+        self.participant_tiles = {}
+        self.is_owner = False
+        self.root = None
+        self.title_text = None
+        self.balance_text = None
+        self.rename_field = None
+        self.participants_column = ft.Column(spacing=10)
+        self.recurring_column = ft.Column(spacing=0)
+        self.import_status_text = ft.Text("", size=12)
+        self.import_progress = ft.ProgressBar(visible=False)
+
+    def set_balance(self, balance):
+        self.balance_text.value = f"{money.format_minor(balance)} грн"
+
+    def set_name(self, name):
+        self.title_text.value = name
+        self.rename_field.value = name
+
+    def insert_transaction(self, row):
+        if self.history.prepend(row):
+            self.render_transactions()
+        elif self.history.stale:
+            self.reload_transactions()
+
+    def replace_transaction(self, row):
+        # Плитку будуємо заново лише для зміненої транзакції
+        self.tx_tiles.pop(row['transaction_id'], None)
+        if self.history.replace(row):
+            self.render_transactions()
+        elif self.history.stale:
+            self.reload_transactions()
+
+    def remove_transaction(self, transaction_id):
+        if self.history.remove(transaction_id):
+            self.render_transactions()
+
+    def add_participant(self, username, tile):
+        if username in self.participant_tiles:
+            return
+        self.participant_tiles[username] = tile
+        self.participants_column.controls.append(tile)
+
+    def remove_participant(self, username):
+        tile = self.participant_tiles.pop(username, None)
+        if tile is not None:
+            self.participants_column.controls.remove(tile)
+
+    def set_recurring(self, tiles):
+        # Плитки правил регулярних транзакцій рахунку (порожній список - блок прихований)
+        self.recurring_column.controls = list(tiles)
+        self.recurring_column.visible = bool(tiles)
+
+
+class HistoryFilterBar:
+    # Поля фільтрів і сортування списку транзакцій; «Застосувати» передає on_apply готовий
+    # pagination.HistoryFilter, а вибірку робить БД
+    SORT_OPTIONS = {
+        "date_desc": ("date", True, "Спочатку нові"),
+        "date_asc": ("date", False, "Спочатку старі"),
+        "amount_desc": ("amount", True, "Більші суми"),
+        "amount_asc": ("amount", False, "Менші суми"),
+    }
+
+    def __init__(self, on_apply, members=None):
+        self.on_apply = on_apply
+        self.date_from_field = ft.TextField(label="З дати", hint_text="РРРР-ММ-ДД", width=140)
+        self.date_to_field = ft.TextField(label="По дату", hint_text="РРРР-ММ-ДД", width=140)
+        self.min_amount_field = ft.TextField(label="Сума від", keyboard_type=ft.KeyboardType.NUMBER, width=120)
+        self.max_amount_field = ft.TextField(label="Сума до", keyboard_type=ft.KeyboardType.NUMBER, width=120)
+        self.type_dropdown = ft.Dropdown(label="Тип", width=140, value="", options=[
+            ft.dropdown.Option("", "Усі"), ft.dropdown.Option("income", "Доходи"),
+            ft.dropdown.Option("expense", "Витрати")])
+        # Учасників рахунку вибираємо зі списку; для кількох рахунків ім'я вводиться
+        if members is None:
+            self.member_field = ft.TextField(label="Учасник", width=160)
+        else:
+            self.member_field = ft.Dropdown(label="Учасник", width=160, value="", options=[
+                ft.dropdown.Option("", "Усі")] + [ft.dropdown.Option(username) for username in members])
+        self.sort_dropdown = ft.Dropdown(label="Сортування", width=170, value="date_desc", options=[
+            ft.dropdown.Option(key, label) for key, (_, _, label) in self.SORT_OPTIONS.items()])
+        self.error_text = ft.Text("", color="red")
+        self.root = ft.Column([
+            ft.Row([self.date_from_field, self.date_to_field, self.min_amount_field, self.max_amount_field],
+                   wrap=True),
+            ft.Row([self.type_dropdown, self.member_field, self.sort_dropdown,
+                    ft.TextButton("Застосувати", icon=ft.Icons.FILTER_LIST, on_click=self.apply),
+                    ft.TextButton("Скинути", on_click=self.reset)], wrap=True),
+            self.error_text,
+        ], spacing=5)
+
+    def read(self):
+        # (True, HistoryFilter) або (False, повідомлення)
+        is_valid, filters = validation.validate_search_filters(
+            self.date_from_field.value, self.date_to_field.value,
+            self.min_amount_field.value, self.max_amount_field.value)
+        if not is_valid:
+            return False, filters
+        sort, descending, _ = self.SORT_OPTIONS[self.sort_dropdown.value or "date_desc"]
+        return True, pagination.HistoryFilter(trans_type=self.type_dropdown.value or None,
+                                              member=(self.member_field.value or "").strip() or None,
+                                              sort=sort, descending=descending, **filters)
+
+    def apply(self, e=None):
+        is_valid, result = self.read()
+        self.error_text.value = "" if is_valid else result
+        self.error_text.update()
+        if is_valid:
+            self.on_apply(result)
+
+    def reset(self, e=None):
+        for field in (self.date_from_field, self.date_to_field, self.min_amount_field, self.max_amount_field,
+                      self.type_dropdown, self.member_field):
+            field.value = ""
+        self.sort_dropdown.value = "date_desc"
+        self.root.update()
+        self.apply()
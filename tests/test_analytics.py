@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import analytics  # noqa: E402
+import migrations  # noqa: E402
+import repository  # noqa: E402
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    repository.create_user(conn, "alice", "password123")
+    repository.create_account(conn, "acc-1", "Картка", "alice")
+    repository.add_transactions_many(conn, [
+        ("acc-1", "income", 100000, "ЗП", "2024-03-04T09:00:00", "alice"),   # понеділок
+        ("acc-1", "expense", 10000, "Їжа", "2024-03-04T18:00:00", "alice"),
+        ("acc-1", "expense", 5000, "Кава", "2024-03-06T08:00:00", "alice"),  # середа
+        ("acc-1", "expense", 3000, "Кіно", "2024-03-10T20:00:00", "alice"),  # неділя
+    ])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_series_loaded_in_chronological_order(conn):
+    """Ряд рахунку - два масиви: час у секундах і сума зі знаком у гривнях."""
+    series = analytics.AccountSeries.from_rows(repository.get_amount_series(conn, "acc-1"))
+    assert series.timestamps.dtype == np.int64
+    assert list(series.amounts) == [1000.0, -100.0, -50.0, -30.0]
+    assert list(series.balance_curve()[1]) == [1000.0, 900.0, 850.0, 820.0]
+
+
+def test_daily_balance_fills_gaps(conn):
+    """Дні без транзакцій присутні в ряді з незмінним балансом."""
+    series = analytics.AccountSeries.from_rows(repository.get_amount_series(conn, "acc-1"))
+    days, balance = series.daily_balance()
+    assert analytics.day_to_date(days[0]).isoformat() == "2024-03-04"
+    assert len(days) == 7
+    assert list(balance) == [900.0, 900.0, 850.0, 850.0, 850.0, 850.0, 820.0]
+
+
+def test_weekday_spending(conn):
+    """Витрати розкладаються за днями тижня, починаючи з понеділка."""
+    series = analytics.AccountSeries.from_rows(repository.get_amount_series(conn, "acc-1"))
+    assert list(series.weekday_spending()) == [100.0, 0.0, 50.0, 0.0, 0.0, 0.0, 30.0]
+
+
+def test_moving_average():
+    """Ковзне середнє на початку ряду усереднює лише наявні значення."""
+    assert list(analytics.moving_average([2, 4, 6, 8], 2)) == [2.0, 3.0, 5.0, 7.0]
+    assert list(analytics.moving_average([], 3)) == []
+
+
+def test_forecast_extends_linear_trend():
+    """Прогноз продовжує лінійний тренд щоденного балансу."""
+    day = analytics.SECONDS_PER_DAY
+    series = analytics.AccountSeries.from_rows([(i * day, 1000) for i in range(10)])
+    future_days, future_balance = series.forecast(days_ahead=5)
+    assert list(future_days) == [10, 11, 12, 13, 14]
+    assert future_balance == pytest.approx([110.0, 120.0, 130.0, 140.0, 150.0])
+
+
+def test_empty_account():
+    """Рахунок без транзакцій дає порожні ряди і плаский прогноз."""
+    series = analytics.AccountSeries.from_rows([])
+    assert len(series) == 0
+    assert len(series.daily_balance()[0]) == 0
+    _, future_balance = series.forecast(days_ahead=3)
+    assert list(future_balance) == [0.0, 0.0, 0.0]
+
+
+def test_cache_reuses_series_until_account_changes(conn):
+    """Повторний запит не перечитує історію, а додавання, редагування чи видалення - перечитує."""
+    cache = analytics.AnalyticsCache()
+    first = cache.get_series(conn, "acc-1")
+    assert cache.get_series(conn, "acc-1") is first
+
+    tx, _ = repository.add_transaction(conn, "acc-1", "expense", 1000, "Хліб", "alice", "2024-03-11T10:00:00")
+    second = cache.get_series(conn, "acc-1")
+    assert second is not first and len(second) == 5
+
+    old, _ = repository.add_transaction(conn, "acc-1", "expense", 500, "Старе", "alice", "2024-03-01T10:00:00")
+    repository.update_transaction(conn, old["transaction_id"], 700, "Старе")
+    assert cache.get_series(conn, "acc-1").amounts[0] == -7.0
@@ -0,0 +1,161 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+import archive
+import archiver
+import db
+import exporter
+import ledger
+import pagination
+import repository
+import rollups
+import search
+import storage
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = storage.SQLiteStorage(str(tmp_path / "budget.db"))
+    store.configure()
+    store.migrate()
+    with store.connect() as conn:
+        repository.create_user(conn, "alice", "password123")
+        repository.create_account(conn, "acc-1", "Картка", "alice")
+        repository.create_account(conn, "acc-2", "Готівка", "alice")
+        # По транзакції на місяць з 2021 року; імпорт 2024 року приносить і стару дату з більшим номером
+        repository.add_transactions_many(conn, [
+            ("acc-1", "income" if month % 3 else "expense", 1000 + month, f"Платіж {year}-{month:02d}",
+             f"{year}-{month:02d}-10T12:00:00", "alice", f"h-{year}-{month}")
+            for year in (2021, 2022, 2023, 2024) for month in range(1, 13)
+        ] + [("acc-2", "expense", 700, "Стоматолог", "2022-05-01T09:00:00", "alice")])
+        repository.add_transactions_many(conn, [("acc-1", "income", 555, "Повернення", "2021-06-01T08:00:00",
+                                                 "alice")])
+    yield store
+    store.close()
+
+
+def all_rows(store, history_filter=None):
+    window = pagination.HistoryWindow(store.connect, "acc-1", page_size=5, max_pages=100,
+                                      history_filter=history_filter)
+    rows = window.load_first()
+    while window.has_older:
+        rows += window.load_older()
+    return rows
+
+
+def test_archive_moves_old_years_and_keeps_balances(store, tmp_path):
+    """Старі роки йдуть у файли архіву, баланси й перевірка не змінюються, історія та експорт бачать усе."""
+    with store.connect() as conn:
+        balances = {account_id: repository.get_balance(conn, account_id) for account_id in ("acc-1", "acc-2")}
+    before = [row["transaction_id"] for row in all_rows(store)]
+
+    report = archiver.archive_before(store, date(2023, 1, 1))
+    assert report["years"] == {2021: 13, 2022: 13} and report["transactions"] == 26
+    assert (tmp_path / "budget-archive-2021.db").exists() and (tmp_path / "budget-archive-2022.db").exists()
+    assert archiver.archive_before(store, date(2023, 1, 1))["transactions"] == 0
+
+    with store.connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transactions WHERE ts < strftime('%s', '2023-01-01')"
+                            ).fetchone()[0] == 0
+        for account_id, balance in balances.items():
+            assert repository.get_balance(conn, account_id) == balance == ledger.full_balance(conn, account_id)
+            assert ledger.verify_account(conn, account_id) == []
+        assert repository.existing_import_hashes(conn, ["h-2021-1", "h-2024-1", "x"]) == {"h-2021-1", "h-2024-1"}
+    assert [row["transaction_id"] for row in all_rows(store)] == before
+    amount_sorted = all_rows(store, pagination.HistoryFilter(sort="amount", descending=False))
+    assert [row["amount"] for row in amount_sorted] == sorted(row["amount"] for row in amount_sorted)
+    assert len(amount_sorted) == len(before)
+
+    with store.connect() as conn:
+        rows, has_more = search.search_transactions(conn, ["acc-1", "acc-2"], "стомат")
+        assert [row["account_name"] for row in rows] == ["Готівка"] and not has_more
+        page, has_more = search.search_transactions(conn, ["acc-1"], "платіж", page_size=30)
+        assert has_more and page[-1]["description"] == "Платіж 2022-07"
+
+    batches = list(exporter.iter_batches(store.connect, ["acc-1"], batch_size=7))
+    exported = [row[3] for batch in batches for row in batch]
+    assert len(exported) == 49 and exported == sorted(exported)
+
+
+def test_recent_pages_do_not_attach_archive(store):
+    """Перші сторінки історії й пошуку читаються лише з робочої БД; файл року підключається, коли до нього дійшли."""
+    archiver.archive_before(store, date(2023, 1, 1))
+    conn = sqlite3.connect(store.path, factory=db.TimedConnection)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows, has_older = pagination.fetch_older(conn, "acc-1", page_size=10)
+        assert has_older and rows[-1]["description"] == "Платіж 2024-03"
+        search.search_transactions(conn, ["acc-1"], "платіж", page_size=10)
+        assert [row[1] for row in conn.execute("PRAGMA database_list")] == ["main"]
+
+        rows, _ = pagination.fetch_older(conn, "acc-1", page_size=3, after=(rows[-1]["ts"], 10 ** 9),
+                                         history_filter=pagination.HistoryFilter(date_to=date(2022, 12, 31)))
+        assert [row["description"] for row in rows] == ["Платіж 2022-12", "Платіж 2022-11", "Платіж 2022-10"]
+        assert [row[1] for row in conn.execute("PRAGMA database_list")] == ["main", "temp", "archive_2022"]
+    finally:
+        conn.close()
+
+
+def test_archived_transaction_edit_delete_and_account_removal(store):
+    """Зміна й видалення архівної транзакції змінюють баланс через контрольні точки; видалення рахунку чистить архів."""
+    archiver.archive_before(store, date(2023, 1, 1))
+    with store.connect() as conn:
+        rows, _ = search.search_transactions(conn, ["acc-1"], "платіж", date_to=date(2021, 1, 31))
+        balance = repository.get_balance(conn, "acc-1")
+    tx = rows[0]
+    assert tx["type"] == "income"
+
+    updated, new_balance = store.run_write(repository.update_transaction, tx["transaction_id"], tx["amount"] + 50,
+                                           "Виправлено")
+    assert updated["description"] == "Виправлено" and new_balance == balance + 50
+    assert store.run_write(repository.delete_transaction, tx["transaction_id"]) == balance - tx["amount"]
+    with store.connect() as conn:
+        assert repository.get_transaction(conn, tx["transaction_id"]) is None
+        assert ledger.verify_account(conn, "acc-1") == []
+        assert search.search_transactions(conn, ["acc-1"], "виправлено")[0] == []
+
+    store.run_write(repository.delete_account, "acc-1")
+    with store.connect() as conn:
+        counts = [conn.execute(f"SELECT COUNT(*) FROM {source.table} WHERE account_id = ?", ("acc-1",)).fetchone()[0]
+                  for source in [archive.HOT, *archive.sources(conn)]]
+        assert counts == [0, 0, 0]
+        assert repository.get_balance(conn, "acc-2") == -700 == ledger.full_balance(conn, "acc-2")
+
+
+def test_rebuilt_rollups_cover_archived_years(store):
+    """Перерахунок підсумків після архівації враховує роки архіву, тож звіти за них не зникають."""
+    with store.connect() as conn:
+        before = rollups.monthly_report(conn, ["acc-1", "acc-2"], "2021-01")
+    archiver.archive_before(store, date(2023, 1, 1))
+    store.run_write(rollups.rebuild)
+    with store.connect() as conn:
+        assert rollups.monthly_report(conn, ["acc-1", "acc-2"], "2021-01") == before
+    store.run_write(rollups.rebuild, ["acc-2"])
+    with store.connect() as conn:
+        assert rollups.account_report(conn, ["acc-2"], "2022-01") == [
+            {"key": "acc-2", "income": 0, "expense": 700, "count": 1}]
+        assert rollups.monthly_report(conn, ["acc-1", "acc-2"], "2021-01") == before
+
+
+def test_interrupted_run_is_invisible_and_redone(store):
+    """Партія, скопійована в архів без завершення, не видна і не дублює рядки; наступний запуск її переносить."""
+    with store.connect(query_timeout=None) as conn:
+        path = f"{store.path[:-3]}-archive-2021.db"
+        archive.create_file(path)
+        archive.attach_file(conn, 2021, path)
+        lo, hi = 0, archiver.records.date_to_ts(date(2022, 1, 1))
+        assert archiver._copy_year(conn, "archive_2021", 0, 1, lo, hi) == 13
+    assert len(all_rows(store)) == 49
+
+    assert archiver.archive_before(store, date(2022, 1, 1))["years"] == {2021: 13}
+    with store.connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM archive_2021.transactions").fetchone()[0] == 13
+    assert len(all_rows(store)) == 49
+
+
+def test_horizon_counts_whole_months():
+    """Горизонт - перший день місяця за задану кількість місяців до поточного."""
+    assert archiver.horizon(date(2024, 3, 15), months=24) == date(2022, 3, 1)
+    assert archiver.horizon(date(2024, 1, 31), months=1) == date(2023, 12, 1)
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+import auth
+import repository
+import storage
+
+
+@pytest.fixture(autouse=True)
+def cheap_scrypt(monkeypatch):
+    # Малий n, щоб тести не чекали на справжню вартість scrypt
+    monkeypatch.setattr(auth, "SCRYPT_N", 2 ** 4)
+    monkeypatch.setattr(auth, "_dummy_hash", None)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = storage.SQLiteStorage(str(tmp_path / "budget.db"))
+    store.configure()
+    store.migrate()
+    yield store
+    store.close()
+
+
+def test_hash_and_verify():
+    """Хеш має формат scrypt$n$r$p$сіль$хеш, з різною сіллю, і перевіряється лише правильним паролем."""
+    stored = auth.hash_password("password123")
+    assert stored.startswith(f"scrypt${2 ** 4}$")
+    assert stored != auth.hash_password("password123")
+    assert auth.verify_password("password123", stored)
+    assert not auth.verify_password("password124", stored)
+    assert not auth.needs_rehash(stored)
+    assert auth.needs_rehash(auth.hash_password("password123", n=2 ** 5))
+
+
+def test_login_upgrades_plaintext_password(store):
+    """Пароль, збережений відкритим текстом, після успішного входу замінюється хешем."""
+    with store.connect() as conn:
+        repository.create_user(conn, "alice", "password123")
+    assert not auth.login(store, "alice", "wrong")
+    assert auth.login(store, "alice", "password123")
+    with store.connect() as conn:
+        stored = repository.get_user(conn, "alice")["password"]
+    assert stored.startswith("scrypt$") and auth.verify_password("password123", stored)
+    assert auth.login(store, "alice", "password123")
+    assert not auth.login(store, "nobody", "password123")
+
+
+def test_register_stores_hash(store):
+    """Реєстрація зберігає хеш і не дає зайняти наявне ім'я."""
+    assert auth.register(store, "bob", "password123")
+    assert not auth.register(store, "bob", "other")
+    with store.connect() as conn:
+        assert repository.get_user(conn, "bob")["password"] != "password123"
+    assert auth.login(store, "bob", "password123")
+
+
+def test_hash_pool_rejects_when_full():
+    """Коли зайняті всі потоки й місця в черзі, submit відмовляє одразу, а не ставить у чергу."""
+    pool = auth.HashPool(workers=1, queue_size=1)
+    release = threading.Event()
+    try:
+        first = pool.submit(release.wait)
+        second = pool.submit(lambda: 42)
+        with pytest.raises(auth.AuthBusyError):
+            pool.submit(lambda: 0)
+        assert pool.rejected == 1
+        release.set()
+        assert first.result(timeout=5) and second.result(timeout=5) == 42
+        assert pool.run(lambda: 7, timeout=5) == 7
+    finally:
+        release.set()
+        pool.close()
+
+
+def test_rate_limiter_sliding_window():
+    """Після limit спроб за вікно ключ блокується, а з часом або після reset знову пускає."""
+    now = [0.0]
+    limiter = auth.RateLimiter(limit=2, window=60, clock=lambda: now[0])
+    limiter.hit("ip:1", "user:alice")
+    limiter.hit("ip:1", "user:alice")
+    with pytest.raises(auth.RateLimitedError):
+        limiter.hit("ip:1", "user:bob")
+    limiter.hit("ip:2", "user:bob")
+    limiter.reset("user:alice")
+    with pytest.raises(auth.RateLimitedError):
+        limiter.hit("ip:1", "user:alice")
+    now[0] = 61
+    limiter.hit("ip:1", "user:alice")
@@ -0,0 +1,117 @@
+import gzip
+import sqlite3
+import threading
+from datetime import date
+
+import pytest
+
+import archiver
+import backup
+import ledger
+import metrics
+import pagination
+import repository
+import storage
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = storage.SQLiteStorage(str(tmp_path / "budget.db"))
+    store.configure()
+    store.migrate()
+    with store.connect() as conn:
+        repository.create_user(conn, "alice", "password123")
+        repository.create_account(conn, "acc-1", "Картка", "alice")
+        repository.add_transactions_many(conn, [
+            ("acc-1", "income", 1000 + i, f"Платіж {i} " + "x" * 200, f"{2021 + i % 4}-{i % 12 + 1:02d}-10T12:00:00",
+             "alice") for i in range(2000)
+        ])
+    yield store
+    store.close()
+
+
+def snapshot_file(tmp_path, report, name="budget.db"):
+    return str(tmp_path / "backups" / report["snapshot"] / name)
+
+
+def test_backup_is_consistent_while_writes_continue(store, tmp_path):
+    """Знімок під час записів - цілісний стан БД на початок копіювання; записи не чекають на копію."""
+    stop = threading.Event()
+    writes = []
+
+    def write():
+        while not stop.is_set():
+            writes.append(store.run_write(repository.add_transaction, "acc-1", "expense", 1, "Кава",
+                                          "2024-06-01T08:00:00", "alice"))
+
+    writer = threading.Thread(target=write)
+    running = metrics.write_seconds.count("running")
+    writer.start()
+    try:
+        report = backup.create_backup(store.path, pages=5, sleep=0.002)
+    finally:
+        stop.set()
+        writer.join()
+    assert writes and metrics.write_seconds.count("running") > running
+    assert report["files"] == ["budget.db"] and report["pages"] > 5
+
+    path = snapshot_file(tmp_path, report)
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        count = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        assert 2000 <= count < 2000 + len(writes)
+        assert ledger.verify_account(conn, "acc-1") == []
+    finally:
+        conn.close()
+    assert backup.list_snapshots(store.path) == [report["snapshot"]]
+
+
+def test_compression_and_retention(store, tmp_path):
+    """Стиснені знімки займають менше; зберігаються лише keep останніх, від новіших."""
+    reports = [backup.create_backup(store.path, compress=True, keep=2, sleep=0) for _ in range(3)]
+    assert reports[-1]["removed"] == [reports[0]["snapshot"]]
+    assert backup.list_snapshots(store.path) == [reports[2]["snapshot"], reports[1]["snapshot"]]
+
+    path = snapshot_file(tmp_path, reports[2], "budget.db.gz")
+    with gzip.open(path, "rb") as f:
+        assert f.read(16) == b"SQLite format 3\x00"
+    assert reports[2]["bytes"] < reports[2]["pages"] * 4096 / 2
+    assert not list((tmp_path / "backups").glob("*.part"))
+
+
+def test_restore_brings_back_database_and_archive(store, tmp_path):
+    """Відновлення повертає БД і річні файли архіву на момент знімка."""
+    archiver.archive_before(store, date(2023, 1, 1))
+    report = backup.create_backup(store.path, sleep=0)
+    assert report["files"] == ["budget.db", "budget-archive-2021.db", "budget-archive-2022.db"]
+    with store.connect() as conn:
+        balance = repository.get_balance(conn, "acc-1")
+
+    store.run_write(repository.delete_account, "acc-1")
+    store.close()
+    (tmp_path / "budget-archive-2021.db").unlink()
+
+    assert backup.restore_backup(report["snapshot"], store.path) == report["files"]
+    with store.connect() as conn:
+        assert repository.get_balance(conn, "acc-1") == balance == ledger.full_balance(conn, "acc-1")
+    window = pagination.HistoryWindow(store.connect, "acc-1", page_size=500, max_pages=100)
+    rows = window.load_first()
+    while window.has_older:
+        rows += window.load_older()
+    assert len(rows) == 2000
+
+
+def test_restore_rejects_damaged_snapshot(store, tmp_path):
+    """Пошкоджений знімок не відновлюється, і робоча БД лишається як була."""
+    report = backup.create_backup(store.path, sleep=0)
+    with open(snapshot_file(tmp_path, report), "r+b") as f:
+        f.seek(4096)
+        f.write(b"\xff" * 8192)
+    with pytest.raises(backup.BackupError):
+        backup.restore_backup(report["snapshot"], store.path)
+    with store.connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 2000
+    with pytest.raises(backup.BackupError):
+        backup.restore_backup("budget-20000101-000000", store.path)
@@ -0,0 +1,43 @@
+import json
+
+import ledger
+import repository
+from benchmarks import run, seed
+
+
+def test_percentile_nearest_rank():
+    """Перцентилі рахуються методом найближчого рангу."""
+    values = [i / 1000 for i in range(1, 101)]
+    assert run.percentile(values, 50) == 0.05
+    assert run.percentile(values, 99) == 0.099
+    assert run.summarize([])["count"] == 0
+
+
+def test_seed_creates_consistent_database(tmp_path):
+    """Засіяна БД має задану кількість транзакцій і баланси, що збігаються з їх сумою."""
+    import sqlite3
+    db_file = str(tmp_path / "seed.db")
+    info = seed.seed(db_file, users=4, accounts_per_user=2, transactions=500)
+    assert info["transactions"] == 500
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 500
+    conn.row_factory = sqlite3.Row
+    mismatches = [m for (account_id,) in conn.execute("SELECT account_id FROM accounts")
+                  for m in ledger.verify_account(conn, account_id)]
+    balances = {row["account_id"]: row["balance"] for row in repository.get_accounts(
+        conn, [row[0] for row in conn.execute("SELECT account_id FROM accounts")])}
+    assert balances == {account_id: ledger.full_balance(conn, account_id) for account_id in balances}
+    conn.close()
+    assert mismatches == []
+
+
+def test_run_emits_json_report(tmp_path):
+    """Повний прогін на маленькій БД дає JSON з p50/p95/p99 для кожного сценарію."""
+    report = run.run(str(tmp_path / "bench.db"), users=4, accounts_per_user=2, transactions=200,
+                     iterations=5, sessions=2, session_iterations=5)
+    json.dumps(report)
+    for name, _ in run.SCENARIOS:
+        assert {"p50_ms", "p95_ms", "p99_ms"} <= set(report["results"][name])
+    assert report["history_rows"]["rows"] > 0 and report["history_rows"]["bytes_per_row"] > 0
+    assert report["concurrent"]["errors"] == []
+    assert report["concurrent"]["operations"] == 10
@@ -0,0 +1,91 @@
+import pytest
+
+from cache import BudgetCache, LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_evicts_least_recently_used():
+    """При переповненні витісняється запис, який найдовше не читали."""
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl():
+    """Запис старший за TTL вважається відсутнім."""
+    clock = FakeClock()
+    cache = LRUCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5.0
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_hit_rate_counters():
+    """Лічильники влучань і промахів рахують кожен запит."""
+    cache = LRUCache(maxsize=10, ttl=60)
+    loads = []
+    for _ in range(4):
+        cache.get_or_load("a", lambda: loads.append(1) or "value")
+    stats = cache.stats()
+    assert len(loads) == 1
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+    assert stats["hit_rate"] == pytest.approx(0.75)
+
+
+def test_invalid_size_rejected():
+    """Кеш нульового розміру не створюється."""
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
+
+
+def test_account_write_invalidates_linked_homes():
+    """Запис у рахунок скидає і рахунок, і головні сторінки всіх його учасників."""
+    cache = BudgetCache(maxsize=10, ttl=60)
+    cache.get_home("alice", lambda: {"account_ids": ["acc"], "accounts": ["old"]})
+    cache.get_home("bob", lambda: {"account_ids": ["acc", "other"], "accounts": ["old"]})
+    cache.get_home("carol", lambda: {"account_ids": ["other"], "accounts": ["old"]})
+    cache.get_account("acc", lambda: "old")
+
+    cache.invalidate_account("acc")
+
+    assert cache.get_account("acc", lambda: "new") == "new"
+    assert cache.get_home("alice", lambda: {"account_ids": ["acc"], "accounts": ["new"]})["accounts"] == ["new"]
+    assert cache.get_home("bob", lambda: {"account_ids": ["acc"], "accounts": ["new"]})["accounts"] == ["new"]
+    assert cache.get_home("carol", lambda: {"account_ids": [], "accounts": ["new"]})["accounts"] == ["old"]
+
+
+def test_value_loaded_during_write_is_not_cached():
+    """Значення, прочитане до інвалідації, не потрапляє в кеш після неї."""
+    cache = BudgetCache(maxsize=10, ttl=60)
+
+    def stale_loader():
+        cache.invalidate_account("acc")
+        return "stale"
+
+    assert cache.get_account("acc", stale_loader) == "stale"
+    assert cache.get_account("acc", lambda: "fresh") == "fresh"
+
+
+def test_disabled_cache_always_loads():
+    """Вимкнений кеш (кілька воркерів) щоразу читає свіже значення."""
+    cache = BudgetCache(maxsize=10, ttl=60, enabled=False)
+    values = iter(["old", "new"])
+    assert cache.get_account("acc", lambda: next(values)) == "old"
+    assert cache.get_account("acc", lambda: next(values)) == "new"
+    assert cache.get_home("alice", lambda: {"account_ids": ["acc"]}) == {"account_ids": ["acc"]}
+    assert len(cache.accounts) == len(cache.homes) == 0
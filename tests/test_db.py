@@ -0,0 +1,231 @@
+import threading
+import time
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def pool(tmp_path):
+    p = db.ConnectionPool(str(tmp_path / "test.db"), size=2, timeout=0.2)
+    yield p
+    p.close()
+
+
+def test_pool_reuses_connection(pool):
+    """Повторний запит з'єднання бере його з пулу, а не відкриває нове."""
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    stats = pool.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["opened"] == 1
+
+
+def test_pool_respects_size(pool):
+    """Пул не відкриває більше з'єднань, ніж дозволяє розмір."""
+    a = pool.acquire()
+    b = pool.acquire()
+    with pytest.raises(db.PoolTimeoutError):
+        pool.acquire()
+    pool.release(a)
+    pool.release(b)
+    stats = pool.stats()
+    assert stats["opened"] == 2
+    assert stats["waits"] == 1
+
+
+def test_pool_waits_for_released_connection(pool):
+    """Якщо всі з'єднання зайняті, запит чекає на звільнене."""
+    a = pool.acquire()
+    b = pool.acquire()
+    timer = threading.Timer(0.05, pool.release, args=(a,))
+    timer.start()
+    c = pool.acquire()
+    timer.join()
+    assert c is a
+    assert pool.stats()["waits"] == 1
+    pool.release(b)
+    pool.release(c)
+
+
+def test_pool_rolls_back_unfinished_transaction(pool):
+    """Незакомічені зміни не переходять до наступного користувача з'єднання."""
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_closed_pool_rejects_acquire(pool):
+    """Після закриття пул не видає з'єднань."""
+    pool.close()
+    with pytest.raises(db.PoolClosedError):
+        pool.acquire()
+
+
+def test_connect_commits_and_returns_to_pool(tmp_path):
+    """db.connect() комітить зміни і повертає з'єднання в спільний пул."""
+    db_file = str(tmp_path / "shared.db")
+    try:
+        with db.connect(db_file) as conn:
+            conn.execute("CREATE TABLE t (x INTEGER)")
+            conn.execute("INSERT INTO t VALUES (1)")
+        with db.connect(db_file) as conn:
+            assert conn.execute("SELECT x FROM t").fetchone()["x"] == 1
+        assert db.get_pool(db_file).stats()["hits"] >= 1
+    finally:
+        db.close_pool()
+
+
+def test_load_db_config_defaults():
+    """Без файлу і змінних середовища використовується WAL і типові PRAGMA."""
+    config = db.load_db_config(environ={})
+    assert config == db.DEFAULT_DB_CONFIG
+
+
+def test_load_db_config_file_and_env(tmp_path):
+    """Змінні середовища мають пріоритет над файлом налаштувань."""
+    path = tmp_path / "db.json"
+    path.write_text('{"synchronous": "full", "busy_timeout": 1000}', encoding="utf-8")
+    config = db.load_db_config(str(path), environ={"BUDGET_DB_BUSY_TIMEOUT": "2500"})
+    assert config["synchronous"] == "FULL"
+    assert config["busy_timeout"] == 2500
+    assert config["journal_mode"] == "WAL"
+
+
+def test_load_db_config_rejects_bad_values(tmp_path):
+    """Невідомі параметри та режими відхиляються."""
+    path = tmp_path / "db.json"
+    path.write_text('{"page_size": 4096}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        db.load_db_config(str(path), environ={})
+    with pytest.raises(ValueError):
+        db.load_db_config(environ={"BUDGET_DB_JOURNAL_MODE": "WAL; DROP TABLE users"})
+
+
+def test_configure_enables_wal_and_pragmas(tmp_path):
+    """configure() вмикає WAL, а нові з'єднання пулу отримують PRAGMA."""
+    db_file = str(tmp_path / "wal.db")
+    config = db.load_db_config(environ={"BUDGET_DB_BUSY_TIMEOUT": "1234"})
+    try:
+        assert db.configure(db_file, config).lower() == "wal"
+        with db.connect(db_file) as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+    finally:
+        db.close_pool()
+
+
+def test_write_queue_serializes_writes(tmp_path):
+    """Записи з кількох потоків проходять через одну чергу без 'database is locked'."""
+    db_file = str(tmp_path / "writer.db")
+    with db.connect(db_file) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    writer = db.WriteQueue(db_file)
+
+    def insert(conn, value):
+        conn.execute("INSERT INTO t VALUES (?)", (value,))
+        return value
+
+    threads = [threading.Thread(target=writer.run, args=(insert, i)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writer.close()
+    try:
+        with db.connect(db_file) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 20
+    finally:
+        db.close_pool()
+
+
+def test_write_queue_propagates_errors_and_rolls_back(tmp_path):
+    """Помилка в записі повертається викликачу, а транзакція відкочується."""
+    db_file = str(tmp_path / "writer.db")
+    writer = db.WriteQueue(db_file)
+    writer.run(lambda conn: conn.execute("CREATE TABLE t (x INTEGER)"))
+
+    def failing(conn):
+        conn.execute("INSERT INTO t VALUES (1)")
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        writer.run(failing)
+    count = writer.run(lambda conn: conn.execute("SELECT COUNT(*) FROM t").fetchone()[0])
+    writer.close()
+    assert count == 0
+
+
+SLOW_QUERY = """
+    WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 1000000000)
+    SELECT COUNT(*) FROM n
+"""
+
+
+def test_connect_interrupts_slow_query(tmp_path):
+    """Запит, довший за query_timeout, переривається, а з'єднання лишається робочим."""
+    db_file = str(tmp_path / "slow.db")
+    try:
+        with pytest.raises(db.QueryTimeoutError):
+            with db.connect(db_file, query_timeout=0.05) as conn:
+                conn.execute(SLOW_QUERY).fetchone()
+        with db.connect(db_file, query_timeout=0.05) as conn:
+            assert conn.execute("SELECT 1").fetchone()[0] == 1
+            assert not conn.timed_out
+    finally:
+        db.close_pool()
+
+
+def test_query_timeout_applies_per_statement(tmp_path):
+    """Обмеження часу відраховується від кожного запиту, а не від початку блоку."""
+    db_file = str(tmp_path / "steps.db")
+    try:
+        with db.connect(db_file, query_timeout=0.2) as conn:
+            for _ in range(3):
+                time.sleep(0.1)
+                assert conn.execute("SELECT 1").fetchone()[0] == 1
+    finally:
+        db.close_pool()
+
+
+def test_submit_runs_in_background_thread(tmp_path):
+    """db.submit() виконує функцію в окремому потоці і повертає Future."""
+    db_file = str(tmp_path / "bg.db")
+
+    def work():
+        with db.connect(db_file) as conn:
+            return threading.current_thread().name, conn.execute("SELECT 42").fetchone()[0]
+
+    try:
+        name, value = db.submit(work).result(timeout=5)
+        assert value == 42
+        assert name.startswith("budget-db") and name != threading.current_thread().name
+    finally:
+        db.close_pool()
+
+
+def test_write_queue_run_times_out(tmp_path):
+    """Якщо черга запису зайнята, run() з timeout повертає QueryTimeoutError, а не чекає без кінця."""
+    writer = db.WriteQueue(str(tmp_path / "busy.db"))
+    started = threading.Event()
+
+    def slow(conn):
+        started.set()
+        time.sleep(0.3)
+
+    try:
+        blocker = writer.submit(slow)
+        started.wait(1)
+        with pytest.raises(db.QueryTimeoutError):
+            writer.run(lambda conn: 1, timeout=0.05)
+        blocker.result(timeout=5)
+    finally:
+        writer.close()
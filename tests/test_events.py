@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+import events
+
+
+class FakePubSub:
+    # Спрощений аналог PubSubHub з Flet: спільні топіки для всіх сесій процесу
+    def __init__(self, hub):
+        self.hub = hub
+        self.topics = {}
+
+    def subscribe_topic(self, topic, handler):
+        self.topics[topic] = handler
+        self.hub.setdefault(topic, []).append(handler)
+
+    def unsubscribe_topic(self, topic):
+        handler = self.topics.pop(topic, None)
+        if handler in self.hub.get(topic, []):
+            self.hub[topic].remove(handler)
+
+    def send_all_on_topic(self, topic, message):
+        for handler in list(self.hub.get(topic, [])):
+            handler(topic, message)
+
+
+@pytest.fixture
+def buses():
+    hub = {}
+    return [events.AccountEventBus(FakePubSub(hub), f"session-{i}") for i in range(3)]
+
+
+def test_event_reaches_other_sessions_on_same_account(buses):
+    """Подію отримують інші сесії, що переглядають той самий рахунок."""
+    alice, bob, carol = buses
+    received = {"bob": [], "carol": []}
+    bob.watch("acc-1", received["bob"].append)
+    carol.watch("acc-2", received["carol"].append)
+    alice.publish(events.BALANCE_CHANGED, "acc-1", balance=10.0)
+    assert [e.payload["balance"] for e in received["bob"]] == [10.0]
+    assert received["carol"] == []
+
+
+def test_publisher_does_not_receive_own_event(buses):
+    """Сесія не отримує власні події - зміну вона вже застосувала."""
+    alice = buses[0]
+    received = []
+    alice.watch("acc-1", received.append)
+    alice.publish(events.ACCOUNT_RENAMED, "acc-1", name="Новий")
+    assert received == []
+
+
+def test_watch_switches_account(buses):
+    """Після переходу на інший рахунок події старого не приходять."""
+    alice, bob, _ = buses
+    received = []
+    bob.watch("acc-1", received.append)
+    bob.watch("acc-2", received.append)
+    alice.publish(events.ACCOUNT_DELETED, "acc-1")
+    alice.publish(events.ACCOUNT_DELETED, "acc-2")
+    assert [e.account_id for e in received] == ["acc-2"]
+    bob.unwatch()
+    alice.publish(events.ACCOUNT_DELETED, "acc-2")
+    assert len(received) == 1
+
+
+def test_rows_are_sent_as_dicts(buses):
+    """sqlite3.Row у події перетворюється на словник."""
+    alice, bob, _ = buses
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT 1 AS transaction_id, 'income' AS type").fetchone()
+    received = []
+    bob.watch("acc-1", received.append)
+    alice.publish(events.TRANSACTION_ADDED, "acc-1", transaction=row, balance=1.0)
+    assert received[0].payload["transaction"] == {"transaction_id": 1, "type": "income"}
+    conn.close()
+
+
+def test_unknown_event_kind_rejected(buses):
+    """Невідомий тип події відхиляється."""
+    with pytest.raises(ValueError):
+        buses[0].publish("something_else", "acc-1")
@@ -0,0 +1,98 @@
+import contextlib
+import csv
+import io
+import sqlite3
+
+import pytest
+
+import exporter
+import migrations
+import repository
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    repository.create_user(conn, "alice", "password123")
+    repository.create_account(conn, "acc-1", "Картка", "alice")
+    repository.create_account(conn, "acc-2", "Готівка", "alice")
+    repository.add_transactions_many(conn, [
+        ("acc-1", "income", 10000 + i * 100, f"Дохід {i}", f"2024-03-{i % 28 + 1:02d}T10:00:00", "alice")
+        for i in range(23)
+    ] + [("acc-2", "expense", 500, "Кава", "2024-01-01T09:00:00", "alice")])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def connect(conn):
+    queries = []
+
+    @contextlib.contextmanager
+    def connect():
+        queries.append(1)
+        yield conn
+
+    connect.queries = queries
+    return connect
+
+
+def test_batches_cover_history_in_order(conn, connect):
+    """Пачки фіксованого розміру покривають усю історію в хронологічному порядку без повторів."""
+    batches = list(exporter.iter_batches(connect, ["acc-1"], batch_size=5))
+    assert [len(b) for b in batches] == [5, 5, 5, 5, 3]
+    rows = [row for batch in batches for row in batch]
+    assert len({row[0] for row in rows}) == 23
+    keys = [(row[3], row[0]) for row in rows]
+    assert keys == sorted(keys)
+    assert rows[0][2] == "Картка"
+
+
+def test_export_csv_for_user_accounts(tmp_path, connect):
+    """Експорт користувача містить транзакції всіх його рахунків і рядок заголовка."""
+    path = tmp_path / "budget.csv"
+    account_ids = exporter.user_account_ids(connect, "alice")
+    count = exporter.export(connect, account_ids, str(path), "csv", batch_size=10)
+    assert count == 24
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert tuple(rows[0]) == exporter.EXPORT_COLUMNS
+    assert len(rows) == 25
+    assert {row[1] for row in rows[1:]} == {"acc-1", "acc-2"}
+
+
+def test_write_csv_streams_batches():
+    """write_csv не потребує списку: пачки можуть надходити з генератора."""
+    out = io.StringIO()
+    batches = ([(i, "acc", "Рахунок", "2024-01-01", "income", 1.0, "", "alice")] for i in range(3))
+    assert exporter.write_csv(batches, out) == 3
+    assert len(out.getvalue().splitlines()) == 4
+
+
+def test_unknown_format_rejected(tmp_path, connect):
+    """Невідомий формат дає ExportError, а не порожній файл."""
+    with pytest.raises(exporter.ExportError):
+        exporter.export(connect, ["acc-1"], str(tmp_path / "x.xlsx"), "xlsx")
+
+
+def test_export_to_dir_uses_random_folder(tmp_path, connect):
+    """Файл для завантаження кладеться в окрему теку з випадковою назвою, старі теки прибираються."""
+    relative_path, count = exporter.export_to_dir(connect, ["acc-2"], str(tmp_path), "account.csv")
+    token, name = relative_path.split("/")
+    assert name == "account.csv" and len(token) == 32 and count == 1
+    assert (tmp_path / token / name).exists()
+    exporter.cleanup_exports(str(tmp_path), max_age=0, now=(tmp_path / token).stat().st_mtime + 1)
+    assert not (tmp_path / token).exists()
+
+
+def test_export_parquet(tmp_path, connect):
+    """Parquet пишеться пачками як row groups (потребує pyarrow)."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "history.parquet"
+    assert exporter.export(connect, ["acc-1"], str(path), "parquet", batch_size=10) == 23
+    table = pq.read_table(path)
+    assert table.num_rows == 23
+    assert pq.ParquetFile(path).num_row_groups == 3
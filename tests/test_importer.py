@@ -0,0 +1,168 @@
+import io
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+import importer
+import migrations
+import repository
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    repository.create_user(conn, "alice", "password123")
+    repository.create_account(conn, "acc-1", "Картка", "alice")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def write(conn):
+    # Те саме, що db.run_write: fn(conn, *args) в одній транзакції
+    calls = []
+
+    def run(fn, *args):
+        calls.append(len(args[0]))
+        with conn:
+            return fn(conn, *args)
+
+    run.calls = calls
+    return run
+
+
+def transactions(conn):
+    return conn.execute("SELECT type, amount, description, timestamp FROM transactions "
+                        "ORDER BY transaction_id").fetchall()
+
+
+CSV_SEMICOLON = (
+    "Дата;Сума;Опис\n"
+    "01.03.2024;-150,50;Кава\n"
+    "02.03.2024;1 000,00;Зарплата\n"
+)
+
+
+def test_import_csv_with_signed_amounts(conn, write):
+    """Знак суми визначає тип операції, баланс оновлюється одним UPDATE на пачку."""
+    result = importer.import_file(write, io.StringIO(CSV_SEMICOLON), "acc-1", "alice")
+    assert result == {"processed": 2, "inserted": 2, "duplicates": 0, "error_count": 0, "errors": []}
+    rows = transactions(conn)
+    assert [(r["type"], r["amount"], r["description"]) for r in rows] == [
+        ("expense", 15050, "Кава"), ("income", 100000, "Зарплата")]
+    assert rows[0]["timestamp"] == "2024-03-01T00:00:00"
+    assert repository.get_balance(conn, "acc-1") == 84950
+
+
+def test_import_csv_with_type_column(conn, write):
+    """Колонка типу має пріоритет над знаком суми."""
+    data = "date,amount,type,description\n2024-03-01,200,expense,Оренда\n2024-03-02,50,income,\n"
+    importer.import_file(write, io.StringIO(data), "acc-1", "alice")
+    rows = transactions(conn)
+    assert [(r["type"], r["amount"], r["description"]) for r in rows] == [
+        ("expense", 20000, "Оренда"), ("income", 5000, "Дохід")]
+
+
+def test_reimport_skips_duplicates(conn, write):
+    """Повторний імпорт того самого файлу нічого не додає і не змінює баланс."""
+    importer.import_file(write, io.StringIO(CSV_SEMICOLON), "acc-1", "alice")
+    result = importer.import_file(write, io.StringIO(CSV_SEMICOLON), "acc-1", "alice")
+    assert result["inserted"] == 0 and result["duplicates"] == 2
+    assert len(transactions(conn)) == 2
+    assert repository.get_balance(conn, "acc-1") == 84950
+
+
+def test_identical_rows_in_one_file_are_kept(conn, write):
+    """Дві однакові операції в одному файлі - різні транзакції."""
+    data = "date,amount,description\n2024-03-01,-20,Проїзд\n2024-03-01,-20,Проїзд\n"
+    result = importer.import_file(write, io.StringIO(data), "acc-1", "alice")
+    assert result["inserted"] == 2
+    assert repository.get_balance(conn, "acc-1") == -4000
+
+
+def test_invalid_rows_are_reported(conn, write):
+    """Рядки з помилками пропускаються з номером рядка, решта імпортується."""
+    data = "date,amount,description\nвчора,-20,Проїзд\n2024-03-01,abc,Кава\n2024-03-02,10,Кешбек\n"
+    result = importer.import_file(write, io.StringIO(data), "acc-1", "alice")
+    assert result["inserted"] == 1
+    assert [line for line, _ in result["errors"]] == [2, 3]
+
+
+def test_only_first_errors_are_kept(conn, write):
+    """Повідомлення зберігаються лише для перших MAX_REPORTED_ERRORS рядків, решта помилок лише рахується."""
+    lines = ["date,amount,description"] + ["2024-03-01,abc,Кава"] * 50 + ["2024-03-02,10,Кешбек"]
+    result = importer.import_file(write, io.StringIO("\n".join(lines)), "acc-1", "alice")
+    assert result["inserted"] == 1 and result["error_count"] == 50
+    assert [line for line, _ in result["errors"]] == list(range(2, 2 + importer.MAX_REPORTED_ERRORS))
+
+
+def test_amount_allows_one_sign():
+    """Сума має не більше одного знака: "--5", "+-5" і "-+5" відхиляються."""
+    assert importer.parse_amount("-5") == ("expense", 500)
+    assert importer.parse_amount("+5") == ("income", 500)
+    for value in ("--5", "+-5", "-+5", "++5", "-"):
+        with pytest.raises(ValueError):
+            importer.parse_amount(value)
+
+
+def test_huge_amounts_are_row_errors(conn, write):
+    """Завеликі суми - помилки своїх рядків, а не зупинка всього імпорту."""
+    data = "date,amount,description\n2024-03-01,1e30,A\n2024-03-02,-1e20,B\n2024-03-03,10,C\n"
+    result = importer.import_file(write, io.StringIO(data), "acc-1", "alice")
+    assert result["inserted"] == 1
+    assert [line for line, _ in result["errors"]] == [2, 3]
+
+
+def test_missing_columns_raise(conn, write):
+    """CSV без обов'язкових колонок відхиляється."""
+    with pytest.raises(importer.StatementImportError):
+        importer.import_file(write, io.StringIO("foo,bar\n1,2\n"), "acc-1", "alice")
+
+
+def test_import_ofx_uses_fitid_for_dedup(conn, write):
+    """OFX розбирається потоково, а FITID робить повторний імпорт ідемпотентним."""
+    data = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240301120000<TRNAMT>-99.90<FITID>A1<NAME>Аптека</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20240302
+<TRNAMT>500.00
+<FITID>A2
+<MEMO>Переказ
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+    result = importer.import_file(write, io.StringIO(data), "acc-1", "alice", fmt="ofx")
+    assert result["inserted"] == 2
+    rows = transactions(conn)
+    assert [(r["type"], r["amount"], r["description"], r["timestamp"]) for r in rows] == [
+        ("expense", 9990, "Аптека", "2024-03-01T12:00:00"), ("income", 50000, "Переказ", "2024-03-02T00:00:00")]
+    again = importer.import_file(write, io.StringIO(data), "acc-1", "alice", fmt="ofx")
+    assert again["duplicates"] == 2
+
+
+def test_dates_with_offset_become_local_time():
+    """Час зі зсувом поясу зберігається місцевим часом без поясу, як і решта transactions.timestamp."""
+    local = datetime(2024, 3, 1, 10, 0, tzinfo=timezone.utc).astimezone().replace(tzinfo=None).isoformat()
+    assert importer.parse_date("2024-03-01T10:00:00Z") == local
+    assert importer.parse_date("2024-03-01T12:00:00+02:00") == local
+    assert importer.parse_ofx_date("20240301050000.000[-5:EST]") == local
+    assert importer.parse_date("2024-03-01 12:00") == "2024-03-01T12:00:00"
+    assert importer.parse_ofx_date("20240301[-5:EST]") == "2024-03-01T00:00:00"
+
+
+def test_import_is_chunked(conn, write):
+    """Файл записується пачками по chunk_size рядків."""
+    lines = ["date,amount,description"] + [f"2024-03-01,-{i + 1},Покупка {i}" for i in range(7)]
+    progress = []
+    result = importer.import_file(write, io.StringIO("\n".join(lines)), "acc-1", "alice", chunk_size=3,
+                                  progress=progress.append)
+    assert result["inserted"] == 7
+    assert write.calls == [3, 3, 1]
+    assert [state["inserted"] for state in progress] == [3, 6, 7]
+    assert repository.get_balance(conn, "acc-1") == -2800
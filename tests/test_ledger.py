@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+import db
+import ledger
+import migrations
+import repository
+import storage
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    repository.create_user(conn, "alice", "password123")
+    repository.create_account(conn, "acc-1", "Картка", "alice")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def add(conn, amount, trans_type="income"):
+    return repository.add_transaction(conn, "acc-1", trans_type, amount, "x", "alice")
+
+
+def checkpoints(conn):
+    return [tuple(row) for row in conn.execute(
+        "SELECT up_to_transaction_id, balance FROM balance_checkpoints WHERE account_id = 'acc-1' "
+        "ORDER BY up_to_transaction_id")]
+
+
+def test_checkpoint_written_every_interval(conn, monkeypatch):
+    """Контрольна точка з'являється кожні CHECKPOINT_INTERVAL транзакцій, баланс = точка + дельта."""
+    monkeypatch.setattr(ledger, "CHECKPOINT_INTERVAL", 3)
+    for _ in range(7):
+        add(conn, 100)
+    assert checkpoints(conn) == [(3, 300), (6, 600)]
+    assert ledger.balance_state(conn, "acc-1") == (7, 700, 1)
+
+
+def test_edit_and_delete_adjust_covered_checkpoints(conn, monkeypatch):
+    """Зміна транзакції, вже врахованої точкою, виправляє точку в тій самій транзакції БД."""
+    monkeypatch.setattr(ledger, "CHECKPOINT_INTERVAL", 2)
+    first, _ = add(conn, 1000)
+    add(conn, 500, "expense")
+    add(conn, 200)
+    _, balance = repository.update_transaction(conn, first["transaction_id"], 1500, "x")
+    assert balance == 1200
+    assert checkpoints(conn) == [(2, 1000)]
+    assert repository.delete_transaction(conn, first["transaction_id"]) == -300
+    assert ledger.verify_account(conn, "acc-1") == []
+    assert ledger.get_balance(conn, "acc-1") == ledger.full_balance(conn, "acc-1")
+
+
+def test_verify_reports_and_repair_fixes_mismatch(conn, monkeypatch):
+    """Перевірка знаходить зіпсовану точку, ремонт перебудовує її з транзакцій."""
+    monkeypatch.setattr(ledger, "CHECKPOINT_INTERVAL", 2)
+    for _ in range(4):
+        add(conn, 250)
+    conn.execute("UPDATE balance_checkpoints SET balance = balance + 1 WHERE up_to_transaction_id = 2")
+    mismatches = ledger.verify_account(conn, "acc-1")
+    assert mismatches == [{"account_id": "acc-1", "up_to_transaction_id": 2, "stored": 501, "actual": 500}]
+    assert "acc-1" in ledger.format_mismatch(mismatches[0])
+    assert ledger.repair_account(conn, "acc-1") == 1000
+    assert checkpoints(conn) == [(4, 1000)]
+    assert ledger.verify_account(conn, "acc-1") == []
+
+
+def test_account_without_transactions_has_zero_balance(conn):
+    """Новий рахунок без точок і транзакцій має нульовий баланс."""
+    assert repository.get_account(conn, "acc-1")["balance"] == 0
+    assert ledger.balance_state(conn, "acc-1") == (0, 0, 0)
+
+
+def test_verify_all_and_verifier_thread(tmp_path):
+    """verify_all перевіряє всі рахунки через пул; фоновий перевіряльник пише звіт."""
+    path = str(tmp_path / "ledger.db")
+    store = storage.SQLiteStorage(path)
+    store.configure()
+    try:
+        with db.connect(path) as conn:
+            migrations.migrate(conn)
+            repository.create_user(conn, "alice", "password123")
+            repository.create_account(conn, "acc-1", "Картка", "alice")
+            repository.add_transaction(conn, "acc-1", "income", 100, "x", "alice")
+            ledger.write_checkpoint(conn, "acc-1", 1, 999)
+        report = ledger.verify_all(store, repair=True)
+        assert report["accounts"] == 1 and len(report["mismatches"]) == 1 and report["repaired"]
+        assert ledger.verify_all(store)["mismatches"] == []
+
+        verifier = ledger.LedgerVerifier(store, interval=0.01).start()
+        try:
+            for _ in range(200):
+                if verifier.last_report is not None:
+                    break
+                verifier._stop.wait(0.01)
+        finally:
+            verifier.stop(timeout=5)
+        assert verifier.last_report["mismatches"] == []
+    finally:
+        db.close_pool()
@@ -0,0 +1,103 @@
+import logging
+import socket
+import sqlite3
+import urllib.request
+
+import flet as ft
+import pytest
+
+import db
+import metrics
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", factory=db.TimedConnection)
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO t (name) VALUES (?)", [(f"n{i}",) for i in range(5)])
+    yield conn
+    conn.close()
+
+
+def test_fingerprint_normalizes_literals_lists_and_branches():
+    """Літерали, довжина списку IN і кількість однакових гілок UNION ALL не створюють нових міток."""
+    one_id, text = metrics.fingerprint("SELECT * FROM t  WHERE id IN (?, ?) AND name = 'x' LIMIT 10")
+    assert text == "SELECT * FROM t WHERE id IN (?...) AND name = ? LIMIT ?"
+    assert metrics.fingerprint("SELECT * FROM t WHERE id IN (?,?,?) AND name = 'y' LIMIT 5")[0] == one_id
+    branch = "SELECT * FROM (SELECT * FROM t WHERE id = ? LIMIT ?) AS page{}"
+    two = " UNION ALL ".join(branch.format(i) for i in range(2)) + " ORDER BY id"
+    three = " UNION ALL ".join(branch.format(i) for i in range(3)) + " ORDER BY id"
+    assert metrics.fingerprint(two)[0] == metrics.fingerprint(three)[0]
+
+
+def test_histogram_renders_prometheus_text():
+    """Кошики гістограми накопичувальні, з +Inf, _count і _sum; значення в мітках екрануються."""
+    registry = metrics.Registry()
+    histogram = registry.histogram("h_seconds", "Час", ("view",), buckets=(0.1, 1))
+    counter = registry.counter("c_total", "Лічильник", ("sql",))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, "main")
+    counter.inc('a "b"', amount=2)
+    text = registry.render()
+    assert 'h_seconds_bucket{view="main",le="0.1"} 1' in text
+    assert 'h_seconds_bucket{view="main",le="1"} 2' in text
+    assert 'h_seconds_bucket{view="main",le="+Inf"} 3' in text
+    assert 'h_seconds_count{view="main"} 3' in text
+    assert 'c_total{sql="a \\"b\\""} 2' in text
+
+
+def test_connection_records_query_time_and_rows(conn, monkeypatch, caplog):
+    """Запит записується з рядками вибірки; недочитаний курсор - перед наступним запитом; повільний - у журнал."""
+    query_id, _ = metrics.fingerprint("SELECT * FROM t WHERE id > ?")
+    before = metrics.query_seconds.count(query_id)
+    rows_before = metrics.query_rows.value(query_id)
+    assert len(conn.execute("SELECT * FROM t WHERE id > ?", (0,)).fetchall()) == 5
+    assert [row["id"] for row in conn.execute("SELECT * FROM t WHERE id > ?", (3,))] == [4, 5]
+    assert conn.execute("SELECT * FROM t WHERE id > ?", (1,)).fetchone()["id"] == 2
+    assert metrics.query_seconds.count(query_id) == before + 2
+    conn.finish_query()
+    assert metrics.query_seconds.count(query_id) == before + 3
+    assert metrics.query_rows.value(query_id) == rows_before + 8
+
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="budget.slow_query"):
+        conn.execute("UPDATE t SET name = ? WHERE id <= ?", ("x", 2))
+        conn.finish_query()
+    assert '"event": "slow_query"' in caplog.text and '"rows": 2' in caplog.text
+
+
+def test_render_counts_controls_and_bytes():
+    """Показ вигляду рахує елементи дерева і байти змін, надісланих через з'єднання Flet."""
+    class FakeConnection:
+        def send_commands(self, session_id, commands):
+            return commands
+
+    connection = FakeConnection()
+    metrics.watch_connection(connection)
+    metrics.watch_connection(connection)
+    view = ft.Column([ft.Text("a"), ft.Row([ft.Text("b"), ft.Text("c")])])
+    before = metrics.view_update_seconds.count("test_view")
+    with metrics.render("test_view", view, build_seconds=0.01):
+        connection.send_commands("s", [{"n": "update", "v": ["x" * 100]}])
+    connection.send_commands("s", [{"n": "update", "v": ["not counted"]}])
+    assert metrics.count_controls(view) == 5
+    assert metrics.view_update_seconds.count("test_view") == before + 1
+    state = metrics.view_bytes._values[("test_view",)]
+    assert state[-1] > 100 and state[-1] < 200
+
+
+def test_http_endpoint_serves_metrics():
+    """/metrics віддає текст Prometheus, інші шляхи - 404."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = metrics.start_http_server(port=port)
+    try:
+        assert server is not None and metrics.start_http_server(port=port) is server
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+        assert "# TYPE budget_db_query_seconds histogram" in body
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other", timeout=5)
+    finally:
+        metrics.stop_http_server()
@@ -0,0 +1,157 @@
+import sqlite3
+
+import pytest
+
+import ledger
+import migrations
+import pagination
+import repository
+
+# Запити сторінки рахунку та головної сторінки
+ACCOUNT_HISTORY_SQL = pagination._FIRST_SQL
+PARTICIPANTS_SQL = repository.PARTICIPANTS_SQL
+USER_LINKS_SQL = repository.USER_ACCOUNT_IDS_SQL
+RECENT_SQL = repository.ACCOUNT_RECENT_SQL
+AUTHOR_SQL = "SELECT COUNT(*) FROM transactions WHERE user_username = ?"
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    yield conn
+    conn.close()
+
+
+def query_plan(conn, sql, params):
+    return [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def assert_no_full_scan(plan):
+    full_scans = [d for d in plan if d.startswith("SCAN")]
+    assert not full_scans, plan
+
+
+def test_migrate_sets_latest_version(conn):
+    """Після міграцій user_version дорівнює останній версії."""
+    assert migrations.get_version(conn) == migrations.latest_version()
+    assert migrations.latest_version() >= 4
+
+
+def test_migrate_is_idempotent(conn):
+    """Повторний запуск нічого не застосовує."""
+    assert migrations.migrate(conn) == []
+
+
+def test_migrate_upgrades_existing_database(tmp_path):
+    """Стара БД без user_version (таблиці вже є) отримує індекси."""
+    path = str(tmp_path / "old.db")
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE users (username TEXT PRIMARY KEY, password TEXT NOT NULL)")
+    old.execute("INSERT INTO users VALUES ('user', 'pass')")
+    old.commit()
+    applied = migrations.migrate(old)
+    assert [version for version, _ in applied] == [version for version, _, _ in migrations.MIGRATIONS]
+    indexes = {row[0] for row in old.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "idx_transactions_account_ts" in indexes
+    assert old.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+    old.close()
+
+
+def test_failed_migration_is_rolled_back(conn):
+    """Збій у міграції не змінює версію схеми."""
+    version = migrations.get_version(conn)
+    broken = migrations.MIGRATIONS + [(version + 1, "Зламана", [
+        "CREATE TABLE extra (x INTEGER)",
+        "SELECT * FROM missing_table",
+    ])]
+    with pytest.raises(sqlite3.OperationalError):
+        migrations.migrate(conn, broken)
+    assert migrations.get_version(conn) == version
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "extra" not in tables
+
+
+def test_account_history_uses_index_without_sort(conn):
+    """Історія рахунку читається з індексу без окремого сортування."""
+    plan = query_plan(conn, ACCOUNT_HISTORY_SQL, ("acc", 50))
+    assert_no_full_scan(plan)
+    assert any("idx_transactions_account_ts" in d for d in plan), plan
+    assert not any("TEMP B-TREE" in d for d in plan), plan
+
+
+def test_main_view_queries_use_indexes(conn):
+    """Запити головної сторінки та списку учасників не сканують таблиці повністю."""
+    assert_no_full_scan(query_plan(conn, USER_LINKS_SQL, ("user",)))
+    assert_no_full_scan(query_plan(conn, PARTICIPANTS_SQL, ("acc",)))
+    recent_plan = query_plan(conn, RECENT_SQL, ("acc", 10))
+    assert_no_full_scan(recent_plan)
+    assert not any("TEMP B-TREE" in d for d in recent_plan), recent_plan
+    assert_no_full_scan(query_plan(conn, AUTHOR_SQL, ("user",)))
+
+
+def test_export_batches_use_index_without_sort(conn):
+    """Пачки експорту читаються з індексу рахунку без сортування."""
+    plan = query_plan(conn, repository.EXPORT_BATCH_SQL.format(table="transactions"), ("acc", 0, 1, 5000))
+    assert_no_full_scan(plan)
+    assert any("idx_transactions_account_ts" in d for d in plan), plan
+    assert not any("TEMP B-TREE" in d for d in plan), plan
+
+
+def test_reports_read_rollups_by_primary_key(conn):
+    """Звіт по рахунку читає підсумки за первинним ключем, а не скануванням."""
+    sql = "SELECT period, type, SUM(total) FROM monthly_rollups WHERE account_id IN (?) AND period >= ? GROUP BY 1, 2"
+    assert_no_full_scan(query_plan(conn, sql, ("acc", "2024-01")))
+
+
+def test_minor_units_migration_converts_amounts_and_checkpoints():
+    """Міграція 7 переводить суми в копійки, створює контрольні точки і не повторює номери транзакцій."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn, [m for m in migrations.MIGRATIONS if m[0] < 7])
+    conn.execute("INSERT INTO accounts (account_id, name, balance, owner_username) VALUES ('acc', 'Рахунок', 0.3, 'u')")
+    for amount in (0.1, 0.2, 99.99):
+        conn.execute("INSERT INTO transactions (account_id, type, amount, description, timestamp, user_username) "
+                     "VALUES ('acc', 'income', ?, '', '2024-01-01T00:00:00', 'u')", (amount,))
+    conn.execute("DELETE FROM transactions WHERE amount = 99.99")
+    conn.commit()
+
+    migrations.migrate(conn)
+    assert [row[0] for row in conn.execute("SELECT amount FROM transactions ORDER BY transaction_id")] == [10, 20]
+    assert conn.execute("SELECT typeof(amount) FROM transactions LIMIT 1").fetchone()[0] == "integer"
+    assert tuple(conn.execute("SELECT up_to_transaction_id, balance FROM balance_checkpoints").fetchone()) == (2, 30)
+    assert "balance" not in {row["name"] for row in conn.execute("PRAGMA table_info(accounts)")}
+    cur = conn.execute("INSERT INTO transactions (account_id, type, amount, description, timestamp, user_username) "
+                       "VALUES ('acc', 'income', 1, '', '2024-01-02T00:00:00', 'u')")
+    assert cur.lastrowid == 4
+
+
+def test_checkpoint_delta_uses_account_index(conn):
+    """Дельта після контрольної точки читається діапазоном індексу (account_id, transaction_id)."""
+    plan = query_plan(conn, ledger.DELTA_SQL, ("acc", 100))
+    assert_no_full_scan(plan)
+    assert any("idx_transactions_account_id" in d for d in plan), plan
+
+
+def test_epoch_migration_keeps_rows_and_search():
+    """Міграція 11 додає ts до наявних транзакцій, зберігає лічильник номерів і пошук FTS."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn, [m for m in migrations.MIGRATIONS if m[0] < 11])
+    for i, timestamp in enumerate(("2024-01-01T10:15:00", "2024-01-02T00:00:00.250000", "2024-01-03T12:00:00")):
+        conn.execute("INSERT INTO transactions (account_id, type, amount, description, timestamp, user_username) "
+                     "VALUES ('acc', 'income', 1, ?, ?, 'u')", (f"Кава {i}", timestamp))
+    conn.execute("DELETE FROM transactions WHERE transaction_id = 3")
+    conn.commit()
+
+    migrations.migrate(conn)
+    assert [row[0] for row in conn.execute("SELECT ts FROM transactions ORDER BY transaction_id")] == \
+        [1704104100, 1704153600]
+    cur = conn.execute("INSERT INTO transactions (account_id, type, amount, description, timestamp, user_username) "
+                       "VALUES ('acc', 'income', 1, 'Чай', '2024-01-04T00:00:00', 'u')")
+    assert cur.lastrowid == 4
+    assert conn.execute("SELECT ts FROM transactions WHERE transaction_id = 4").fetchone()[0] == 1704326400
+    matches = conn.execute("SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH 'кава OR чай'")
+    assert sorted(row[0] for row in matches) == [1, 2, 4]
+
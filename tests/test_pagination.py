@@ -0,0 +1,212 @@
+import sqlite3
+from contextlib import contextmanager
+
+from datetime import date
+
+import pytest
+
+import migrations
+import pagination
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    # 25 транзакцій, частина з однаковим часом - перевіряємо розрив нічиїх за transaction_id
+    for i in range(25):
+        conn.execute(
+            "INSERT INTO transactions (account_id, type, amount, description, timestamp, user_username) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ("acc", "income", i + 1, f"tx {i}", f"2024-01-{1 + i // 3:02d}T10:00:00", "user"),
+        )
+    conn.execute(
+        "INSERT INTO transactions (account_id, type, amount, description, timestamp, user_username) "
+        "VALUES ('other', 'expense', 5, 'x', '2030-01-01T00:00:00', 'user')"
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def make_window(conn, page_size, max_pages, account_id="acc"):
+    @contextmanager
+    def connect():
+        yield conn
+    return pagination.HistoryWindow(connect, account_id, page_size=page_size, max_pages=max_pages)
+
+
+def all_ids(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT transaction_id FROM transactions WHERE account_id = 'acc' "
+        "ORDER BY timestamp DESC, transaction_id DESC")]
+
+
+def test_pages_cover_history_without_gaps(conn):
+    """Послідовні сторінки дають повну історію без пропусків і повторів."""
+    ids = []
+    rows, has_more = pagination.fetch_older(conn, "acc", 10)
+    ids += [r["transaction_id"] for r in rows]
+    while has_more:
+        rows, has_more = pagination.fetch_older(conn, "acc", 10, after=pagination.row_cursor(rows[-1]))
+        ids += [r["transaction_id"] for r in rows]
+    assert ids == all_ids(conn)
+
+
+def test_fetch_newer_returns_previous_page(conn):
+    """Сторінка «новіших» повертає ті самі рядки, що й попередня сторінка."""
+    first, _ = pagination.fetch_older(conn, "acc", 10)
+    second, _ = pagination.fetch_older(conn, "acc", 10, after=pagination.row_cursor(first[-1]))
+    back, has_newer = pagination.fetch_newer(conn, "acc", 10, before=pagination.row_cursor(second[0]))
+    assert [r["transaction_id"] for r in back] == [r["transaction_id"] for r in first]
+    assert has_newer is False
+
+
+def test_window_stays_bounded(conn):
+    """Вікно не тримає більше max_pages сторінок, навіть якщо прокрутити всю історію."""
+    window = make_window(conn, page_size=5, max_pages=2)
+    window.load_first()
+    while window.has_older:
+        window.load_older()
+        assert len(window.rows()) <= 10
+    assert window.has_newer is True
+    assert [r["transaction_id"] for r in window.rows()] == all_ids(conn)[-10:]
+
+
+def test_window_scrolls_back_to_newest(conn):
+    """Після прокрутки вниз можна повернутися до найновіших транзакцій."""
+    window = make_window(conn, page_size=5, max_pages=2)
+    window.load_first()
+    for _ in range(3):
+        window.load_older()
+    while window.has_newer:
+        window.load_newer()
+    assert [r["transaction_id"] for r in window.rows()] == all_ids(conn)[:10]
+    assert window.has_older is True
+
+
+def test_window_empty_account(conn):
+    """Порожній рахунок дає порожнє вікно."""
+    window = make_window(conn, 5, 2, account_id="missing")
+    assert window.load_first() == []
+    assert window.pages == [] and not window.has_older
+
+
+def test_keyset_query_uses_index(conn):
+    """Запит наступної сторінки читає індекс без сортування."""
+    plan = [row["detail"] for row in conn.execute(
+        "EXPLAIN QUERY PLAN " + pagination._OLDER_SQL, ("acc", 1704067200, 1, 51))]
+    assert any("idx_transactions_account_ts" in d for d in plan), plan
+    assert not any("TEMP B-TREE" in d for d in plan), plan
+
+
+def test_window_patches_follow_writes(conn):
+    """prepend/replace/remove змінюють вікно без повторного читання з БД."""
+    window = make_window(conn, page_size=5, max_pages=2)
+    window.load_first()
+    first = window.rows()[0]
+    new_row = {"transaction_id": 999, "ts": 4070908800}
+    assert window.prepend(new_row) is True
+    assert window.rows()[0] is new_row
+    edited = {"transaction_id": first["transaction_id"], "ts": first["ts"]}
+    assert window.replace(edited) is True
+    assert window.rows()[1] is edited
+    assert window.remove(999) is True
+    assert window.remove(999) is False
+    assert window.rows()[0] is edited
+
+
+def test_prepend_ignored_when_scrolled_away(conn):
+    """Якщо початок історії не показано, нова транзакція у вікно не додається."""
+    window = make_window(conn, page_size=5, max_pages=1)
+    window.load_first()
+    window.load_older()
+    assert window.prepend({"transaction_id": 999, "ts": 4070908800}) is False
+
+
+def collect(conn, account_id, history_filter, page_size=4):
+    rows, has_more = pagination.fetch_older(conn, account_id, page_size, history_filter=history_filter)
+    result = list(rows)
+    while has_more:
+        rows, has_more = pagination.fetch_older(conn, account_id, page_size, after=history_filter.cursor(rows[-1]),
+                                                history_filter=history_filter)
+        result += rows
+    return result
+
+
+def test_filter_by_date_amount_and_type(conn):
+    """Фільтри звужують вибірку в SQL; date_to включає весь день."""
+    history_filter = pagination.HistoryFilter(date_from=date(2024, 1, 2), date_to=date(2024, 1, 3),
+                                              min_amount=5, max_amount=8, trans_type="income", member="user")
+    rows = collect(conn, "acc", history_filter)
+    assert [r["amount"] for r in rows] == [8, 7, 6, 5]
+    assert all(history_filter.matches(r) for r in rows)
+    assert collect(conn, "acc", pagination.HistoryFilter(trans_type="expense")) == []
+    assert pagination.HistoryFilter(trans_type="expense").is_default is False
+    assert pagination.HistoryFilter().is_default is True
+
+
+def test_sort_by_amount_pages_without_gaps(conn):
+    """Сортування за сумою в обидва боки проходить усю історію сторінками без повторів."""
+    descending = collect(conn, "acc", pagination.HistoryFilter(sort="amount"))
+    ascending = collect(conn, "acc", pagination.HistoryFilter(sort="amount", descending=False))
+    assert [r["amount"] for r in descending] == list(range(25, 0, -1))
+    assert [r["amount"] for r in ascending] == list(range(1, 26))
+
+
+def test_filter_merges_several_accounts(conn):
+    """Кілька рахунків зливаються в один порядок, як один рахунок."""
+    rows = collect(conn, ["acc", "other"], pagination.HistoryFilter(sort="amount"))
+    assert [r["amount"] for r in rows][:6] == [25, 24, 23, 22, 21, 20]
+    assert len(rows) == 26
+    rows = collect(conn, ["acc", "other"], pagination.HistoryFilter())
+    assert rows[0]["account_id"] == "other" and len(rows) == 26
+
+
+def test_filtered_window_scrolls_back(conn):
+    """Вікно з фільтром прокручується вниз і назад тим самим курсором сортування."""
+    history_filter = pagination.HistoryFilter(sort="amount", descending=False)
+    window = pagination.HistoryWindow(make_window(conn, 1, 1).connect, "acc", page_size=5, max_pages=2,
+                                      history_filter=history_filter)
+    window.load_first()
+    for _ in range(3):
+        window.load_older()
+    while window.has_newer:
+        window.load_newer()
+    assert [r["amount"] for r in window.rows()] == list(range(1, 11))
+
+
+def test_filtered_window_patches(conn):
+    """Рядок, що не підходить під фільтр, у вікно не додається, а після редагування - зникає."""
+    window = pagination.HistoryWindow(make_window(conn, 1, 1).connect, "acc", page_size=5,
+                                      history_filter=pagination.HistoryFilter(min_amount=10))
+    window.load_first()
+    row = dict(window.rows()[0])
+    assert window.prepend({**row, "transaction_id": 999, "amount": 3, "ts": 4070908800}) is False
+    assert window.replace({**row, "amount": 3}) is True
+    assert row["transaction_id"] not in [r["transaction_id"] for r in window.rows()]
+
+
+def test_filtered_queries_use_indexes(conn):
+    """Сортування за сумою і діапазони дат читають індекси рахунку без сортування всієї історії."""
+    for history_filter, index in (
+            (pagination.HistoryFilter(sort="amount", min_amount=5), "idx_transactions_account_amount"),
+            (pagination.HistoryFilter(date_from=date(2024, 1, 2), trans_type="income"),
+             "idx_transactions_account_ts")):
+        sql, params = pagination._page_query(["acc"], history_filter, (10, 5), True, 51)
+        plan = [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        assert any(index in d for d in plan), plan
+        assert not any("TEMP B-TREE" in d for d in plan), plan
+
+
+def test_sorted_window_marks_stale_instead_of_reading(conn):
+    """За сортування не за часом зміни лише позначають вікно застарілим; читає його вже load_first."""
+    window = pagination.HistoryWindow(make_window(conn, 1, 1).connect, "acc", page_size=5,
+                                      history_filter=pagination.HistoryFilter(sort="amount"))
+    rows = window.load_first()
+    assert window.stale is False
+    assert window.prepend({**rows[0], "transaction_id": 999}) is False
+    assert window.replace(rows[1]) is False and window.stale is True
+    window.load_first()
+    assert window.stale is False
@@ -0,0 +1,38 @@
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+import db
+import migrations
+import records
+import repository
+
+
+def test_format_timestamp_matches_strftime():
+    """Формат з кешем днів збігається з datetime.strftime, зокрема до 1970 року і на межі доби."""
+    start = datetime(1969, 12, 30, 23, 59, tzinfo=timezone.utc)
+    for minutes in range(0, 60 * 24 * 400, 997):
+        value = start + timedelta(minutes=minutes, seconds=minutes % 60)
+        ts = int(value.timestamp())
+        assert records.format_timestamp(ts) == value.strftime("%Y-%m-%d %H:%M")
+    assert records.date_to_ts(date(2024, 1, 2)) == int(datetime(2024, 1, 2, tzinfo=timezone.utc).timestamp())
+
+
+def test_fetch_all_builds_compact_rows(tmp_path):
+    """Рядки - кортежі з доступом за назвою; ts рахує БД з timestamp."""
+    conn = sqlite3.connect(str(tmp_path / "budget.db"), factory=db.TimedConnection)
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    repository.create_user(conn, "alice", "password123")
+    repository.create_account(conn, "acc-1", "Картка", "alice")
+    repository.add_transaction(conn, "acc-1", "income", 250, "Кава", "alice", "2024-03-01T09:30:15.500000")
+    rows = records.fetch_all(conn.execute(f"SELECT {records.select_list()} FROM transactions"))
+    conn.close()
+    row = rows[0]
+    assert isinstance(row, tuple) and not hasattr(row, "__dict__")
+    assert row["ts"] == int(datetime(2024, 3, 1, 9, 30, 15, tzinfo=timezone.utc).timestamp())
+    assert (row["amount"], row[3], dict(row)["description"]) == (250, 250, "Кава")
+    assert records.format_timestamp(row["ts"]) == "2024-03-01 09:30"
+    with pytest.raises(KeyError):
+        row["timestamp"]
@@ -0,0 +1,110 @@
+from datetime import datetime
+
+import pytest
+
+import ledger
+import recurring
+import repository
+import storage
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = storage.SQLiteStorage(str(tmp_path / "budget.db"))
+    store.configure()
+    store.migrate()
+    with store.connect() as conn:
+        repository.create_user(conn, "alice", "password123")
+        repository.create_account(conn, "acc-1", "Картка", "alice")
+        repository.create_account(conn, "acc-2", "Готівка", "alice")
+    yield store
+    store.close()
+
+
+def test_parse_and_describe_rule():
+    """Підмножина RRULE розбирається, зберігається в канонічному вигляді, а помилки пояснюються."""
+    rule = recurring.parse_rule("RRULE:freq=weekly;byday=FR,MO;interval=2")
+    assert recurring.format_rule(rule) == "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR"
+    assert recurring.describe_rule("FREQ=MONTHLY;BYMONTHDAY=-1") == "щомісяця (останнього дня)"
+    assert recurring.parse_rule("FREQ=DAILY;UNTIL=20240131")["until"] == datetime(2024, 1, 31, 23, 59, 59, 999999)
+    for text in ("", "FREQ=HOURLY", "FREQ=DAILY;BYDAY=MO", "FREQ=MONTHLY;BYMONTHDAY=40", "FREQ=DAILY;COUNT=0",
+                 "FREQ=DAILY;BYHOUR=9"):
+        with pytest.raises(ValueError):
+            recurring.parse_rule(text)
+
+
+def test_next_after_clamps_month_end_and_skips_weeks():
+    """31-ше число стає останнім днем коротшого місяця; BYDAY з INTERVAL=2 пропускає тижні; UNTIL зупиняє."""
+    start = datetime(2024, 1, 31, 9)
+    monthly = recurring.parse_rule("FREQ=MONTHLY")
+    due = start
+    dates = []
+    for _ in range(3):
+        due = recurring.next_after(monthly, start, due)
+        dates.append(due.date().isoformat())
+    assert dates == ["2024-02-29", "2024-03-31", "2024-04-30"]
+
+    weekly = recurring.parse_rule("FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR")
+    monday = datetime(2024, 1, 1, 8)
+    due, dates = recurring.first_occurrence(weekly, monday), []
+    while due is not None and len(dates) < 4:
+        dates.append(due.date().isoformat())
+        due = recurring.next_after(weekly, monday, due)
+    assert dates == ["2024-01-01", "2024-01-05", "2024-01-15", "2024-01-19"]
+
+    until = recurring.parse_rule("FREQ=DAILY;UNTIL=20240102")
+    assert recurring.next_after(until, monday, datetime(2024, 1, 2, 8)) is None
+
+
+def test_run_due_materializes_once(store):
+    """Пропущені повторення надолужуються одним проходом; повторний прохід і інший воркер нічого не дублюють."""
+    with store.connect() as conn:
+        rule_id = recurring.create_rule(conn, "acc-1", "expense", 1000, "Оренда", "alice", "FREQ=MONTHLY",
+                                        starts_at=datetime(2024, 1, 15))
+        recurring.create_rule(conn, "acc-1", "income", 500, "Кешбек", "alice", "FREQ=WEEKLY;COUNT=2",
+                              starts_at=datetime(2024, 1, 1))
+        recurring.create_rule(conn, "acc-2", "income", 300, "Відсотки", "alice", "FREQ=DAILY",
+                              starts_at=datetime(2024, 3, 31))
+    now = datetime(2024, 4, 1)
+    seen = []
+    report = recurring.run_due(store, "worker-1", now=now, batch=2, on_materialized=seen.append)
+    assert report["rules"] == 3 and report["transactions"] == 3 + 2 + 2
+    assert report["accounts"] == {"acc-1": -3000 + 1000, "acc-2": 600}
+    assert len(seen) == 2
+    assert recurring.run_due(store, "worker-1", now=now)["transactions"] == 0
+    assert recurring.run_due(store, "worker-2", now=now)["transactions"] == 0
+
+    with store.connect() as conn:
+        assert repository.get_account(conn, "acc-1")["balance"] == -2000
+        assert ledger.verify_account(conn, "acc-1") == []
+        rules = recurring.get_account_rules(conn, "acc-1")
+        assert [r["rule_id"] for r in rules] == [rule_id]
+        assert rules[0]["next_due"] == "2024-04-15T00:00:00" and rules[0]["occurrences"] == 3
+        assert recurring.next_due_time(conn) == datetime(2024, 4, 2)
+
+
+def test_expired_lease_is_taken_over(store):
+    """Правило, взяте воркером, який не завершив прохід, після закінчення оренди обробляє інший."""
+    with store.connect() as conn:
+        recurring.create_rule(conn, "acc-1", "income", 100, "x", "alice", "FREQ=DAILY",
+                              starts_at=datetime(2024, 1, 1))
+    now = datetime(2024, 1, 1, 12)
+    assert store.run_write(recurring.claim_due, "crashed", now, 60, 10)
+    assert recurring.run_due(store, "worker-2", now=now)["rules"] == 0
+    later = datetime(2024, 1, 1, 12, 5)
+    assert recurring.run_due(store, "worker-2", now=later)["transactions"] == 1
+    deltas, inserted = store.run_write(recurring.materialize, "crashed", [1], later)
+    assert inserted == 0 and deltas == {}
+
+
+def test_first_occurrence_written_now_and_rule_deleted_with_account(store):
+    """UI пише першу транзакцію одразу, правило починає з наступного повторення; видалення рахунку прибирає правила."""
+    tx, balance = store.run_write(recurring.add_recurring_transaction, "acc-2", "income", 700, "Зарплата", "alice",
+                                  "FREQ=MONTHLY")
+    assert balance == 700
+    with store.connect() as conn:
+        rule = recurring.get_account_rules(conn, "acc-2")[0]
+    assert rule["occurrences"] == 1 and rule["next_due"] > tx["timestamp"]
+    store.run_write(repository.delete_account, "acc-2")
+    with store.connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM recurring_rules").fetchone()[0] == 0
@@ -0,0 +1,107 @@
+import sqlite3
+
+import pytest
+
+import migrations
+import repository
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    for username in ("alice", "bob"):
+        repository.create_user(conn, username, "password123")
+    repository.create_account(conn, "acc-1", "Спільний", "alice")
+    repository.create_account(conn, "acc-2", "Особистий", "bob")
+    repository.link_user(conn, "bob", "acc-1")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_create_user_rejects_duplicate(conn):
+    """Повторна реєстрація того самого імені повертає False."""
+    assert repository.create_user(conn, "alice", "other") is False
+    assert repository.get_user(conn, "alice")["password"] == "password123"
+
+
+def test_add_transaction_updates_balance(conn):
+    """Дохід збільшує, а витрата зменшує баланс рахунку (суми в копійках)."""
+    tx, balance = repository.add_transaction(conn, "acc-1", "income", 10000, "ЗП", "alice")
+    assert tx["amount"] == 10000 and balance == 10000
+    _, balance = repository.add_transaction(conn, "acc-1", "expense", 3000, "Їжа", "bob")
+    assert balance == 7000
+    assert repository.get_account(conn, "acc-1")["balance"] == 7000
+
+
+def test_update_and_delete_transaction_keep_balance_consistent(conn):
+    """Редагування та видалення коригують баланс на різницю."""
+    tx, _ = repository.add_transaction(conn, "acc-1", "expense", 5000, "Кава", "alice")
+    tx, balance = repository.update_transaction(conn, tx["transaction_id"], 2000, "Чай")
+    assert tx["description"] == "Чай"
+    assert balance == -2000
+    assert repository.delete_transaction(conn, tx["transaction_id"]) == 0
+
+
+def test_missing_transaction_edit_and_delete_raise(conn):
+    """Редагування чи видалення вже видаленої транзакції - доменна помилка, а не AttributeError."""
+    with pytest.raises(repository.TransactionNotFoundError):
+        repository.update_transaction(conn, 12345, 100, "x")
+    with pytest.raises(repository.TransactionNotFoundError):
+        repository.delete_transaction(conn, 12345)
+
+
+def test_add_transactions_many_aggregates_balance(conn):
+    """Пакетна вставка не оновлює баланс рядок за рядком: він виводиться з транзакцій."""
+    rows = [("acc-1", "income", 1000, f"tx {i}", f"2024-01-01T00:00:{i:02d}", "alice") for i in range(50)]
+    rows.append(("acc-2", "expense", 500, "x", None, "bob"))
+    statements = []
+    conn.set_trace_callback(statements.append)
+    deltas = repository.add_transactions_many(conn, rows)
+    conn.set_trace_callback(None)
+    assert deltas == {"acc-1": 50000, "acc-2": -500}
+    assert repository.get_balance(conn, "acc-1") == 50000
+    assert repository.get_balance(conn, "acc-2") == -500
+    assert not [s for s in statements if s.lstrip().startswith("UPDATE accounts")]
+
+
+def test_delete_account_removes_links_and_transactions(conn):
+    """Видалення рахунку прибирає його зв'язки та транзакції."""
+    repository.add_transaction(conn, "acc-1", "income", 100, "x", "alice")
+    repository.delete_account(conn, "acc-1")
+    assert repository.get_account(conn, "acc-1") is None
+    assert repository.get_participants(conn, "acc-1") == []
+    assert repository.get_recent_transactions(conn, ["acc-1"]) == []
+
+
+def test_recent_transactions_merge_accounts(conn):
+    """Останні транзакції кількох рахунків зливаються за часом з обмеженням."""
+    for i in range(12):
+        repository.add_transaction(conn, "acc-1", "income", 100, f"a{i}", "alice", f"2024-01-01T10:{i:02d}:00")
+        repository.add_transaction(conn, "acc-2", "income", 100, f"b{i}", "bob", f"2024-01-01T10:{i:02d}:30")
+    rows = repository.get_recent_transactions(conn, ["acc-1", "acc-2"], limit=4)
+    assert [r["description"] for r in rows] == ["b11", "a11", "b10", "a10"]
+    assert rows[0]["account_name"] == "Особистий"
+
+
+def test_accounts_with_recent_tx_for_many_users(conn):
+    """Дані головної сторінки кількох користувачів за один виклик."""
+    repository.add_transaction(conn, "acc-1", "income", 500, "спільна", "alice", "2024-01-01T10:00:00")
+    repository.add_transaction(conn, "acc-2", "income", 700, "особиста", "bob", "2024-01-02T10:00:00")
+    homes = repository.get_accounts_with_recent_tx(conn, ["alice", "bob", "nobody"])
+    assert homes["alice"]["account_ids"] == ["acc-1"]
+    assert [r["description"] for r in homes["alice"]["transactions"]] == ["спільна"]
+    assert sorted(homes["bob"]["account_ids"]) == ["acc-1", "acc-2"]
+    assert [r["description"] for r in homes["bob"]["transactions"]] == ["особиста", "спільна"]
+    assert {a["name"] for a in homes["bob"]["accounts"]} == {"Спільний", "Особистий"}
+    assert homes["nobody"] == {"account_ids": [], "accounts": [], "transactions": []}
+
+
+def test_account_limit_helpers(conn):
+    """Лічильник рахунків і перевірка зв'язку."""
+    assert repository.count_user_accounts(conn, "bob") == 2
+    assert repository.is_linked(conn, "bob", "acc-1") is True
+    repository.unlink_user(conn, "bob", "acc-1")
+    assert repository.is_linked(conn, "bob", "acc-1") is False
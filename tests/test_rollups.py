@@ -0,0 +1,103 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+import migrations
+import repository
+import rollups
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    for username in ("alice", "bob"):
+        repository.create_user(conn, username, "password123")
+    repository.create_account(conn, "acc-1", "Спільний", "alice")
+    repository.create_account(conn, "acc-2", "Особистий", "bob")
+    repository.link_user(conn, "bob", "acc-1")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def snapshot(conn):
+    return sorted(tuple(row) for row in conn.execute(
+        "SELECT account_id, period, type, user_username, ROUND(total, 6), count FROM monthly_rollups"))
+
+
+def test_incremental_updates_match_rebuild(conn):
+    """Додавання, редагування, видалення та пакетна вставка дають ті самі підсумки, що й перерахунок."""
+    tx, _ = repository.add_transaction(conn, "acc-1", "expense", 5000, "Кава", "alice", "2024-03-05T10:00:00")
+    repository.add_transaction(conn, "acc-1", "expense", 2000, "Хліб", "bob", "2024-03-06T10:00:00")
+    repository.add_transaction(conn, "acc-1", "income", 100000, "ЗП", "alice", "2024-04-01T09:00:00")
+    repository.add_transactions_many(conn, [
+        ("acc-2", "expense", 500, "Проїзд", "2024-03-01T08:00:00", "bob"),
+        ("acc-2", "expense", 700, "Проїзд", "2024-03-02T08:00:00", "bob"),
+    ])
+    repository.update_transaction(conn, tx["transaction_id"], 6500, "Кава і тістечко")
+    gone, _ = repository.add_transaction(conn, "acc-1", "income", 1000, "Кешбек", "bob", "2024-05-01T09:00:00")
+    repository.delete_transaction(conn, gone["transaction_id"])
+
+    incremental = snapshot(conn)
+    rollups.rebuild(conn)
+    assert snapshot(conn) == incremental
+    assert ("acc-1", "2024-03", "expense", "alice", 6500, 1) in incremental
+    assert ("acc-2", "2024-03", "expense", "bob", 1200, 2) in incremental
+    assert not any(row[1] == "2024-05" for row in incremental)
+
+
+def test_delete_account_drops_rollups(conn):
+    """Видалення рахунку прибирає і його підсумки."""
+    repository.add_transaction(conn, "acc-2", "expense", 500, "Проїзд", "bob", "2024-03-01T08:00:00")
+    repository.delete_account(conn, "acc-2")
+    assert snapshot(conn) == []
+
+
+def test_rebuild_single_account(conn):
+    """Перерахунок одного рахунку не зачіпає інші."""
+    repository.add_transaction(conn, "acc-1", "income", 10000, "ЗП", "alice", "2024-03-01T08:00:00")
+    repository.add_transaction(conn, "acc-2", "income", 3000, "ЗП", "bob", "2024-03-01T08:00:00")
+    conn.execute("UPDATE monthly_rollups SET total = 0")
+    rollups.rebuild(conn, ["acc-1"])
+    rows = {row[0]: row[4] for row in snapshot(conn)}
+    assert rows == {"acc-1": 10000, "acc-2": 0}
+
+
+def test_reports_group_by_month_member_and_account(conn):
+    """Звіти згортають підсумки за місяцем, учасником і рахунком та відкидають старі місяці."""
+    repository.add_transaction(conn, "acc-1", "expense", 5000, "Кава", "alice", "2024-03-05T10:00:00")
+    repository.add_transaction(conn, "acc-1", "expense", 2000, "Хліб", "bob", "2024-03-06T10:00:00")
+    repository.add_transaction(conn, "acc-1", "income", 100000, "ЗП", "alice", "2024-04-01T09:00:00")
+    repository.add_transaction(conn, "acc-2", "expense", 500, "Проїзд", "bob", "2024-04-02T08:00:00")
+    repository.add_transaction(conn, "acc-1", "expense", 9900, "Старе", "alice", "2023-01-01T08:00:00")
+
+    monthly = rollups.monthly_report(conn, ["acc-1", "acc-2"], "2024-03")
+    assert [(r["key"], r["income"], r["expense"], r["count"]) for r in monthly] == [
+        ("2024-03", 0, 7000, 2), ("2024-04", 100000, 500, 2)]
+    members = rollups.member_report(conn, ["acc-1"], "2024-03")
+    assert [(r["key"], r["income"], r["expense"]) for r in members] == [
+        ("alice", 100000, 5000), ("bob", 0, 2000)]
+    accounts = rollups.account_report(conn, ["acc-1", "acc-2"], "2024-03")
+    assert [(r["key"], r["expense"]) for r in accounts] == [("acc-1", 7000), ("acc-2", 500)]
+    assert rollups.monthly_report(conn, [], "2024-03") == []
+
+
+def test_first_period():
+    """Вікно з N місяців включає поточний місяць і переходить через рік."""
+    assert rollups.first_period(12, date(2024, 3, 15)) == "2023-04"
+    assert rollups.first_period(1, date(2024, 1, 1)) == "2024-01"
+
+
+def test_migration_fills_rollups_for_existing_data():
+    """Міграція заповнює підсумки для транзакцій, що вже були в БД."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn, [m for m in migrations.MIGRATIONS if m[0] < 6])
+    conn.execute("INSERT INTO transactions (account_id, type, amount, description, timestamp, user_username) "
+                 "VALUES ('acc', 'expense', 12.5, '', '2024-02-10T10:00:00', 'alice')")
+    conn.commit()
+    migrations.migrate(conn)
+    assert snapshot(conn) == [("acc", "2024-02", "expense", "alice", 1250, 1)]
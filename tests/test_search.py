@@ -0,0 +1,92 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+import migrations
+import pagination
+import repository
+import search
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    for username in ("alice", "bob"):
+        repository.create_user(conn, username, "password123")
+    repository.create_account(conn, "acc-1", "Спільний", "alice")
+    repository.create_account(conn, "acc-2", "Особистий", "bob")
+    transactions = [
+        ("acc-1", "expense", 80000, "Стоматолог Петренко", "2024-03-05T10:00:00", "alice"),
+        ("acc-1", "expense", 12000, "М’ясо на ринку", "2024-03-10T10:00:00", "bob"),
+        ("acc-2", "expense", 150000, "Стоматологія, пломба", "2024-04-02T10:00:00", "bob"),
+        ("acc-2", "income", 2000000, "Зарплата", "2024-04-05T10:00:00", "bob"),
+        ("acc-1", "expense", 5000, "Їжа", "2024-04-06T10:00:00", "alice"),
+    ]
+    repository.add_transactions_many(conn, transactions)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def descriptions(rows):
+    return [row["description"] for row in rows]
+
+
+def test_query_phrases_split_words_like_tokenizer():
+    """Апостроф і розділові знаки розбивають слово на токени, регістр не важливий."""
+    assert search.query_phrases("  М'ясо,  РИНОК ") == [["м", "ясо"], ["ринок"]]
+    assert search.fts_query([["м", "ясо"], ["ринок"]]) == '"м ясо"* "ринок"*'
+    assert search.ts_query([["м", "ясо"], ["ринок"]]) == "м <-> ясо:* & ринок:*"
+    assert search.query_phrases("' , ") == []
+
+
+def test_search_by_prefix_across_accounts(conn):
+    """Префікс знаходить слова в усіх переданих рахунках, новіші - першими."""
+    rows, has_more = search.search_transactions(conn, ["acc-1", "acc-2"], "стомат")
+    assert descriptions(rows) == ["Стоматологія, пломба", "Стоматолог Петренко"]
+    assert rows[0]["account_name"] == "Особистий"
+    assert not has_more
+    assert descriptions(search.search_transactions(conn, ["acc-1"], "стомат")[0]) == ["Стоматолог Петренко"]
+
+
+def test_search_ukrainian_letters_and_apostrophes(conn):
+    """Ї не зливається з І, а "м'ясо" знаходить "м’ясо" з іншим апострофом."""
+    assert descriptions(search.search_transactions(conn, ["acc-1"], "їжа")[0]) == ["Їжа"]
+    assert search.search_transactions(conn, ["acc-1"], "іжа")[0] == []
+    assert descriptions(search.search_transactions(conn, ["acc-1"], "м'ясо")[0]) == ["М’ясо на ринку"]
+
+
+def test_search_filters(conn):
+    """Фільтри дат (включно), сум і автора поєднуються з текстом і без нього."""
+    both = ["acc-1", "acc-2"]
+    rows, _ = search.search_transactions(conn, both, date_from=date(2024, 4, 1), date_to=date(2024, 4, 5))
+    assert descriptions(rows) == ["Зарплата", "Стоматологія, пломба"]
+    rows, _ = search.search_transactions(conn, both, "стомат", min_amount=100000)
+    assert descriptions(rows) == ["Стоматологія, пломба"]
+    rows, _ = search.search_transactions(conn, both, max_amount=12000, author="alice")
+    assert descriptions(rows) == ["Їжа"]
+    assert search.search_transactions(conn, [], "стомат") == ([], False)
+
+
+def test_search_pages_with_cursor(conn):
+    """Наступна сторінка продовжує з курсора останнього рядка без повторів."""
+    first, has_more = search.search_transactions(conn, ["acc-1", "acc-2"], page_size=2)
+    assert has_more
+    second, _ = search.search_transactions(conn, ["acc-1", "acc-2"], page_size=2,
+                                           after=pagination.row_cursor(first[-1]))
+    assert descriptions(first) == ["Їжа", "Зарплата"]
+    assert descriptions(second) == ["Стоматологія, пломба", "М’ясо на ринку"]
+
+
+def test_index_follows_updates_and_deletes(conn):
+    """Тригери оновлюють індекс при редагуванні опису та видаленні транзакції."""
+    rows, _ = search.search_transactions(conn, ["acc-2"], "зарплата")
+    repository.update_transaction(conn, rows[0]["transaction_id"], 2000000, "Премія")
+    assert search.search_transactions(conn, ["acc-2"], "зарплата")[0] == []
+    assert len(search.search_transactions(conn, ["acc-2"], "премія")[0]) == 1
+    repository.delete_account(conn, "acc-2")
+    assert search.search_transactions(conn, ["acc-2"], "премія")[0] == []
+    assert conn.execute("SELECT COUNT(*) FROM transactions_fts WHERE transactions_fts MATCH 'премія'").fetchone()[0] == 0
@@ -0,0 +1,19 @@
+import sessions
+
+
+def test_token_round_trip():
+    """Токен, підписаний спільним секретом, приймає будь-який процес з тим самим секретом."""
+    token = sessions.issue_token("alice", secret="s3cret", now=1000, ttl=60)
+    assert sessions.verify_token(token, secret="s3cret", now=1030) == "alice"
+
+
+def test_token_rejects_tampering_expiry_and_other_secret():
+    """Змінений, прострочений або підписаний іншим секретом токен не відновлює сесію."""
+    token = sessions.issue_token("alice", secret="s3cret", now=1000, ttl=60)
+    encoded, signature = token.split(".")
+    forged = sessions.issue_token("bob", secret="other", now=1000, ttl=60).split(".")[0] + "." + signature
+    assert sessions.verify_token(forged, secret="s3cret", now=1030) is None
+    assert sessions.verify_token(token, secret="s3cret", now=1061) is None
+    assert sessions.verify_token(token, secret="other", now=1030) is None
+    assert sessions.verify_token("not-a-token", secret="s3cret") is None
+    assert sessions.verify_token(None) is None
@@ -0,0 +1,196 @@
+import importlib.util
+import os
+from datetime import datetime
+
+import pytest
+
+import db
+import ledger
+import pagination
+import recurring
+import repository
+import rollups
+import search
+import storage
+
+# PostgreSQL-тести запускаються лише з BUDGET_TEST_PG_URL (наприклад, локальний контейнер або pgserver);
+# вони перестворюють таблиці застосунку в цій БД
+PG_URL = os.environ.get("BUDGET_TEST_PG_URL")
+PG_TABLES = ("schema_version", "balance_checkpoints", "monthly_rollups", "recurring_rules", "transactions",
+             "user_accounts_link", "accounts", "users")
+
+
+def test_from_url_selects_backend():
+    """Шлях і sqlite:/// дають SQLite, невідома схема - помилку."""
+    assert isinstance(storage.from_url("budget.db"), storage.SQLiteStorage)
+    assert storage.from_url("sqlite:///data/budget.db").path == "data/budget.db"
+    assert storage.from_url("sqlite:////srv/budget.db").path == "/srv/budget.db"
+    assert storage.from_url(r"C:\budget\budget.db").path == r"C:\budget\budget.db"
+    with pytest.raises(storage.StorageError):
+        storage.from_url("mysql://localhost/budget")
+    assert storage.absolute_url("sqlite:///data/budget.db") == os.path.abspath("data/budget.db")
+    assert storage.absolute_url("postgresql://budget@db/budget") == "postgresql://budget@db/budget"
+
+
+def test_to_pyformat_escapes_percent():
+    """Плейсхолдери "?" стають "%s", а буквальний "%" подвоюється."""
+    assert storage.to_pyformat("SELECT strftime('%s', t) FROM x WHERE a = ?") == \
+        "SELECT strftime('%%s', t) FROM x WHERE a = %s"
+
+
+class FakeCursor:
+    rowcount = 1
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def executemany(self, sql, params):
+        self.calls.append(("executemany", sql, params))
+
+
+class FakePsycopgConnection:
+    # Заміна psycopg.Connection: записує запити, які PostgresConnection передає драйверу
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, sql, params=()):
+        self.calls.append(("execute", sql, params))
+        return FakeCursor(self.calls)
+
+    def cursor(self):
+        return FakeCursor(self.calls)
+
+    def commit(self):
+        self.calls.append(("commit",))
+
+    def rollback(self):
+        self.calls.append(("rollback",))
+
+
+def test_postgres_connection_translates_queries():
+    """PostgresConnection передає psycopg запити у форматі %s і керує транзакцією як sqlite3 у with."""
+    raw = FakePsycopgConnection()
+    with storage.PostgresConnection(raw) as conn:
+        conn.execute("SELECT * FROM t WHERE a = ? AND b LIKE '%x'", ("1",))
+        conn.executemany("INSERT INTO t VALUES (?, ?)", iter([(1, 2), (3, 4)]))
+        conn.query_timeout = 1.5
+        conn.start_timer()
+    assert raw.calls == [
+        ("execute", "SELECT * FROM t WHERE a = %s AND b LIKE '%%x'", ("1",)),
+        ("executemany", "INSERT INTO t VALUES (%s, %s)", [(1, 2), (3, 4)]),
+        ("execute", "SELECT set_config('statement_timeout', %s, true)", ("1500",)),
+        ("commit",),
+    ]
+    with pytest.raises(ValueError):
+        with storage.PostgresConnection(raw) as conn:
+            conn.execute("DELETE FROM t")
+            raise ValueError
+    assert raw.calls[-2:] == [("execute", "DELETE FROM t", ()), ("rollback",)]
+
+
+def test_sqlite_storage_round_trip(tmp_path):
+    """SQLiteStorage мігрує БД, пише через чергу запису і читає з пулу."""
+    store = storage.from_url(f"sqlite:///{tmp_path / 'budget.db'}")
+    store.configure()
+    try:
+        assert store.migrate()
+        with store.connect() as conn:
+            repository.create_user(conn, "alice", "password123")
+            repository.create_account(conn, "acc-1", "Картка", "alice")
+        tx, balance = store.run_write(repository.add_transaction, "acc-1", "income", 250, "x", "alice")
+        assert balance == 250
+        with store.connect() as conn:
+            assert repository.get_transaction(conn, tx["transaction_id"])["amount"] == 250
+        assert store.submit(lambda: 42).result(timeout=5) == 42
+    finally:
+        store.close()
+
+
+@pytest.fixture
+def pg_store():
+    if PG_URL is None or importlib.util.find_spec("psycopg") is None:
+        pytest.skip("PostgreSQL недоступний (BUDGET_TEST_PG_URL і psycopg)")
+    store = storage.from_url(PG_URL)
+
+    def drop_tables():
+        with store.connect(query_timeout=None) as conn:
+            for table in PG_TABLES:
+                conn.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+            conn.execute("DROP FUNCTION IF EXISTS strftime(TEXT, TEXT)")
+
+    drop_tables()
+    store.migrate()
+    yield store
+    drop_tables()
+    store.close()
+
+
+def test_postgres_storage_runs_repository(pg_store):
+    """repository, ledger, rollups і pagination працюють з PostgreSQL без змін у SQL."""
+    assert pg_store.migrate() == []
+    with pg_store.connect() as conn:
+        assert repository.create_user(conn, "alice", "password123")
+        assert not repository.create_user(conn, "alice", "other")
+        repository.create_account(conn, "acc-1", "Картка", "alice")
+    for amount in (1000, 250, 50):
+        pg_store.run_write(repository.add_transaction, "acc-1", "income", amount, "x", "alice")
+    tx, balance = pg_store.run_write(repository.add_transaction, "acc-1", "expense", 300, "y", "alice")
+    assert balance == 1000
+    pg_store.run_write(ledger.write_checkpoint, "acc-1", tx["transaction_id"], 1000)
+    pg_store.run_write(repository.update_transaction, tx["transaction_id"], 200, "y")
+
+    with pg_store.connect() as conn:
+        account = repository.get_account(conn, "acc-1")
+        assert account["balance"] == 1100 and isinstance(account["balance"], int)
+        assert ledger.verify_account(conn, "acc-1") == []
+        assert [t["amount"] for t in repository.get_recent_transactions(conn, ["acc-1"], 2)] == [200, 50]
+        rows, has_more = pagination.fetch_older(conn, "acc-1", page_size=3)
+        assert len(rows) == 3 and has_more
+        history_filter = pagination.HistoryFilter(sort="amount", trans_type="income")
+        rows, _ = pagination.fetch_older(conn, ["acc-1", "acc-missing"], 2, history_filter=history_filter)
+        older, _ = pagination.fetch_older(conn, "acc-1", 2, after=history_filter.cursor(rows[-1]),
+                                          history_filter=history_filter)
+        assert [r["amount"] for r in rows + older] == [1000, 250, 50]
+        report = rollups.monthly_report(conn, ["acc-1"], "2000-01")
+        assert len(report) == 1
+        series = repository.get_amount_series(conn, "acc-1")
+        assert [amount for _, amount in series] == [1000, 250, 50, -200]
+        assert all(isinstance(ts, int) and ts > 0 for ts, _ in series)
+    assert ledger.verify_all(pg_store)["mismatches"] == []
+
+
+def test_postgres_full_text_search(pg_store):
+    """Пошук по описах у PostgreSQL іде через to_tsquery з тими самими префіксами."""
+    with pg_store.connect() as conn:
+        repository.create_user(conn, "alice", "password123")
+        repository.create_account(conn, "acc-1", "Картка", "alice")
+    for description in ("Стоматолог", "Кава", "М’ясо на ринку"):
+        pg_store.run_write(repository.add_transaction, "acc-1", "expense", 100, description, "alice")
+    with pg_store.connect() as conn:
+        rows, has_more = search.search_transactions(conn, ["acc-1"], "стомат")
+        assert [row["description"] for row in rows] == ["Стоматолог"] and not has_more
+        assert rows[0]["account_name"] == "Картка"
+        rows, _ = search.search_transactions(conn, ["acc-1"], "м'ясо", min_amount=50)
+        assert [row["description"] for row in rows] == ["М’ясо на ринку"]
+
+
+def test_postgres_recurring_rules(pg_store):
+    """Правила регулярних транзакцій беруться й записуються в PostgreSQL тим самим SQL, без дублікатів."""
+    with pg_store.connect() as conn:
+        repository.create_user(conn, "alice", "password123")
+        repository.create_account(conn, "acc-1", "Картка", "alice")
+        recurring.create_rule(conn, "acc-1", "expense", 100, "Підписка", "alice", "FREQ=WEEKLY",
+                              starts_at=datetime(2024, 1, 1))
+    report = recurring.run_due(pg_store, "worker-1", now=datetime(2024, 1, 20))
+    assert report["transactions"] == 3 and report["accounts"] == {"acc-1": -300}
+    assert recurring.run_due(pg_store, "worker-2", now=datetime(2024, 1, 20))["transactions"] == 0
+    with pg_store.connect() as conn:
+        assert repository.get_account(conn, "acc-1")["balance"] == -300
+        assert recurring.next_due_time(conn) == datetime(2024, 1, 22)
+
+
+def test_postgres_query_timeout(pg_store):
+    """statement_timeout PostgreSQL перетворюється на QueryTimeoutError, як і в SQLite."""
+    with pytest.raises(db.QueryTimeoutError):
+        with pg_store.connect(query_timeout=0.05) as conn:
+            conn.execute("SELECT pg_sleep(1)")
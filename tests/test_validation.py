@@ -1,4 +1,7 @@
-from src.validation import validate_registration, validate_transaction_amount
+from datetime import date
+
+from src.validation import (validate_amount_minor, validate_registration, validate_search_filters,
+                            validate_transaction_amount)
 
 def test_registration_success():
     """Перевіряє, що коректні дані проходять валідацію."""
@@ -46,4 +49,38 @@ def test_transaction_amount_negative():
     """Перевіряє від'ємну суму."""
     is_valid, value = validate_transaction_amount("-100")
     assert is_valid is False
-    assert value is None
\ No newline at end of file
+    assert value is None
+
+def test_amount_minor_success():
+    """Сума перетворюється на цілі копійки без похибки float."""
+    assert validate_amount_minor("150.50") == (True, 15050)
+    assert validate_amount_minor("0.1") == (True, 10)
+
+def test_amount_minor_rejects_less_than_kopiyka():
+    """Сума, що округлюється до нуля копійок, недійсна."""
+    assert validate_amount_minor("0.001") == (False, None)
+    assert validate_amount_minor("nan") == (False, None)
+
+def test_amount_minor_rejects_huge_amounts():
+    """Суми, що не вміщаються в INTEGER БД, недійсні, а не падають з іншим винятком."""
+    assert validate_amount_minor("1e30") == (False, None)
+    assert validate_amount_minor("1e20") == (False, None)
+    assert validate_amount_minor("9999999999999.99") == (True, 999999999999999)
+    assert validate_search_filters("", "", "1e30", "")[0] is False
+
+def test_search_filters_parse_dates_and_amounts():
+    """Порожні фільтри - без обмеження, заповнені стають датами й копійками."""
+    assert validate_search_filters("", " ", "", "") == (True, {"date_from": None, "date_to": None,
+                                                             "min_amount": None, "max_amount": None})
+    is_valid, filters = validate_search_filters("2024-03-01", "2024-03-31", "10", "99,50")
+    assert is_valid is True
+    assert filters == {"date_from": date(2024, 3, 1), "date_to": date(2024, 3, 31),
+                       "min_amount": 1000, "max_amount": 9950}
+
+def test_search_filters_reject_bad_input():
+    """Неправильна дата, сума чи перевернутий діапазон дають повідомлення."""
+    assert validate_search_filters("01.03.2024", "", "", "")[0] is False
+    assert validate_search_filters("", "", "abc", "")[0] is False
+    assert validate_search_filters("", "", "-5", "")[0] is False
+    assert validate_search_filters("2024-04-01", "2024-03-01", "", "")[0] is False
+    assert validate_search_filters("", "", "100", "10")[0] is False